@@ -1,32 +1,41 @@
 import pandas as pd
 import streamlit as st
-from helper_functions import get_rating_thresholds
+from helper_functions import get_rating_thresholds, get_user_ratings_df
+from rating_classifier import RatingBoundaries
 
 restaurants_url = "https://raw.githubusercontent.com/Papagoat/brain-assessment/main/restaurant_data.json"
+#seconds the thresholds and ratings are kept between reruns before the feed is read again
+CACHE_TTL = 60 * 60
 
 
-#after obtaining the min & max treshold values for ratings input them into a dictionary
-rating_thresholds = {row["user_rating_texts"]: (row["min"], row["max"]) for _, row in get_rating_thresholds(restaurants_url).iterrows()}
-#obtain min & max user_rating_aggregate 
+#obtain the min & max threshold values for every rating text once and compile them into sorted boundaries
+@st.cache_data(ttl = CACHE_TTL)
+def load_rating_boundaries(url):
+    return RatingBoundaries(get_rating_thresholds(url))
+
+
+@st.cache_data(ttl = CACHE_TTL)
+def load_user_ratings(url):
+    return get_user_ratings_df(url)
+
+
+rating_boundaries = load_rating_boundaries(restaurants_url)
 
-print(rating_thresholds)
 def classify_rating(rating):
-    for category, (low, high) in rating_thresholds.items():
-        if low <= rating <= high:
-            return category
-        elif rating < 2.2:
-            return "No user has ever given such a low rating"
-        elif rating > 4.9:
-            return "No user has ever given such a high rating"
-            
-    return "Unknown: There is no data containing information on the texts associated with this rating score"
+    return rating_boundaries.classify(rating)
 
 
 
 # Streamlit UI
-st.title("Restaurant Rating Analyzer") 
+st.title("Restaurant Rating Analyzer")
 
 rating = st.slider("Select an aggregate rating:", 0.0, 5.0, 3.0, 0.1)
 category = classify_rating(rating)
 
 st.write(f"### The rating category is: **{category}**")
+
+#classify every restaurant rating in the feed at once to show the distribution of categories
+ratings_df = load_user_ratings(restaurants_url)
+categories = pd.Series(rating_boundaries.classify_many(ratings_df["user_rating_value"].to_numpy()))
+st.write("### Rating categories across all restaurants")
+st.bar_chart(categories.value_counts())
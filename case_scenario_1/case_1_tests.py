@@ -1,33 +1,157 @@
+import tempfile
 import unittest
-from unittest.mock import patch, MagicMock
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch
 import pandas as pd
 import requests
-from helper_functions import read_json, get_restaurant_list, get_restaurant_details, get_events_list, save_to_csv, get_user_ratings_df, get_rating_thresholds
+import json
+import os
+import feed_cache
+import country_codes
+import incremental
+from feed_stream import iter_json_array
+from get_lists import read_json, get_restaurant_list, get_events_list, extract_records, extract_frames, iter_events_list, get_feed_frames, records_to_frame, EVENT_FIELDS
+import numpy as np
+from rating_classifier import RatingBoundaries, TOO_LOW, TOO_HIGH, UNKNOWN
+from writers import TableWriter, write_table, output_filename
+from helper_functions import get_restaurant_details, save_to_csv, get_user_ratings_df, get_rating_thresholds, save_records_to_csv, get_month_events, get_events_by_month, event_in_month
+
+
+class StubFeedServer:
+    """
+    Local stand-in for a feed server answering every request with status and body; then, when set to
+    (status, body), replaces them after the first request. The headers of every request are kept.
+    """
+
+    def __init__(self, status, body, etag=None):
+        self.status = status
+        self.body = body
+        self.etag = etag
+        self.then = None
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append(dict(self.headers))
+                status, body = stub.status, stub.body if stub.status != 304 else b''
+                if stub.then is not None:
+                    stub.status, stub.body = stub.then
+                    stub.then = None
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                if stub.etag is not None:
+                    self.send_header("ETag", stub.etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.host = f"127.0.0.1:{self.server.server_port}"
+        self.url = f"http://{self.host}/feed.json"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
 
 class TestFunctions(unittest.TestCase):
+
+    def setUp(self):
+        # isolate every test from the shared feed cache
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        patcher = patch.object(feed_cache, 'CACHE_DIR', self.cache_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        feed_cache.clear_cache()
+        self.addCleanup(feed_cache.clear_cache)
+        country_codes.clear_cache()
+        self.addCleanup(country_codes.clear_cache)
     
-    # Test for read_json function
-    @patch('requests.get')
-    def test_read_json_success(self, mock_get):
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"key": "value"}
-        mock_get.return_value = mock_response
-
-        result = read_json('http://dummyurl.com')
+    # Test for read_json function, against a local stub of the feed server
+    def test_read_json_success(self):
+        server = StubFeedServer(200, b'{"key": "value"}')
+        self.addCleanup(server.close)
+
+        result = read_json(server.url)
         self.assertEqual(result, {"key": "value"})
-    
-    @patch('requests.get')
-    def test_read_json_failure(self, mock_get):
-        mock_response = MagicMock()
-        mock_response.status_code = 404
-        mock_get.return_value = mock_response
 
-        result = read_json('http://dummyurl.com')
+    def test_read_json_failure(self):
+        server = StubFeedServer(404, b'')
+        self.addCleanup(server.close)
+
+        result = read_json(server.url)
         self.assertEqual(result, [])
+
+    def test_read_json_shared_within_run(self):
+        server = StubFeedServer(200, b'[{"results_found": 1}]', etag='"v1"')
+        self.addCleanup(server.close)
+
+        first = read_json(server.url)
+        second = read_json(server.url)
+        self.assertIs(first, second)
+        self.assertEqual(len(server.requests), 1)
+
+        # the shared document expires with the cached copy, a long-lived process sees the newer feed
+        server.body = b'[{"results_found": 2}]'
+        server.etag = '"v2"'
+        with patch.object(feed_cache, 'CACHE_TTL', 0):
+            self.assertEqual(read_json(server.url), [{"results_found": 2}])
+        self.assertEqual(server.requests[-1].get("If-None-Match"), '"v1"')
+
+    def test_read_json_revalidates_stale_cache(self):
+        server = StubFeedServer(200, b'[{"results_found": 1}]', etag='"v1"')
+        self.addCleanup(server.close)
+        read_json(server.url)
+
+        # new run with an expired cache entry, the server answers 304 Not Modified
+        feed_cache.clear_cache()
+        server.status = 304
+        with patch.object(feed_cache, 'CACHE_TTL', 0):
+            result = read_json(server.url)
+
+        self.assertEqual(result, [{"results_found": 1}])
+        self.assertEqual(server.requests[-1].get("If-None-Match"), '"v1"')
+        self.assertIsNone(server.requests[-1].get("If-Modified-Since"))
+
+    def test_read_json_ignores_body_of_another_download(self):
+        server = StubFeedServer(200, b'[{"results_found": 1}]', etag='"v1"')
+        self.addCleanup(server.close)
+        read_json(server.url)
+        self.assertFalse([name for name in os.listdir(self.cache_dir.name) if name.endswith(".tmp")])
+
+        # the body was replaced by another download after this meta was written: it is not served
+        body_path, _ = feed_cache._cache_paths(server.url, self.cache_dir.name)
+        feed_cache._replace_file(body_path, b'[{"results_found": 2}]')
+        feed_cache.clear_cache()
+        self.assertEqual(read_json(server.url), [{"results_found": 1}])
+        self.assertEqual(len(server.requests), 2)
+        self.assertIsNone(server.requests[-1].get("If-None-Match"))
+
+    def test_read_json_retries_transient_errors(self):
+        server = StubFeedServer(503, b'')
+        self.addCleanup(server.close)
+        server.then = (200, b'{"key": "value"}')
+
+        with patch.object(feed_cache.get_client(), 'backoff', 0.001):
+            result = read_json(server.url)
+        self.assertEqual(result, {"key": "value"})
+        self.assertEqual(len(server.requests), 2)
+        self.assertEqual(feed_cache.get_client().summary()[server.host]["bytes"], len(b'{"key": "value"}'))
+
+    def test_evict_cache_keeps_size_budget(self):
+        for name, size in (("a", 10), ("b", 10)):
+            with open(f"{self.cache_dir.name}/{name}.json", "wb") as f:
+                f.write(b"0" * size)
+        self.assertEqual(feed_cache.evict_cache(self.cache_dir.name, max_bytes=15), 1)
     
     # Test for get_restaurant_list function
-    @patch('helper_functions.read_json')
+    @patch('get_lists.read_json')
     def test_get_restaurant_list(self, mock_read_json):
         mock_data = [
             {
@@ -87,9 +211,32 @@ class TestFunctions(unittest.TestCase):
         self.assertEqual(result_df.shape[0], 1)
         self.assertEqual(result_df['Country Name'].iloc[0], "Country 1")
         self.assertNotIn("Country Code", result_df.columns)
+
+    # Test for the compiled country table
+    @patch('pandas.read_excel')
+    def test_load_country_codes_cached_on_mtime(self, mock_read_excel):
+        mock_read_excel.return_value = pd.DataFrame({'Country Code': [1, 14], 'Country': ["India", "Australia"]})
+        xlsx_path = os.path.join(self.cache_dir.name, "Country-Code.xlsx")
+        open(xlsx_path, "wb").close()
+
+        countries = country_codes.load_country_codes(xlsx_path)
+        self.assertEqual(list(countries.lookup([14, 1, 99])["Country"][:2]), ["Australia", "India"])
+        self.assertTrue(pd.isna(countries.lookup([99])["Country"][0]))
+
+        # a new run loads the pickle instead of the xlsx file
+        country_codes.clear_cache()
+        country_codes.load_country_codes(xlsx_path)
+        mock_read_excel.assert_called_once()
+
+        # touching the xlsx file invalidates the compiled table
+        country_codes.clear_cache()
+        stat = os.stat(xlsx_path)
+        os.utime(xlsx_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        country_codes.load_country_codes(xlsx_path)
+        self.assertEqual(mock_read_excel.call_count, 2)
     
     # Test for get_events_list function
-    @patch('helper_functions.read_json')
+    @patch('get_lists.read_json')
     def test_get_events_list(self, mock_read_json):
         mock_data = [
             {
@@ -123,6 +270,250 @@ class TestFunctions(unittest.TestCase):
         self.assertEqual(len(result), 1)
         self.assertEqual(result[0]["Event Title"], "Food Festival")
     
+    # Test for extract_records function
+    def test_extract_records_single_pass(self):
+        mock_data = [
+            {
+                "restaurants": [
+                    {
+                        "restaurant": {
+                            "R": {"res_id": 20},
+                            "name": "Restaurant 1",
+                            "photos_url": "http://example.com/photo.jpg",
+                            "location": {"city_id": 1, "city": "City 1"},
+                            "user_rating": {"votes": 100, "aggregate_rating": "4.5", "rating_text": "Excellent"},
+                            "cuisines": "Italian",
+                            "zomato_events": [
+                                {"event": {"event_id": 1, "title": "Food Festival", "start_date": "2025-03-01", "end_date": "2025-03-03"}},
+                                {"event": {"event_id": 2, "title": "Jazz Night", "start_date": "2025-04-01", "end_date": "2025-04-01"}}
+                            ]
+                        }
+                    }
+                ]
+            }
+        ]
+
+        records = extract_records(mock_data)
+        self.assertEqual(len(records["restaurants"]), 1)
+        self.assertEqual(records["restaurants"][0]["Event Date"], "2025-03-01")
+        self.assertEqual([e["Event Id"] for e in records["events"]], [1, 2])
+        self.assertEqual(records["ratings"], [{"user_rating_value": 4.5, "user_rating_texts": "Excellent"}])
+
+        self.assertEqual(list(extract_records(mock_data, ("events",))), ["events"])
+        with self.assertRaises(ValueError):
+            extract_records(mock_data, ("photos",))
+
+        # typed dataframes built straight from the column buffers
+        frames = extract_frames(mock_data)
+        restaurants_df, events_df, ratings_df = frames["restaurants"], frames["events"], frames["ratings"]
+        self.assertEqual(restaurants_df["Restaurant Id"].dtype, "int64")
+        self.assertEqual(restaurants_df["User Aggregate Rating"].dtype, "float32")
+        self.assertEqual(restaurants_df["City"].dtype, "category")
+        self.assertEqual(str(events_df["Event Start Date"].dtype)[:10], "datetime64")
+        self.assertEqual(events_df["Event Id"].tolist(), [1, 2])
+        self.assertEqual(ratings_df["user_rating_texts"].dtype, "category")
+
+    # Test for the incremental json parser
+    def test_iter_json_array_across_chunk_boundaries(self):
+        document = [{"restaurants": [{"restaurant": {"name": 'A "quoted" ]} name \\', "tags": ["[", "{"]}}]}, [1, 2], {"é": "ü"}]
+        raw = json.dumps(document, ensure_ascii=False).encode("utf-8")
+        # one byte at a time splits escapes, strings and multi-byte characters
+        chunks = [raw[i:i + 1] for i in range(len(raw))]
+        self.assertEqual(list(iter_json_array(chunks)), document)
+
+        with self.assertRaises(ValueError):
+            list(iter_json_array([b'[{"a": 1}, {"b"']))
+
+    def test_stream_events_to_csv_in_chunks(self):
+        mock_data = [
+            {"restaurants": [
+                {"restaurant": {
+                    "R": {"res_id": i}, "name": f"Restaurant {i}", "photos_url": "http://example.com/photo.jpg",
+                    "zomato_events": [{"event": {"event_id": i, "title": "Food Festival", "start_date": "2025-03-01", "end_date": "2025-03-03"}}]
+                }}
+                for i in range(5)
+            ]}
+        ]
+        feed_path = os.path.join(self.cache_dir.name, "feed.json")
+        csv_path = os.path.join(self.cache_dir.name, "events.csv")
+        with open(feed_path, "w") as f:
+            json.dump(mock_data, f)
+
+        rows = save_records_to_csv(iter_events_list(feed_path), csv_path, chunk_size=2)
+        self.assertEqual(rows, 5)
+        self.assertEqual(pd.read_csv(csv_path)["Event Id"].tolist(), list(range(5)))
+
+    # Test for the month partitioned event queries
+    def test_get_events_by_month(self):
+        events = [
+            {"Event Id": 1, "Restaurant Id": 1, "Restaurant Name": "R1", "Photo URL": "u", "Event Title": "A",
+             "Event Start Date": "2019-04-01", "Event End Date": "2019-04-03"},
+            {"Event Id": 2, "Restaurant Id": 1, "Restaurant Name": "R1", "Photo URL": "u", "Event Title": "B",
+             "Event Start Date": "2019-03-20", "Event End Date": "2019-05-02"},
+            {"Event Id": 3, "Restaurant Id": 2, "Restaurant Name": "R2", "Photo URL": "u", "Event Title": "C",
+             "Event Start Date": "2019-05-10", "Event End Date": "2019-05-10"},
+        ]
+
+        inside = get_events_by_month(events, ["2019-03", (2019, 4), "2019-05"])
+        self.assertEqual({m: df["Event Id"].tolist() for m, df in inside.items()},
+                         {"2019-03": [], "2019-04": [1], "2019-05": [3]})
+
+        overlapping = get_events_by_month(events, ["2019-03", "2019-04", "2019-05"], mode="overlapping")
+        self.assertEqual({m: df["Event Id"].tolist() for m, df in overlapping.items()},
+                         {"2019-03": [2], "2019-04": [1, 2], "2019-05": [2, 3]})
+
+        self.assertEqual(get_month_events(events, 2019, 4)["Event Id"].tolist(), [1])
+
+        # dates with a time of day still count, unparseable ones are left out instead of failing the query
+        events += [
+            {"Event Id": 4, "Restaurant Id": 2, "Restaurant Name": "R2", "Photo URL": "u", "Event Title": "D",
+             "Event Start Date": "2019-04-01 18:00", "Event End Date": "2019-04-01 22:00"},
+            {"Event Id": 5, "Restaurant Id": 2, "Restaurant Name": "R2", "Photo URL": "u", "Event Title": "E",
+             "Event Start Date": "TBA", "Event End Date": "2019-04-02"},
+        ]
+        self.assertEqual(get_month_events(events, 2019, 4)["Event Id"].tolist(),
+                         [event["Event Id"] for event in events if event_in_month(event, 2019, 4)])
+        self.assertEqual(get_events_by_month(events, ["2019-04"], mode="overlapping")["2019-04"]["Event Id"].tolist(),
+                         [1, 2, 4])
+
+    # Tests for the output writers
+    def test_table_writer_compressed_csv_chunks(self):
+        records = [{"Event Id": i, "Event Date": None if i % 2 else "2019-04-01"} for i in range(5)]
+        for compression in ("gzip", "zstd"):
+            filename = os.path.join(self.cache_dir.name, output_filename("events", "csv", compression))
+            try:
+                with TableWriter(filename, "csv", compression, chunk_size=2) as writer:
+                    for record in records:
+                        writer.write(record)
+            except ImportError:
+                continue
+            result = pd.read_csv(filename, keep_default_na=False)
+            self.assertEqual(result["Event Id"].tolist(), list(range(5)))
+            self.assertEqual(result["Event Date"].tolist()[:2], ["2019-04-01", "NA"])
+
+    def test_table_writer_columnar_chunks(self):
+        try:
+            import pyarrow
+        except ImportError:
+            self.skipTest("pyarrow is not installed")
+        records = [{"Restaurant Id": i, "Restaurant Name": f"R{i}", "Country Code": 1, "City": f"City {i % 7}",
+                    "User Rating Votes": i, "User Aggregate Rating": 4.0, "Cuisines": f"Cuisine {i % 11}",
+                    "Event Date": "NA"} for i in range(400)]
+        for fmt in ("arrow", "parquet"):
+            filename = os.path.join(self.cache_dir.name, output_filename("restaurants", fmt))
+            # every chunk has other categories than the first one
+            with TableWriter(filename, fmt, chunk_size=3,
+                             build_frame=lambda chunk: records_to_frame(chunk, "restaurants")) as writer:
+                for record in records:
+                    writer.write(record)
+            result = pd.read_feather(filename) if fmt == "arrow" else pd.read_parquet(filename)
+            self.assertEqual(result["City"].astype(str).tolist(), [record["City"] for record in records])
+            self.assertEqual(result["Cuisines"].astype(str).tolist(), [record["Cuisines"] for record in records])
+
+    def test_table_writer_empty_stream_has_header(self):
+        filename = os.path.join(self.cache_dir.name, output_filename("events"))
+        with TableWriter(filename, build_frame=lambda chunk: records_to_frame(chunk, "events")):
+            pass
+        self.assertEqual(pd.read_csv(filename).columns.tolist(), [column for column, _ in EVENT_FIELDS])
+
+    def test_write_table_parquet_keeps_nulls(self):
+        try:
+            import pyarrow
+        except ImportError:
+            self.skipTest("pyarrow is not installed")
+        df = pd.DataFrame({
+            "City": pd.Categorical(["Sydney", None]),
+            "Event Date": pd.to_datetime(["2019-04-01", None]),
+        })
+        filename = os.path.join(self.cache_dir.name, output_filename("restaurants", "parquet"))
+        write_table(df, filename, "parquet")
+        result = pd.read_parquet(filename)
+        self.assertEqual(result["City"].dtype, "category")
+        self.assertEqual(result.isna().sum().tolist(), [1, 1])
+        with self.assertRaises(ValueError):
+            output_filename("restaurants", "arrow", "gzip")
+
+    # Test for concurrent multi-source ingestion
+    def test_get_feed_frames_merges_sources(self):
+        def feed(ids):
+            return [{"restaurants": [{"restaurant": {
+                "R": {"res_id": i}, "name": f"Restaurant {i}", "photos_url": "u",
+                "location": {"city_id": 1, "city": f"City {i}"},
+                "user_rating": {"votes": 1, "aggregate_rating": "4.0", "rating_text": "Very Good"},
+                "cuisines": "Italian",
+                "zomato_events": [{"event": {"event_id": i, "title": "T", "start_date": "2019-04-01", "end_date": "2019-04-02"}}],
+            }} for i in ids]}]
+
+        paths = []
+        for name, ids in (("north", [1, 2]), ("south", [2, 3])):
+            paths.append(os.path.join(self.cache_dir.name, f"{name}.json"))
+            with open(paths[-1], "w") as f:
+                json.dump(feed(ids), f)
+        missing = os.path.join(self.cache_dir.name, "missing.json")
+
+        frames = get_feed_frames(paths + [missing], ("restaurants", "events"))
+        self.assertEqual(frames["restaurants"]["Restaurant Id"].tolist(), [1, 2, 3])
+        self.assertEqual(frames["events"]["Event Id"].tolist(), [1, 2, 3])
+        self.assertEqual(frames["restaurants"]["City"].dtype, "category")
+
+        documents, reports = feed_cache.load_feeds(paths + [missing])
+        self.assertEqual(list(documents), paths)
+        self.assertEqual([r["error"] is None for r in reports], [True, True, False])
+
+    # Test for the incremental export
+    @patch('helper_functions.load_country_codes')
+    def test_run_incremental_patch_and_delta(self, mock_load_country_codes):
+        mock_load_country_codes.return_value = country_codes.CountryCodes(pd.DataFrame({'Country Code': [1], 'Country': ["India"]}))
+
+        def feed(names):
+            return [{"restaurants": [{"restaurant": {
+                "R": {"res_id": i}, "name": name, "photos_url": "u",
+                "location": {"city_id": 1, "city": "City"},
+                "user_rating": {"votes": 1, "aggregate_rating": "4.0", "rating_text": "Very Good"},
+                "cuisines": "Italian",
+                "zomato_events": [{"event": {"event_id": i, "title": "T", "start_date": "2019-04-01", "end_date": "2019-04-02"}}],
+            }} for i, name in names.items()]}]
+
+        cwd = os.getcwd()
+        os.chdir(self.cache_dir.name)
+        self.addCleanup(os.chdir, cwd)
+
+        incremental.run_incremental(feed({1: "A", 2: "B", 3: "C"}), "patch", year=2019, month=4)
+        changes = incremental.run_incremental(feed({1: "A", 2: "B2", 4: "D"}), "patch", year=2019, month=4)
+        self.assertEqual(changes["restaurants"], {"added": {"4"}, "changed": {"2"}, "deleted": {"3"}})
+
+        restaurants = pd.read_csv("restaurant_details.csv")
+        self.assertEqual(restaurants["Restaurant Id"].tolist(), [1, 2, 4])
+        self.assertEqual(restaurants["Restaurant Name"].tolist(), ["A", "B2", "D"])
+        self.assertEqual(pd.read_csv("event_details.csv")["Event Id"].tolist(), [1, 2, 4])
+
+        # delta runs keep their own state, patch runs are not affected by them
+        incremental.run_incremental(feed({1: "A", 2: "B2", 4: "D"}), "delta", year=2019, month=4)
+        incremental.run_incremental(feed({1: "A", 4: "D"}), "delta", year=2019, month=4)
+        delta = pd.read_csv("restaurant_details.delta.csv", keep_default_na=False)
+        self.assertEqual(delta[["Change", "Restaurant Id"]].values.tolist(), [["deleted", 2]])
+        with self.assertRaises(ValueError):
+            incremental.run_incremental(feed({1: "A"}), "patch", incremental.DELTA_STATE_PATH, year=2019, month=4)
+
+        # a csv that is missing or was not written from the state is exported in full, not patched
+        os.remove("restaurant_details.csv")
+        incremental.run_incremental(feed({1: "A", 2: "B2", 4: "D2"}), "patch", year=2019, month=4)
+        self.assertEqual(pd.read_csv("restaurant_details.csv")["Restaurant Name"].tolist(), ["A", "B2", "D2"])
+        self.assertEqual(pd.read_csv("event_details.csv")["Event Id"].tolist(), [1, 2, 4])
+        pd.read_csv("restaurant_details.csv").head(1).to_csv("restaurant_details.csv", index=False)
+        incremental.run_incremental(feed({1: "A", 2: "B2", 4: "D2"}), "patch", year=2019, month=4)
+        self.assertEqual(pd.read_csv("restaurant_details.csv")["Restaurant Id"].tolist(), [1, 2, 4])
+        self.assertEqual(pd.read_csv("restaurant_details.csv")["Restaurant Name"].tolist(), ["A", "B2", "D2"])
+
+        # an empty feed (e.g. a failed download) is refused instead of deleting every record
+        with open(incremental.STATE_PATH) as f:
+            state = f.read()
+        with self.assertRaises(ValueError):
+            incremental.run_incremental([], "patch", year=2019, month=4)
+        with open(incremental.STATE_PATH) as f:
+            self.assertEqual(f.read(), state)
+        self.assertEqual(pd.read_csv("restaurant_details.csv")["Restaurant Id"].tolist(), [1, 2, 4])
+
     # Test for save_to_csv function
     @patch('pandas.DataFrame.to_csv')
     def test_save_to_csv(self, mock_to_csv):
@@ -137,7 +528,7 @@ class TestFunctions(unittest.TestCase):
         filename = 'test_output.csv'
         save_to_csv(df, filename)
 
-        mock_to_csv.assert_called_once_with(filename, index=False)
+        mock_to_csv.assert_called_once_with(filename, index=False, na_rep="NA")
     
     # Test for get_user_ratings_df function
     @patch('helper_functions.read_json')
@@ -178,5 +569,24 @@ class TestFunctions(unittest.TestCase):
         self.assertEqual(result.shape[0], 5)
         self.assertEqual(result.columns.tolist(), ['user_rating_texts', 'min', 'max', 'mean'])
 
+    # Test for the compiled rating boundaries used by the analyzer app
+    def test_rating_boundaries_classification(self):
+        thresholds = pd.DataFrame({
+            "user_rating_texts": ["Poor", "Average", "Good", "Very Good", "Excellent"],
+            "min": np.array([2.2, 2.5, 3.5, 4.0, 4.5], dtype=np.float32),
+            "max": np.array([2.4, 3.4, 3.9, 4.4, 4.9], dtype=np.float32),
+        })
+        boundaries = RatingBoundaries(thresholds)
+
+        self.assertEqual(boundaries.classify(2.2), "Poor")
+        self.assertEqual(boundaries.classify(3.4), "Average")
+        self.assertEqual(boundaries.classify(4.9), "Excellent")
+        self.assertEqual(boundaries.classify(2.1), TOO_LOW)
+        self.assertEqual(boundaries.classify(5.0), TOO_HIGH)
+        self.assertEqual(boundaries.classify(2.45), UNKNOWN)
+
+        ratings = np.array([2.2, 3.4, 4.9, 2.1, 5.0, 2.45])
+        self.assertEqual(boundaries.classify_many(ratings).tolist(), [boundaries.classify(r) for r in ratings])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,83 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+import feed_cache
+
+COUNTRY_CODES_PATH = "../datasets/Country-Code.xlsx"
+KEY_COLUMN = "Country Code"
+
+# compiled tables already loaded in this run, keyed by (absolute path, mtime)
+_tables = {}
+
+
+class CountryCodes:
+    """
+    Compiled Country-Code table: an index over the codes plus one value array per other column,
+    so joining it onto a frame is a vectorised index lookup instead of a DataFrame.merge.
+    """
+
+    def __init__(self, df_countries):
+        df_countries = df_countries.drop_duplicates(KEY_COLUMN)
+        self.index = pd.Index(df_countries[KEY_COLUMN].to_numpy())
+        self.columns = {
+            column: df_countries[column].to_numpy()
+            for column in df_countries.columns if column != KEY_COLUMN
+        }
+
+    def lookup(self, codes):
+        """
+        Returns {column: values} for the given country codes, with NaN for unknown codes
+        """
+        positions = self.index.get_indexer(np.asarray(codes))
+        return {
+            column: pd.api.extensions.take(values, positions, allow_fill = True)
+            for column, values in self.columns.items()
+        }
+
+
+def _cache_path():
+    return os.path.join(feed_cache.CACHE_DIR, "country_codes.pkl")
+
+
+def clear_cache():
+    _tables.clear()
+
+
+def load_country_codes(path = COUNTRY_CODES_PATH):
+    """
+    Loads the country table compiled into a pickle next to the feed cache, re-reading the xlsx
+    file only when its modification time has changed since the pickle was written.
+
+    Args:
+        path (str, optional): location of Country-Code.xlsx. Defaults to COUNTRY_CODES_PATH.
+
+    Returns:
+        CountryCodes: the compiled table
+    """
+    source = os.path.abspath(path)
+    mtime = os.stat(source).st_mtime_ns
+    key = (source, mtime)
+    if key in _tables:
+        return _tables[key]
+
+    cache_path = _cache_path()
+    table = None
+    try:
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
+        if cached["source"] == source and cached["mtime"] == mtime:
+            table = cached["table"]
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError):
+        pass
+
+    if table is None:
+        table = CountryCodes(pd.read_excel(source))
+        os.makedirs(os.path.dirname(cache_path), exist_ok = True)
+        with open(cache_path, "wb") as f:
+            pickle.dump({"source": source, "mtime": mtime, "table": table}, f, protocol = pickle.HIGHEST_PROTOCOL)
+
+    _tables[key] = table
+    return table
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+# supported window predicates
+WINDOW_MODES = ("inside", "overlapping")
+
+
+def _to_datetime64(values):
+    # dates with a time of day are kept, anything that is not an ISO 8601 date becomes NaT and matches no window
+    return pd.to_datetime(pd.Series(values).replace("NA", None), format="ISO8601", errors="coerce").to_numpy()
+
+
+def month_windows(months):
+    """
+    Converts months given as "YYYY-MM" strings, (year, month) tuples or pd.Period objects into
+    {"YYYY-MM": (first day of month, first day of next month)} half-open windows
+    """
+    windows = {}
+    for month in months:
+        if isinstance(month, tuple):
+            month = f"{month[0]}-{month[1]:02d}"
+        period = pd.Period(month, freq="M")
+        windows[str(period)] = (period.start_time, (period + 1).start_time)
+    return windows
+
+
+def months_between(start, end):
+    """
+    Returns every "YYYY-MM" month from the month of start to the month of end inclusive
+    """
+    return [str(p) for p in pd.period_range(pd.Period(start, freq="M"), pd.Period(end, freq="M"), freq="M")]
+
+
+class EventIndex:
+    """
+    Sorted interval index over event start/end dates, parsed once into datetime64 arrays.
+
+    Events are ordered by start date so every window query is two binary searches over the start
+    dates followed by one vectorised end date comparison over the candidate slice. The longest
+    event duration bounds how far before a window an overlapping event can start.
+    """
+
+    def __init__(self, events_df, start_column = "Event Start Date", end_column = "Event End Date"):
+        starts = events_df[start_column]
+        ends = events_df[end_column]
+        starts = starts.to_numpy() if pd.api.types.is_datetime64_any_dtype(starts) else _to_datetime64(starts)
+        ends = ends.to_numpy() if pd.api.types.is_datetime64_any_dtype(ends) else _to_datetime64(ends)
+
+        # NaT sorts last, so undated events never fall inside a searchsorted slice
+        order = np.argsort(starts, kind = "stable")
+        self.events = events_df.reset_index(drop = True)
+        self._order = order
+        self._starts = starts[order]
+        self._ends = ends[order].astype(self._starts.dtype)
+
+        durations = self._ends - self._starts
+        valid = ~np.isnat(durations)
+        self._max_duration = durations[valid].max() if valid.any() else np.timedelta64(0, "D")
+
+    def __len__(self):
+        return len(self.events)
+
+    def _bounds(self, values):
+        return np.asarray([np.datetime64(pd.Timestamp(v)) for v in values]).astype(self._starts.dtype)
+
+    def positions(self, windows, mode = "inside"):
+        """
+        Returns, for each half-open [lo, hi) window, the positions of the matching events in self.events,
+        in their original order.
+
+        Args:
+            windows (list): (lo, hi) pairs of dates
+            mode (str): "inside" keeps events that start and end within the window,
+                "overlapping" keeps events active at any time within the window
+
+        Returns:
+            list: one int array of positions into self.events per window
+        """
+        if mode not in WINDOW_MODES:
+            raise ValueError(f"mode must be one of {WINDOW_MODES}")
+        if not windows:
+            return []
+
+        lows = self._bounds([lo for lo, _ in windows])
+        highs = self._bounds([hi for _, hi in windows])
+
+        # candidate slices for every window in one vectorised call
+        if mode == "inside":
+            first = np.searchsorted(self._starts, lows, side = "left")
+        else:
+            first = np.searchsorted(self._starts, lows - self._max_duration, side = "left")
+        last = np.searchsorted(self._starts, highs, side = "left")
+
+        result = []
+        for lo, hi, i, j in zip(lows, highs, first, last):
+            ends = self._ends[i:j]
+            if mode == "inside":
+                mask = (ends >= lo) & (ends < hi)
+            else:
+                mask = ends >= lo
+            result.append(np.sort(self._order[np.flatnonzero(mask) + i]))
+        return result
+
+    def query(self, windows, mode = "inside"):
+        """
+        Partitions the events over labelled windows.
+
+        Args:
+            windows (dict): label -> (lo, hi) half-open date window
+            mode (str): "inside" or "overlapping", see positions
+
+        Returns:
+            dict: label -> DataFrame of the matching events
+        """
+        labels = list(windows)
+        positions = self.positions([windows[label] for label in labels], mode)
+        return {label: self.events.iloc[pos].reset_index(drop = True) for label, pos in zip(labels, positions)}
+
+    def by_month(self, months, mode = "inside"):
+        """
+        Returns {"YYYY-MM": DataFrame} of the events inside (or overlapping) each of the given months
+        """
+        return self.query(month_windows(months), mode)
+
+    def inside(self, start, end):
+        return self.query({"window": (start, end)}, "inside")["window"]
+
+    def overlapping(self, start, end):
+        return self.query({"window": (start, end)}, "overlapping")["window"]
+
+    def active_on(self, dates):
+        """
+        Returns {date: DataFrame} of the events running on each of the given dates
+        """
+        windows = {}
+        for date in ([dates] if isinstance(dates, (str, pd.Timestamp)) else dates):
+            day = pd.Timestamp(date).normalize()
+            windows[date] = (day, day + pd.Timedelta(days = 1))
+        return self.query(windows, "overlapping")
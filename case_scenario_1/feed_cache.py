@@ -0,0 +1,277 @@
+import concurrent.futures
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+import requests
+
+# the http client shared by both scenarios lives in common/ at the root of the repository
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+from common.http_client import HttpClient
+
+# on-disk cache of downloaded feeds, one body file + one metadata file per url
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".feed_cache")
+# seconds a cached feed is served without contacting the server
+CACHE_TTL = 60 * 60
+# total size of cached bodies before the least recently used entries are evicted
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# seconds to wait for a server before a request is abandoned
+REQUEST_TIMEOUT = 30
+# maximum number of feeds fetched at the same time
+MAX_WORKERS = 8
+
+# {url: (parsed document, time it was fetched or revalidated)} shared by every caller, kept for as long as
+# the cached copy is fresh
+_documents = {}
+_client = None
+
+
+def _cache_paths(url, cache_dir):
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{key}.json"), os.path.join(cache_dir, f"{key}.meta")
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _replace_file(path, content):
+    """
+    Writes content (bytes) to path through a temporary file, so that concurrent readers see either
+    the previous file or the new one, never a partly written one.
+
+    Returns:
+        list: [inode, size] of the new file, which identify it as long as it is not replaced
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+            f.flush()
+            stat = os.fstat(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return [stat.st_ino, stat.st_size]
+
+
+def _write_meta(meta_path, meta):
+    _replace_file(meta_path, json.dumps(meta).encode("utf-8"))
+
+
+def _load_body(body_path, meta):
+    """
+    Returns the parsed cached body, or None if it is not the body meta was written for (it was
+    replaced or evicted by another download meanwhile)
+    """
+    try:
+        with open(body_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if meta.get("body") != [stat.st_ino, stat.st_size]:
+                return None
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    # mark the entry as recently used for eviction
+    os.utime(body_path)
+    return data
+
+
+def evict_cache(cache_dir=None, max_bytes=None):
+    """
+    Removes the least recently used cache entries until the cached bodies fit within max_bytes.
+
+    Args:
+        cache_dir (str, optional): cache directory. Defaults to CACHE_DIR.
+        max_bytes (int, optional): size budget in bytes. Defaults to CACHE_MAX_BYTES.
+
+    Returns:
+        int: number of entries evicted
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".json"):
+            stat = os.stat(os.path.join(cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name[:-len(".json")]))
+
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    # oldest access time first
+    for _, size, key in sorted(entries):
+        if total <= max_bytes:
+            break
+        for suffix in (".json", ".meta"):
+            try:
+                os.remove(os.path.join(cache_dir, key + suffix))
+            except FileNotFoundError:
+                pass
+        total -= size
+        evicted += 1
+    return evicted
+
+
+def clear_cache(disk=False, cache_dir=None):
+    """
+    Drops the in-memory documents, and the on-disk cache as well when disk is True.
+    """
+    _documents.clear()
+    cache_dir = cache_dir or CACHE_DIR
+    if disk and os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            if name.endswith((".json", ".meta")):
+                os.remove(os.path.join(cache_dir, name))
+
+
+def get_client():
+    """
+    Returns the HttpClient shared by every feed download: a keep-alive, gzip connection pool large
+    enough for MAX_WORKERS simultaneous requests per host, with retries of transient failures, a
+    circuit breaker per host and the latency and size of every request (see get_client().summary()).
+    """
+    global _client
+    if _client is None:
+        _client = HttpClient(pool_size=MAX_WORKERS, max_per_host=MAX_WORKERS, timeout=REQUEST_TIMEOUT)
+    return _client
+
+
+def load_feed(url, ttl=None, cache_dir=None, max_bytes=None, session=None, timeout=REQUEST_TIMEOUT, raise_errors=False):
+    """
+    Fetches and parses a json feed, backed by an on-disk cache keyed by url.
+    Local file paths are parsed directly and only kept in memory.
+
+    A parsed or cached copy younger than ttl is used as is, an older one is revalidated with the
+    ETag/Last-Modified validators sent by the server so an unchanged feed is not downloaded again.
+
+    Args:
+        url (str): url or local path of the json feed
+        ttl (int, optional): freshness lifetime in seconds. Defaults to CACHE_TTL.
+        cache_dir (str, optional): cache directory. Defaults to CACHE_DIR.
+        max_bytes (int, optional): size budget of the cache. Defaults to CACHE_MAX_BYTES.
+        session (HttpClient or requests.Session, optional): client to send the request with. Defaults to get_client().
+        timeout (float, optional): request timeout in seconds. Defaults to REQUEST_TIMEOUT.
+        raise_errors (bool, optional): raise requests.HTTPError instead of returning an empty list
+            when the server does not answer 200. Defaults to False.
+
+    Returns:
+        list | dict: the parsed document, or an empty list if the feed could not be fetched
+    """
+    ttl = CACHE_TTL if ttl is None else ttl
+    document = _documents.get(url)
+    if document is not None and time.time() - document[1] < ttl:
+        return document[0]
+
+    if not url.startswith(("http://", "https://")):
+        with open(url, "rb") as f:
+            data = json.load(f)
+        _documents[url] = (data, time.time())
+        return data
+
+    cache_dir = cache_dir or CACHE_DIR
+    body_path, meta_path = _cache_paths(url, cache_dir)
+    meta = _read_meta(meta_path) if os.path.exists(body_path) else None
+
+    # fresh copy on disk, no request needed
+    if meta is not None and time.time() - meta.get("fetched_at", 0) < ttl:
+        data = _load_body(body_path, meta)
+        if data is not None:
+            _documents[url] = (data, meta.get("fetched_at", 0))
+            return data
+        meta = None
+
+    headers = {}
+    if meta is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = (session or get_client()).get(url, headers=headers, timeout=timeout)
+
+    if response.status_code == 304 and meta is not None:
+        data = _load_body(body_path, meta)
+        if data is not None:
+            meta["fetched_at"] = time.time()
+            _write_meta(meta_path, meta)
+            _documents[url] = (data, meta["fetched_at"])
+            return data
+        # the cached body changed since its validators were read, download it again
+        response = (session or get_client()).get(url, timeout=timeout)
+
+    if response.status_code != 200:
+        if raise_errors:
+            raise requests.HTTPError(f"Status Code: {response.status_code}", response=response)
+        print(f"Failed to fetch data. Status Code: {response.status_code}")
+        return []
+
+    body = response.content
+    data = json.loads(body)
+    fetched_at = time.time()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # the meta names the body it belongs to, so a body replaced by a concurrent download is never
+    # served with the validators of another response
+    _write_meta(meta_path, {
+        "url": url,
+        "body": _replace_file(body_path, body),
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "fetched_at": fetched_at,
+    })
+    evict_cache(cache_dir, max_bytes)
+
+    _documents[url] = (data, fetched_at)
+    return data
+
+
+def load_feeds(sources, max_workers=MAX_WORKERS, timeout=REQUEST_TIMEOUT):
+    """
+    Fetches and parses many feeds (urls or local paths) concurrently through a bounded thread pool
+    sharing one keep-alive client, and reports the time taken and any failure per source.
+
+    Args:
+        sources (list): urls or local paths of the feeds
+        max_workers (int, optional): size of the thread pool. Defaults to MAX_WORKERS.
+        timeout (float, optional): request timeout in seconds. Defaults to REQUEST_TIMEOUT.
+
+    Returns:
+        tuple: ({source: parsed document} for the sources that succeeded,
+                [{"source", "seconds", "error"} report per source, in the order given])
+    """
+    sources = list(dict.fromkeys(sources))
+    client = get_client()
+
+    def fetch(source):
+        start = time.perf_counter()
+        try:
+            data = load_feed(source, session=client, timeout=timeout, raise_errors=True)
+            error = None
+        except (requests.RequestException, OSError, ValueError) as e:
+            data, error = None, f"{type(e).__name__}: {e}"
+        return data, {"source": source, "seconds": time.perf_counter() - start, "error": error}
+
+    documents, reports = {}, []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for source, (data, report) in zip(sources, executor.map(fetch, sources)):
+            reports.append(report)
+            if report["error"] is None:
+                documents[source] = data
+
+    print(f"Fetched {len(documents)} of {len(sources)} sources")
+    return documents, reports
@@ -0,0 +1,154 @@
+import codecs
+import json
+import re
+
+from feed_cache import REQUEST_TIMEOUT, get_client
+
+# bytes read from the source per chunk
+CHUNK_SIZE = 1 << 16
+
+# characters that change the nesting depth or start a string
+_STRUCTURAL = re.compile(r'["{}\[\]]')
+# characters that end a string or escape the next character
+_STRING_SPECIAL = re.compile(r'["\\]')
+_WHITESPACE = " \t\r\n"
+
+
+def iter_source_chunks(source, chunk_size=CHUNK_SIZE):
+    """
+    Yields the raw bytes of a feed chunk by chunk from an http(s) url, a local path or an open binary file.
+    """
+    if hasattr(source, "read"):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    elif source.startswith(("http://", "https://")):
+        with get_client().get(source, stream=True, timeout=REQUEST_TIMEOUT) as response:
+            if response.status_code != 200:
+                print(f"Failed to fetch data. Status Code: {response.status_code}")
+                return
+            yield from response.iter_content(chunk_size)
+
+    else:
+        with open(source, "rb") as f:
+            yield from iter_source_chunks(f, chunk_size)
+
+
+def _scan_element(buf, i, depth, in_string):
+    """
+    Advances through a partially received container starting at buf[i].
+
+    Returns (end, i, depth, in_string) where end is the index just past the container once it is
+    complete, or None when more input is needed, in which case i is where scanning resumes.
+    """
+    n = len(buf)
+    while True:
+        if in_string:
+            m = _STRING_SPECIAL.search(buf, i)
+            if m is None:
+                return None, n, depth, in_string
+            if m.group() == "\\":
+                if m.end() >= n:
+                    # escaped character not received yet, resume at the backslash
+                    return None, m.start(), depth, in_string
+                i = m.end() + 1
+                continue
+            in_string = False
+            i = m.end()
+            continue
+
+        m = _STRUCTURAL.search(buf, i)
+        if m is None:
+            return None, n, depth, in_string
+        c = m.group()
+        i = m.end()
+        if c == '"':
+            in_string = True
+        elif c in "{[":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return i, i, depth, in_string
+
+
+def iter_json_array(chunks):
+    """
+    Incrementally parses a top-level json array of objects/arrays and yields its elements one at a time.
+
+    Only the element currently being received is held in memory, so peak memory is bounded by the
+    largest element rather than by the whole document.
+
+    Args:
+        chunks (iterable): bytes chunks of the document, e.g. from iter_source_chunks
+
+    Yields:
+        dict | list: each decoded element of the array
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+    started = False
+    exhausted = False
+
+    def read_more():
+        nonlocal buf, pos, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buf = buf[pos:] + decoder.decode(b"", final=True)
+        else:
+            buf = buf[pos:] + decoder.decode(chunk)
+        pos = 0
+
+    while True:
+        # skip whitespace and separators between elements
+        while pos < len(buf) and (buf[pos] in _WHITESPACE or (started and buf[pos] == ",")):
+            pos += 1
+        if pos >= len(buf):
+            if exhausted:
+                raise ValueError("Unexpected end of json document")
+            read_more()
+            continue
+
+        c = buf[pos]
+        if not started:
+            if c != "[":
+                raise ValueError("Expected the feed to be a json array")
+            started = True
+            pos += 1
+            continue
+        if c == "]":
+            return
+        if c not in "{[":
+            raise ValueError(f"Expected an object or array element, found {c!r}")
+
+        # scan the element, reading more input until it is complete
+        start = pos
+        i, depth, in_string = pos, 0, False
+        while True:
+            end, i, depth, in_string = _scan_element(buf, i, depth, in_string)
+            if end is not None:
+                break
+            if exhausted:
+                raise ValueError("Unexpected end of json document")
+            offset = start
+            read_more()
+            i -= offset
+            start = 0
+
+        yield json.loads(buf[start:end])
+        pos = end
+
+
+def stream_restaurants(source, chunk_size=CHUNK_SIZE):
+    """
+    Yields the restaurant dictionaries of a feed one at a time while the feed is still being read.
+    """
+    for item in iter_json_array(iter_source_chunks(source, chunk_size)):
+        for d in item.get("restaurants", []):
+            yield d["restaurant"]
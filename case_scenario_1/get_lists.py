@@ -1,57 +1,292 @@
-import requests
+import numpy as np
 import pandas as pd
-import requests 
-
+from feed_cache import load_feed, load_feeds
+from feed_stream import stream_restaurants
+#fetches and parses the feed once per CACHE_TTL, calls in between share the same parsed document
 
+#fetches and parses the feed once per run, later calls share the same parsed document
 def read_json(url):
-    response = requests.get(url)
-    if response.status_code != 200:
-        print(f"Failed to fetch data. Status Code: {response.status_code}")
-        return []
-    return response.json()
+    return load_feed(url)
 
-#Create a list to store dictionary of restaurants details 
-def get_restaurant_list(url):
-    data = read_json(url)
-    restaurants_list = [
-        {
-            "Restaurant Id": restaurant["R"]["res_id"],
-            "Restaurant Name": restaurant["name"],
-            "Country Code": restaurant["location"]["city_id"],
-            "City": restaurant["location"]["city"],
-            "User Rating Votes": restaurant["user_rating"]["votes"],
-            "User Aggregate Rating": float(restaurant["user_rating"]["aggregate_rating"]),
-            "Cuisines": restaurant["cuisines"],
-            "Event Date": restaurant["zomato_events"][0]["event"]["start_date"] 
-            if restaurant.get("zomato_events") else "NA"
-        }   
-        #loop through list of restaurant results to obtain the restaurant dictionaries
-        for item in data
-        for restaurant in (d["restaurant"] for d in item.get("restaurants", []))
+# record sets that can be produced by a single pass over the feed
+RECORD_SETS = ("restaurants", "events", "ratings")
+
+
+# (column, getter) pairs of each record set, getters take the restaurant (and the event for event records)
+RESTAURANT_FIELDS = (
+    ("Restaurant Id", lambda restaurant: restaurant["R"]["res_id"]),
+    ("Restaurant Name", lambda restaurant: restaurant["name"]),
+    ("Country Code", lambda restaurant: restaurant["location"]["city_id"]),
+    ("City", lambda restaurant: restaurant["location"]["city"]),
+    ("User Rating Votes", lambda restaurant: restaurant["user_rating"]["votes"]),
+    ("User Aggregate Rating", lambda restaurant: float(restaurant["user_rating"]["aggregate_rating"])),
+    ("Cuisines", lambda restaurant: restaurant["cuisines"]),
+    ("Event Date", lambda restaurant: restaurant["zomato_events"][0]["event"]["start_date"]
+        if restaurant.get("zomato_events") else "NA"),
+)
+
+EVENT_FIELDS = (
+    ("Event Id", lambda restaurant, event: event["event"]["event_id"]),
+    ("Restaurant Id", lambda restaurant, event: restaurant["R"]["res_id"]),
+    ("Restaurant Name", lambda restaurant, event: restaurant["name"]),
+    ("Photo URL", lambda restaurant, event: restaurant["photos_url"]),
+    ("Event Title", lambda restaurant, event: event["event"]["title"]),
+    ("Event Start Date", lambda restaurant, event: event["event"]["start_date"]),
+    ("Event End Date", lambda restaurant, event: event["event"]["end_date"]),
+)
+
+RATING_FIELDS = (
+    ("user_rating_value", lambda restaurant: float(restaurant["user_rating"]["aggregate_rating"])),
+    ("user_rating_texts", lambda restaurant: str(restaurant["user_rating"]["rating_text"])),
+)
+
+RECORD_FIELDS = {"restaurants": RESTAURANT_FIELDS, "events": EVENT_FIELDS, "ratings": RATING_FIELDS}
+
+# dtypes the typed dataframes are built with, unlisted columns are kept as python objects
+COLUMN_TYPES = {
+    "restaurants": {
+        "Restaurant Id": "int", "Country Code": "int", "City": "category", "User Rating Votes": "int",
+        "User Aggregate Rating": "float32", "Cuisines": "category", "Event Date": "datetime",
+    },
+    "events": {
+        "Event Id": "int", "Restaurant Id": "int", "Event Start Date": "datetime", "Event End Date": "datetime",
+    },
+    "ratings": {
+        "user_rating_value": "float32", "user_rating_texts": "category",
+    },
+}
+
+
+def _restaurant_record(restaurant):
+    return {column: get(restaurant) for column, get in RESTAURANT_FIELDS}
+
+
+def _event_records(restaurant):
+    return [
+        {column: get(restaurant, event) for column, get in EVENT_FIELDS}
+        for event in restaurant.get("zomato_events", [])
     ]
 
-    print(f"Extracted details for {len(restaurants_list)} restaurants")   
-    return restaurants_list
+
+def _rating_record(restaurant):
+    return {column: get(restaurant) for column, get in RATING_FIELDS}
+
+
+#loop through list of restaurant results to obtain the restaurant dictionaries
+def iter_restaurants(data):
+    for item in data:
+        for d in item.get("restaurants", []):
+            yield d["restaurant"]
+
+
+def extract_records(data, outputs=RECORD_SETS):
+    """
+    Walks the data -> restaurants -> restaurant nesting once and builds every requested record set in that pass
+
+    Args:
+        data (list): parsed restaurant feed
+        outputs (tuple, optional): record sets to build, any of RECORD_SETS. Defaults to all of them.
+
+    Returns:
+        dict: record set name -> list of record dictionaries
+    """
+    unknown = set(outputs) - set(RECORD_SETS)
+    if unknown:
+        raise ValueError(f"Unknown record sets: {sorted(unknown)}")
+
+    records = {name: [] for name in outputs}
+    restaurants = records.get("restaurants")
+    events = records.get("events")
+    ratings = records.get("ratings")
+
+    for restaurant in iter_restaurants(data):
+        if restaurants is not None:
+            restaurants.append(_restaurant_record(restaurant))
+        if events is not None:
+            events.extend(_event_records(restaurant))
+        if ratings is not None:
+            ratings.append(_rating_record(restaurant))
+
+    for name in outputs:
+        print(f"Extracted details for {len(records[name])} {name}")
+    return records
+
+
+def stream_records(source, outputs=RECORD_SETS):
+    """
+    Streaming counterpart of extract_records: parses the feed incrementally from a url or local path
+    and yields (record set name, record) pairs as each restaurant is read, in a single pass.
+    """
+    unknown = set(outputs) - set(RECORD_SETS)
+    if unknown:
+        raise ValueError(f"Unknown record sets: {sorted(unknown)}")
+
+    for restaurant in stream_restaurants(source):
+        if "restaurants" in outputs:
+            yield "restaurants", _restaurant_record(restaurant)
+        if "events" in outputs:
+            for event in _event_records(restaurant):
+                yield "events", event
+        if "ratings" in outputs:
+            yield "ratings", _rating_record(restaurant)
+
+
+def extract_columns(data, outputs=RECORD_SETS):
+    """
+    Single traversal like extract_records, but appends every field straight into a per-column buffer
+    instead of building a dictionary per row
+
+    Returns:
+        dict: record set name -> dict of column name -> list of values
+    """
+    unknown = set(outputs) - set(RECORD_SETS)
+    if unknown:
+        raise ValueError(f"Unknown record sets: {sorted(unknown)}")
+
+    columns = {name: {column: [] for column, _ in RECORD_FIELDS[name]} for name in outputs}
+    # (buffer, getter) pairs per record set so the inner loops only append
+    restaurant_buffers = [(columns[name][column], get) for name in ("restaurants", "ratings") if name in columns
+                          for column, get in RECORD_FIELDS[name]]
+    event_buffers = [(columns["events"][column], get) for column, get in EVENT_FIELDS] if "events" in columns else []
+
+    for restaurant in iter_restaurants(data):
+        for buffer, get in restaurant_buffers:
+            buffer.append(get(restaurant))
+        if event_buffers:
+            for event in restaurant.get("zomato_events", []):
+                for buffer, get in event_buffers:
+                    buffer.append(get(restaurant, event))
+
+    for name in outputs:
+        print(f"Extracted details for {len(next(iter(columns[name].values())))} {name}")
+    return columns
+
+
+def _typed_column(values, dtype):
+    if dtype == "int":
+        try:
+            return np.asarray(values, dtype=np.int64)
+        except (ValueError, TypeError):
+            # non numeric ids are kept as they are
+            return np.asarray(values, dtype=object)
+    if dtype == "float32":
+        return np.asarray(values, dtype=np.float32)
+    if dtype == "category":
+        return pd.Categorical(values)
+    if dtype == "datetime":
+        try:
+            return pd.to_datetime([None if v == "NA" else v for v in values], format="%Y-%m-%d")
+        except (ValueError, TypeError):
+            return np.asarray(values, dtype=object)
+    return np.asarray(values, dtype=object)
+
+
+def columns_to_frame(columns, name):
+    """
+    Builds the dataframe of a record set from its column buffers using the dtypes in COLUMN_TYPES
+    """
+    types = COLUMN_TYPES[name]
+    return pd.DataFrame({column: _typed_column(values, types.get(column)) for column, values in columns.items()})
+
+
+def records_to_frame(records, name):
+    """
+    Builds a typed dataframe from a list of record dictionaries of the given record set
+    """
+    if not records:
+        # no rows, but the columns of the record set
+        return columns_to_frame({column: [] for column, _ in RECORD_FIELDS[name]}, name)
+    return columns_to_frame({column: [record[column] for record in records] for column in records[0]}, name)
+
+
+def extract_frames(data, outputs=RECORD_SETS):
+    columns = extract_columns(data, outputs)
+    return {name: columns_to_frame(columns[name], name) for name in outputs}
+
+
+# column each record set is de-duplicated on when several feeds are merged
+KEY_COLUMNS = {"restaurants": "Restaurant Id", "events": "Event Id"}
+
+
+def _is_multi_source(url):
+    return isinstance(url, (list, tuple))
+
+
+def _report_sources(reports, counts, name):
+    for report in reports:
+        if report["error"] is None:
+            print(f"  {report['source']}: {report['seconds']:.2f}s, {counts.get(report['source'], 0)} {name}")
+        else:
+            print(f"  {report['source']}: FAILED after {report['seconds']:.2f}s ({report['error']})")
+
+
+#fetches the feed (or a list of feeds concurrently) and builds typed dataframes of the requested record sets
+def get_feed_frames(url, outputs=RECORD_SETS):
+    if not _is_multi_source(url):
+        return extract_frames(read_json(url), outputs)
+
+    documents, reports = load_feeds(url)
+    per_source = {source: extract_frames(data, outputs) for source, data in documents.items()}
+    if outputs:
+        _report_sources(reports, {source: len(frames[outputs[0]]) for source, frames in per_source.items()}, outputs[0])
+
+    frames = {}
+    for name in outputs:
+        parts = [source_frames[name] for source_frames in per_source.values()]
+        if not parts:
+            frames[name] = columns_to_frame({}, name)
+            continue
+        df = pd.concat(parts, ignore_index=True)
+        if name in KEY_COLUMNS:
+            df = df.drop_duplicates(KEY_COLUMNS[name], keep="first", ignore_index=True)
+        # categories differ between sources, so rebuild the categoricals over the merged values
+        for column, dtype in COLUMN_TYPES[name].items():
+            if dtype == "category" and column in df:
+                df[column] = df[column].astype("category")
+        print(f"Merged {len(df)} {name} from {len(parts)} sources")
+        frames[name] = df
+    return frames
+
+
+#fetches the feed (or a list of feeds concurrently) and extracts the requested record sets in one traversal each
+def get_feed_records(url, outputs=RECORD_SETS):
+    if not _is_multi_source(url):
+        return extract_records(read_json(url), outputs)
+
+    documents, reports = load_feeds(url)
+    per_source = {source: extract_records(data, outputs) for source, data in documents.items()}
+    if outputs:
+        _report_sources(reports, {source: len(records[outputs[0]]) for source, records in per_source.items()}, outputs[0])
+
+    merged = {}
+    for name in outputs:
+        key = KEY_COLUMNS.get(name)
+        seen = set()
+        merged[name] = []
+        for records in per_source.values():
+            for record in records[name]:
+                if key is not None:
+                    if record[key] in seen:
+                        continue
+                    seen.add(record[key])
+                merged[name].append(record)
+        print(f"Merged {len(merged[name])} {name} from {len(per_source)} sources")
+    return merged
+
+
+#Create a list to store dictionary of restaurants details 
+def get_restaurant_list(url):
+    return get_feed_records(url, ("restaurants",))["restaurants"]
 
 #Create a list to store dictionary of event details 
 def get_events_list(url):
-    data = read_json(url)
-    # List comprehension to extract event details
-    events_list = [
-        {
-            "Event Id": event["event"]["event_id"],
-            "Restaurant Id": restaurant["R"]["res_id"],
-            "Restaurant Name": restaurant["name"],
-            "Photo URL": restaurant["photos_url"],
-            "Event Title": event["event"]["title"],
-            "Event Start Date": event["event"]["start_date"],
-            "Event End Date": event["event"]["end_date"]
-        }
-        for item in data
-        for restaurant in (d["restaurant"] for d in item.get("restaurants", []))
-        for event in restaurant.get("zomato_events", [])
-    ]
+    return get_feed_records(url, ("events",))["events"]
 
-    print(f"Extracted details for {len(events_list)} events")
-    return events_list
+#generator versions of the lists above, records are yielded while the feed is being read
+def iter_restaurant_list(source):
+    for _, record in stream_records(source, ("restaurants",)):
+        yield record
 
+def iter_events_list(source):
+    for _, record in stream_records(source, ("events",)):
+        yield record
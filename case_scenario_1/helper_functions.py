@@ -1,21 +1,39 @@
 import requests
 import pandas as pd
 from get_lists import get_restaurant_list
-from get_lists import read_json
+from get_lists import read_json, extract_frames, records_to_frame
+from event_index import EventIndex, month_windows
+from country_codes import load_country_codes
+from writers import write_table, output_filename, TableWriter, CHUNK_SIZE
 
 
 
-def get_restaurant_details(url):
+def get_restaurant_details(url, restaurants_list = None):
     """
-    Formats the restaurant details into a dataframe containing the county name in the Country Column
+    Formats the restaurant details into a dataframe containing the county name in the Country Column.
+    An already extracted restaurants_list (list of records or typed dataframe) can be passed in to avoid walking the feed again.
     """
-    df_countries = pd.read_excel("../datasets/Country-Code.xlsx")
-    #convert to a pd dataframe
-    df_main = pd.DataFrame(get_restaurant_list(url))
-    #merge on countries excel file to obtain country name
-    df_main = df_main.merge(df_countries, on = "Country Code", how = "left")
-    #drop country code column
-    df_main.drop(columns=["Country Code"], inplace = True)
+    countries = load_country_codes()
+    if restaurants_list is None:
+        restaurants_list = get_restaurant_list(url)
+    #convert to a typed pd dataframe
+    if not isinstance(restaurants_list, pd.DataFrame):
+        restaurants_list = records_to_frame(restaurants_list, "restaurants")
+    return add_country_names(restaurants_list, countries)
+
+
+def add_country_names(df_main, countries = None):
+    """
+    Replaces the Country Code column of a restaurant dataframe with the country name from the compiled
+    country table (see country_codes.load_country_codes), using a vectorised lookup instead of a merge
+    """
+    if countries is None:
+        countries = load_country_codes()
+    #look up the country columns for every code, then drop the country code column
+    country_columns = countries.lookup(df_main["Country Code"])
+    df_main = df_main.drop(columns=["Country Code"])
+    for column, values in country_columns.items():
+        df_main[column] = values
     return df_main
 
 
@@ -24,50 +42,83 @@ def get_month_events(events_list, year = None, month = None):
     Formats event details into a dataframe and filters for event data within a specified time frame given year & month (as integers) 
 
     Args:
-        events_list (_type_): _description_
-        year (_type_, optional): _description_. Defaults to None.
-        month (_type_, optional): _description_. Defaults to None.
+        events_list (list | DataFrame): event records or a typed events dataframe
+        year (int, optional): year of the events to keep. Defaults to None.
+        month (int, optional): month of the events to keep. Defaults to None.
 
     Returns:
-        _type_: _description_
+        DataFrame: the events that start and end within the month, or all events when no month is given
     """
+    events_df = events_list if isinstance(events_list, pd.DataFrame) else records_to_frame(events_list, "events")
     if year is not None and month is not None:
         year_month = f"{year}-{month:02d}"
-        filtered_events = []
-        for event in events_list:
-            start_date = event["Event Start Date"]
-            end_date = event["Event End Date"]
-            # Check if both start and end dates contain the target "YYYY-MM" string
-            if start_date.startswith(year_month) and end_date.startswith(year_month):
-                filtered_events.append(event)
-        print(f"Filtered {len(filtered_events)} events from {year}-{month:02d}")
+        filtered_events = get_events_by_month(events_df, [year_month])[year_month]
+        print(f"Filtered {len(filtered_events)} events from {year_month}")
     else:
-        filtered_events = events_list
+        filtered_events = events_df
         print(f"Returning all {len(filtered_events)} events (no filtering applied)")
     
-    return pd.DataFrame(filtered_events)
+    return filtered_events
+
+def get_events_by_month(events, months, mode = "inside"):
+    """
+    Partitions events over many months with a single date index instead of rescanning them per month
+
+    Args:
+        events (list | DataFrame | EventIndex): event records, a typed events dataframe or a prebuilt index
+        months (list): "YYYY-MM" strings or (year, month) tuples, see event_index.months_between for ranges
+        mode (str, optional): "inside" for events that start and end within the month,
+            "overlapping" for events running at any time in the month. Defaults to "inside".
+
+    Returns:
+        dict: "YYYY-MM" -> DataFrame of the events for that month
+    """
+    if not isinstance(events, EventIndex):
+        events_df = events if isinstance(events, pd.DataFrame) else records_to_frame(events, "events")
+        if events_df.empty:
+            return {month: events_df for month in month_windows(months)}
+        events = EventIndex(events_df)
+    return events.by_month(months, mode)
+
+
+def event_in_month(event, year, month):
+    year_month = f"{year}-{month:02d}"
+    # Check if both start and end dates contain the target "YYYY-MM" string
+    return event["Event Start Date"].startswith(year_month) and event["Event End Date"].startswith(year_month)
+
+
+def iter_month_events(events, year, month):
+    """
+    Lazily yields the events (dictionaries) that both start and end within the given year & month
+    """
+    for event in events:
+        if event_in_month(event, year, month):
+            yield event
+
+
+#writes records from a list or generator to a csv file in bounded-size chunks
+def save_records_to_csv(records, filename, chunk_size = CHUNK_SIZE, transform = None, compression = None):
+    with TableWriter(filename, "csv", compression, chunk_size, transform = transform) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.rows_written
 
 #a function to convert dataframes to csv files 
 def save_to_csv(df, filename):
-    df.fillna("NA", inplace = True)
+    #missing values are written as NA without rewriting typed (datetime/categorical) columns
     print(f"csv file {filename} saved successfully")
-    return df.to_csv(filename, index = False)
+    return write_table(df, filename)
+
+#saves a dataframe as <stem>.csv[.gz|.zst], <stem>.parquet or <stem>.arrow and returns the file name
+def save_table(df, stem, fmt = "csv", compression = None):
+    filename = output_filename(stem, fmt, compression)
+    write_table(df, filename, fmt, compression)
+    print(f"{fmt} file {filename} saved successfully")
+    return filename
 
 #formats user rating details: aggregate ratings & text values into a dataframe
 def get_user_ratings_df(url):
-    data = read_json(url)
-    ratings_list = [
-        {
-            "user_rating_value" : float(restaurant["user_rating"]["aggregate_rating"]),
-            "user_rating_texts" : str(restaurant["user_rating"]["rating_text"])
-        }
-        #loop through list of restaurant results to obtain the restaurant dictionaries
-        for item in data
-        for restaurant in (d["restaurant"] for d in item.get("restaurants", []))
-    ]
-    
-    print(f"Extracted details for {len(ratings_list)} events") 
-    return pd.DataFrame(ratings_list)
+    return extract_frames(read_json(url), ("ratings",))["ratings"]
 
 # formats the descriptive statistics (min, max amd mean) aggregate rating values given by users for diff rating texts
 def get_rating_thresholds(restaurants_url):
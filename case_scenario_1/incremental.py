@@ -0,0 +1,267 @@
+import csv
+import hashlib
+import io
+import json
+import os
+
+import pandas as pd
+
+from get_lists import iter_restaurants, extract_frames
+from helper_functions import get_restaurant_details, get_month_events
+from writers import write_table, CSV_NA_REP
+
+# state file holding the content hash of every exported restaurant and event, one per mode
+STATE_PATH = "export_state.json"
+DELTA_STATE_PATH = "export_state.delta.json"
+# ways the changes can be written out
+MODES = ("patch", "delta")
+STATE_PATHS = {"patch": STATE_PATH, "delta": DELTA_STATE_PATH}
+
+
+def _digest(obj):
+    return hashlib.blake2b(json.dumps(obj, sort_keys = True, separators = (",", ":")).encode("utf-8"), digest_size = 8).hexdigest()
+
+
+def load_state(path = STATE_PATH):
+    try:
+        with open(path, "r", encoding = "utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"restaurants": {}, "events": {}}
+
+
+def _file_digest(filename):
+    # identity of an exported csv, recorded in the state so a patch run only patches the file it wrote
+    try:
+        with open(filename, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def _unique_restaurants(data):
+    # first occurrence of every restaurant, like diff_feed
+    restaurants = {}
+    for restaurant in iter_restaurants(data):
+        restaurants.setdefault(str(restaurant["R"]["res_id"]), restaurant)
+    return list(restaurants.values())
+
+
+def _export_frames(restaurants, year, month):
+    frames = extract_frames([{"restaurants": [{"restaurant": r} for r in restaurants]}], ("restaurants", "events"))
+    return {
+        "restaurants": ("restaurant_details", get_restaurant_details(None, frames["restaurants"])),
+        "events": ("event_details", get_month_events(frames["events"], year, month)),
+    }
+
+
+def save_state(state, path = STATE_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding = "utf-8") as f:
+        json.dump(state, f, separators = (",", ":"))
+    os.replace(tmp_path, path)
+
+
+def diff_feed(data, state):
+    """
+    Compares the restaurants and events of a parsed feed with the hashes recorded in state.
+
+    A restaurant hash covers its whole source dictionary, events included, so any change to a
+    restaurant or one of its events marks the restaurant as changed.
+
+    Args:
+        data (list): parsed restaurant feed
+        state (dict): state from load_state
+
+    Returns:
+        tuple: (list of the added or changed restaurant dictionaries,
+                {"restaurants"/"events": {"added", "changed", "deleted": set of ids as strings}},
+                the new state)
+    """
+    new_state = {"restaurants": {}, "events": {}}
+    changes = {name: {"added": set(), "changed": set(), "deleted": set()} for name in new_state}
+    touched = []
+
+    for restaurant in iter_restaurants(data):
+        restaurant_id = str(restaurant["R"]["res_id"])
+        # keep the first occurrence of a restaurant listed twice
+        if restaurant_id in new_state["restaurants"]:
+            continue
+        digest = _digest(restaurant)
+        new_state["restaurants"][restaurant_id] = digest
+        previous = state["restaurants"].get(restaurant_id)
+        unchanged = previous == digest
+        if not unchanged:
+            touched.append(restaurant)
+            changes["restaurants"]["added" if previous is None else "changed"].add(restaurant_id)
+
+        for event in restaurant.get("zomato_events", []):
+            event_id = str(event["event"]["event_id"])
+            # events of an unchanged restaurant are unchanged as well
+            if unchanged and event_id in state["events"]:
+                new_state["events"][event_id] = state["events"][event_id]
+                continue
+            event_digest = _digest([event, restaurant_id, restaurant["name"], restaurant["photos_url"]])
+            new_state["events"][event_id] = event_digest
+            previous_event = state["events"].get(event_id)
+            if previous_event is None:
+                changes["events"]["added"].add(event_id)
+            elif previous_event != event_digest:
+                changes["events"]["changed"].add(event_id)
+
+    for name in new_state:
+        changes[name]["deleted"] = set(state[name]) - set(new_state[name])
+    return touched, changes, new_state
+
+
+def _csv_rows(df):
+    """
+    Renders a frame exactly as save_to_csv would and returns (header, {id: row}) keyed on the first column
+    """
+    text = df.to_csv(index = False, na_rep = CSV_NA_REP)
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader, [])
+    return header, {row[0]: row for row in reader}
+
+
+def patch_csv(filename, header, new_rows, removed_ids):
+    """
+    Rewrites a csv file in place of a full rebuild: rows whose id (first column) is in new_rows are
+    replaced where they are, rows in removed_ids are dropped and the remaining new rows are appended.
+
+    Returns:
+        int: number of rows in the patched file
+    """
+    new_rows = dict(new_rows)
+    tmp_path = filename + ".tmp"
+    count = 0
+    with open(tmp_path, "w", newline = "", encoding = "utf-8") as out:
+        writer = csv.writer(out, lineterminator = "\n")
+        existing_header = None
+        if os.path.exists(filename):
+            with open(filename, "r", newline = "", encoding = "utf-8") as f:
+                reader = csv.reader(f)
+                existing_header = next(reader, None)
+                if header and existing_header and existing_header != header:
+                    raise ValueError(f"Columns of {filename} differ from the new records, run a full export instead")
+                writer.writerow(existing_header or header)
+                for row in reader:
+                    row_id = row[0]
+                    if row_id in new_rows:
+                        writer.writerow(new_rows.pop(row_id))
+                    elif row_id in removed_ids:
+                        continue
+                    else:
+                        writer.writerow(row)
+                    count += 1
+        if existing_header is None:
+            writer.writerow(header)
+        for row in new_rows.values():
+            writer.writerow(row)
+            count += 1
+    os.replace(tmp_path, filename)
+    return count
+
+
+def write_csv(filename, header, rows):
+    """
+    Writes a whole csv file from its header and rows, replacing any previous file at once
+
+    Returns:
+        int: number of rows written
+    """
+    tmp_path = filename + ".tmp"
+    with open(tmp_path, "w", newline = "", encoding = "utf-8") as out:
+        writer = csv.writer(out, lineterminator = "\n")
+        writer.writerow(header)
+        writer.writerows(rows.values())
+    os.replace(tmp_path, filename)
+    return len(rows)
+
+
+def write_delta(filename, header, new_rows, changes):
+    """
+    Writes the added/changed rows and the ids of the deleted rows to a delta csv with a leading Change column
+    """
+    records = []
+    for change in ("added", "changed"):
+        for row_id in sorted(changes[change] & set(new_rows)):
+            records.append([change] + new_rows[row_id])
+    for row_id in sorted(changes["deleted"]):
+        records.append(["deleted", row_id] + [CSV_NA_REP] * (len(header) - 1))
+    write_table(pd.DataFrame(records, columns = ["Change"] + header), filename)
+    return len(records)
+
+
+def run_incremental(data, mode = "patch", state_path = None, year = None, month = None):
+    """
+    Re-extracts, re-joins and re-writes only the restaurants and events that were added, changed or
+    deleted since the last run, as recorded in the state file.
+
+    Args:
+        data (list): parsed restaurant feed
+        mode (str, optional): "patch" updates restaurant_details.csv and event_details.csv in place,
+            "delta" writes restaurant_details.delta.csv and event_details.delta.csv. Defaults to "patch".
+        state_path (str, optional): location of the state file. Defaults to STATE_PATH in patch mode
+            and DELTA_STATE_PATH in delta mode: each mode keeps its own state.
+        year (int, optional): year of the exported events, see get_month_events
+        month (int, optional): month of the exported events, see get_month_events
+
+    Returns:
+        dict: the added/changed/deleted ids per record set
+
+    A csv file that is missing, or differs from the one the state was saved with (deleted, edited or
+    written by another run), is exported in full from the feed instead of being patched.
+
+    Raises:
+        ValueError: if the feed holds no restaurants, or the state file was written in the other mode;
+            the state file and outputs are left untouched
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+
+    state_path = state_path or STATE_PATHS[mode]
+    state = load_state(state_path)
+    if state.get("mode", mode) != mode:
+        raise ValueError(f"{state_path} holds the state of {state['mode']} runs, give {mode} runs their own state file")
+    touched, changes, new_state = diff_feed(data, state)
+    # an empty feed is far more likely a failed download than every restaurant having been removed
+    if not new_state["restaurants"]:
+        raise ValueError("the feed holds no restaurants, refusing to export it as deleting every record")
+    for name, change in changes.items():
+        print(f"{name}: {len(change['added'])} added, {len(change['changed'])} changed, {len(change['deleted'])} deleted")
+
+    # only the touched restaurants are extracted and joined
+    outputs = _export_frames(touched, year, month)
+    full_outputs = None
+    outputs_state = state.get("outputs", {})
+    new_state["mode"], new_state["outputs"] = mode, {}
+
+    for name, (stem, df) in outputs.items():
+        header, new_rows = _csv_rows(df)
+        change = changes[name]
+        if mode == "patch":
+            filename = stem + ".csv"
+            recorded = outputs_state.get(filename)
+            if recorded is None or _file_digest(filename) != recorded:
+                print(f"csv file {filename} is missing or was not written from {state_path}, exporting it in full")
+                if full_outputs is None:
+                    full_outputs = _export_frames(_unique_restaurants(data), year, month)
+                header, rows = _csv_rows(full_outputs[name][1])
+                rows = write_csv(filename, header, rows)
+            elif not any(change.values()):
+                print(f"csv file {filename} is up to date")
+                new_state["outputs"][filename] = recorded
+                continue
+            else:
+                # changed events that left the exported month have to be removed as well
+                removed = change["deleted"] | (change["changed"] - set(new_rows))
+                rows = patch_csv(filename, header, new_rows, removed)
+            new_state["outputs"][filename] = _file_digest(filename)
+        else:
+            filename = stem + ".delta.csv"
+            rows = write_delta(filename, header, new_rows, change)
+        print(f"csv file {filename} saved successfully ({rows} rows)")
+
+    save_state(new_state, state_path)
+    return changes
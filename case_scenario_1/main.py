@@ -1,18 +1,76 @@
-from helper_functions import get_restaurant_details, save_to_csv, get_month_events
-from get_lists import get_events_list
+import argparse
+import sys
+from helper_functions import get_restaurant_details, save_table, get_month_events, add_country_names, event_in_month
+from get_lists import get_feed_frames, stream_records, records_to_frame
+from feed_cache import load_feeds
+from writers import TableWriter, output_filename, FORMATS, COMPRESSIONS
+from incremental import run_incremental, MODES
 #generating restaurant_details.csv file
 restaurants_url = "https://raw.githubusercontent.com/Papagoat/brain-assessment/main/restaurant_data.json"
 
-restaurants_df = get_restaurant_details(restaurants_url)
-print(restaurants_df.head())
-print(restaurants_df.info())
-save_to_csv(restaurants_df, "restaurant_details.csv")
 
-events_df = get_month_events(get_events_list(restaurants_url), 2019, 4)
-print(events_df.head())
-print(events_df.info())
-save_to_csv(events_df, "event_details.csv")
+def run(source, fmt = "csv", compression = None):
+    #restaurants and events are extracted into typed columns in a single pass over the feed
+    frames = get_feed_frames(source, ("restaurants", "events"))
 
+    restaurants_df = get_restaurant_details(source, frames["restaurants"])
+    print(restaurants_df.head())
+    print(restaurants_df.info())
+    save_table(restaurants_df, "restaurant_details", fmt, compression)
 
+    events_df = get_month_events(frames["events"], 2019, 4)
+    print(events_df.head())
+    print(events_df.info())
+    save_table(events_df, "event_details", fmt, compression)
 
 
+def run_streaming(source, fmt = "csv", compression = None):
+    #parses the feed while it is read and writes both files chunk by chunk in a single pass
+    with TableWriter(output_filename("restaurant_details", fmt, compression), fmt, compression,
+                     build_frame = lambda records: records_to_frame(records, "restaurants"),
+                     transform = add_country_names) as restaurant_writer, \
+            TableWriter(output_filename("event_details", fmt, compression), fmt, compression,
+                        build_frame = lambda records: records_to_frame(records, "events")) as event_writer:
+        for name, record in stream_records(source, ("restaurants", "events")):
+            if name == "restaurants":
+                restaurant_writer.write(record)
+            elif event_in_month(record, 2019, 4):
+                event_writer.write(record)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Generates restaurant_details.csv and event_details.csv from the restaurant feed")
+    parser.add_argument("sources", nargs = "*", default = [restaurants_url],
+                        help = "urls or local paths of the restaurant feeds, several feeds are fetched concurrently and merged")
+    parser.add_argument("--stream", action = "store_true", help = "parse the feed incrementally and write the files in chunks")
+    parser.add_argument("--format", choices = list(FORMATS), default = "csv", help = "output file format")
+    parser.add_argument("--compression", choices = list(COMPRESSIONS), default = None, help = "compress the output files")
+    parser.add_argument("--incremental", choices = list(MODES), default = None,
+                        help = "only re-export the records changed since the last run, patching the csv files or writing delta files")
+    parser.add_argument("--state", default = None,
+                        help = "state file used by --incremental, by default export_state.json for patch and export_state.delta.json for delta")
+    args = parser.parse_args()
+
+    if args.incremental:
+        if args.stream or args.format != "csv" or args.compression:
+            parser.error("--incremental writes uncompressed csv files and cannot be combined with --stream")
+        documents, reports = load_feeds(args.sources)
+        #a feed missing from this run would have all of its records diffed as deleted, so nothing is written
+        failed = [report["source"] for report in reports if report["error"] is not None or not documents.get(report["source"])]
+        if failed:
+            for report in reports:
+                if report["source"] in failed:
+                    print(f"Could not load {report['source']}: {report['error'] or 'empty feed'}")
+            sys.exit("Incremental export aborted, the state file and csv files were left unchanged")
+        #the pages of every feed are chained, restaurants listed in several feeds keep their first occurrence
+        data = [item for document in documents.values() for item in document]
+        try:
+            run_incremental(data, args.incremental, args.state, 2019, 4)
+        except ValueError as e:
+            sys.exit(f"Incremental export aborted: {e}")
+    elif args.stream:
+        if len(args.sources) > 1:
+            parser.error("--stream takes a single feed")
+        run_streaming(args.sources[0], args.format, args.compression)
+    else:
+        run(args.sources[0] if len(args.sources) == 1 else args.sources, args.format, args.compression)
@@ -0,0 +1,61 @@
+import numpy as np
+
+TOO_LOW = "No user has ever given such a low rating"
+TOO_HIGH = "No user has ever given such a high rating"
+UNKNOWN = "Unknown: There is no data containing information on the texts associated with this rating score"
+
+
+class RatingBoundaries:
+    """
+    Rating thresholds (see helper_functions.get_rating_thresholds) compiled into sorted boundary arrays,
+    so a rating is classified with one binary search over the category lower bounds.
+
+    Ratings are compared in the dtype of the thresholds, so a slider value of 2.2 matches a float32
+    minimum of 2.2. If two categories overlap, the one with the higher lower bound wins.
+    """
+
+    def __init__(self, thresholds):
+        thresholds = thresholds.dropna(subset = ["min", "max"]).sort_values("min", kind = "stable")
+        self.categories = np.asarray(thresholds["user_rating_texts"].astype(str), dtype = object)
+        self.lows = thresholds["min"].to_numpy()
+        self.highs = thresholds["max"].to_numpy().astype(self.lows.dtype)
+        self.lowest = self.lows.min() if len(self.lows) else np.nan
+        self.highest = self.highs.max() if len(self.highs) else np.nan
+
+    def classify(self, rating):
+        """
+        Returns the rating text of a single aggregate rating
+        """
+        rating = self.lows.dtype.type(rating)
+        if len(self.lows) == 0:
+            return UNKNOWN
+        if rating < self.lowest:
+            return TOO_LOW
+        if rating > self.highest:
+            return TOO_HIGH
+        i = int(np.searchsorted(self.lows, rating, side = "right")) - 1
+        if i >= 0 and rating <= self.highs[i]:
+            return self.categories[i]
+        return UNKNOWN
+
+    def classify_many(self, ratings):
+        """
+        Classifies a whole array of ratings at once.
+
+        Args:
+            ratings (array-like): aggregate ratings
+
+        Returns:
+            numpy.ndarray: object array with the rating text (or out of range message) of every rating
+        """
+        ratings = np.asarray(ratings).astype(self.lows.dtype)
+        result = np.full(ratings.shape, UNKNOWN, dtype = object)
+        if len(self.lows) == 0:
+            return result
+
+        i = np.searchsorted(self.lows, ratings, side = "right") - 1
+        found = (i >= 0) & (ratings <= self.highs[np.clip(i, 0, None)])
+        result[found] = self.categories[i[found]]
+        result[ratings < self.lowest] = TOO_LOW
+        result[ratings > self.highest] = TOO_HIGH
+        return result
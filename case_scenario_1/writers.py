@@ -0,0 +1,170 @@
+import gzip
+import io
+
+import pandas as pd
+
+# supported output formats and the file extension each one is written with
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+# supported compressions and the suffix appended to compressed csv files
+COMPRESSIONS = {"gzip": ".gz", "zstd": ".zst"}
+# how missing values are spelled in csv files, columnar formats store real nulls
+CSV_NA_REP = "NA"
+# number of records formatted and written per chunk when streaming
+CHUNK_SIZE = 10000
+
+
+def output_filename(stem, fmt = "csv", compression = None):
+    """
+    Returns the file name of an output table, e.g. restaurant_details.csv.gz for gzip compressed csv
+    """
+    _check_options(fmt, compression)
+    filename = stem + FORMATS[fmt]
+    if fmt == "csv" and compression is not None:
+        filename += COMPRESSIONS[compression]
+    return filename
+
+
+def _check_options(fmt, compression):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown output format {fmt!r}, expected one of {list(FORMATS)}")
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression {compression!r}, expected one of {list(COMPRESSIONS)}")
+    if fmt == "arrow" and compression == "gzip":
+        raise ValueError("Arrow files only support zstd compression")
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Writing parquet or arrow files requires pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+
+def _decoded_schema(pa, schema):
+    # dictionary (categorical) columns as their plain values
+    fields = [field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field for field in schema]
+    return pa.schema(fields, metadata = schema.metadata)
+
+
+def _open_text(filename, compression):
+    if compression is None:
+        return open(filename, "w", newline = "", encoding = "utf-8")
+    if compression == "gzip":
+        return gzip.open(filename, "wt", newline = "", encoding = "utf-8")
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd compression requires zstandard (pip install zstandard)") from None
+    raw = open(filename, "wb")
+    return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(raw, closefd = True), encoding = "utf-8", newline = "")
+
+
+def write_table(df, filename, fmt = "csv", compression = None):
+    """
+    Writes a dataframe as csv (optionally gzip/zstd compressed), parquet or arrow.
+
+    Missing values are written as NA in csv files and as nulls in parquet/arrow files, without
+    filling or copying the frame, so typed columns stay typed.
+
+    Args:
+        df (DataFrame): the table to write
+        filename (str): output path, see output_filename
+        fmt (str, optional): "csv", "parquet" or "arrow". Defaults to "csv".
+        compression (str, optional): None, "gzip" or "zstd". Defaults to None.
+    """
+    _check_options(fmt, compression)
+    if fmt == "csv":
+        if compression is None:
+            return df.to_csv(filename, index = False, na_rep = CSV_NA_REP)
+        with _open_text(filename, compression) as f:
+            return df.to_csv(f, index = False, na_rep = CSV_NA_REP)
+
+    pa = _pyarrow()
+    table = pa.Table.from_pandas(df, preserve_index = False)
+    if fmt == "parquet":
+        pa.parquet.write_table(table, filename, compression = compression or "snappy")
+    else:
+        with pa.ipc.new_file(filename, table.schema, options = pa.ipc.IpcWriteOptions(compression = compression)) as writer:
+            writer.write_table(table)
+
+
+class TableWriter:
+    """
+    Streams records (dictionaries) into a csv, parquet or arrow file in chunks of chunk_size rows,
+    so only one chunk is held as a dataframe at a time.
+
+    Args:
+        filename (str): output path, see output_filename
+        fmt (str, optional): "csv", "parquet" or "arrow". Defaults to "csv".
+        compression (str, optional): None, "gzip" or "zstd". Defaults to None.
+        chunk_size (int, optional): records per chunk. Defaults to CHUNK_SIZE.
+        build_frame (callable, optional): turns a list of records into a dataframe. Defaults to pd.DataFrame.
+        transform (callable, optional): applied to every chunk dataframe before it is written.
+    """
+
+    def __init__(self, filename, fmt = "csv", compression = None, chunk_size = CHUNK_SIZE, build_frame = None, transform = None):
+        _check_options(fmt, compression)
+        self.filename = filename
+        self.fmt = fmt
+        self.compression = compression
+        self.chunk_size = chunk_size
+        self.build_frame = build_frame or pd.DataFrame
+        self.transform = transform
+        self.rows_written = 0
+        self._chunk = []
+        self._handle = None
+        self._schema = None
+
+    def write(self, record):
+        self._chunk.append(record)
+        if len(self._chunk) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._chunk and self._handle is not None:
+            return
+        df = self.build_frame(self._chunk)
+        # an empty first chunk is still transformed, for the header of a file without rows
+        if self.transform is not None and len(df.columns):
+            df = self.transform(df)
+
+        if self.fmt == "csv":
+            header = self._handle is None
+            if header:
+                self._handle = _open_text(self.filename, self.compression)
+            df.to_csv(self._handle, index = False, na_rep = CSV_NA_REP, header = header)
+        else:
+            pa = _pyarrow()
+            # later chunks are cast to the schema of the first one
+            table = pa.Table.from_pandas(df, schema = self._schema, preserve_index = False)
+            if self._handle is None:
+                if self.fmt == "arrow":
+                    # every chunk has its own categorical dictionaries, which an arrow file cannot replace
+                    table = table.cast(_decoded_schema(pa, table.schema))
+                self._schema = table.schema
+                if self.fmt == "parquet":
+                    self._handle = pa.parquet.ParquetWriter(self.filename, self._schema, compression = self.compression or "snappy")
+                else:
+                    self._handle = pa.ipc.new_file(self.filename, self._schema,
+                                                   options = pa.ipc.IpcWriteOptions(compression = self.compression))
+            self._handle.write_table(table)
+
+        self.rows_written += len(self._chunk)
+        self._chunk = []
+
+    def close(self):
+        self.flush()
+        self._handle.close()
+        print(f"{self.fmt} file {self.filename} saved successfully ({self.rows_written} rows)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._handle is not None:
+            self._handle.close()
@@ -0,0 +1,305 @@
+import re
+
+import numpy as np
+
+from fuzzy_match import ApproximateMatcher
+
+# length of the substrings indexed
+NGRAM = 3
+# characters that give str.contains(regex=True) a meaning other than a plain substring search
+_REGEX_SPECIAL = re.compile(r'[.^$*+?{}\[\]\\|()]')
+# a word between two \b boundaries, the block tokens of an address (e.g. 98A, 270 and 271 of 270/271)
+_WORD = re.compile(r'\w+')
+# spaces around the dash of a block range
+_DASH = re.compile(r'\s*-\s*')
+# first numeric block range of an address, once spaces around dashes are removed (e.g. 514-519)
+_RANGE = re.compile(r'(\d+)-(\d+)')
+# block inputs that are looked up as a single token, anything else is matched with a regex
+_PLAIN_BLOCK = re.compile(r'[A-Za-z0-9_]+')
+
+
+def _carried_pairs(previous, source):
+    """
+    Returns the (token id, position) pairs of previous for the rows taken over from it: row i gets the pairs of
+    row source[i] of previous, rows with source -1 get none
+    """
+    order = np.argsort(previous._positions, kind = "stable")
+    counts = np.bincount(previous._positions, minlength = len(previous))
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    kept = np.flatnonzero(source >= 0)
+    lengths = counts[source[kept]]
+    # position of every carried pair among the pairs of previous sorted by row
+    starts = offsets[source[kept]] - (np.cumsum(lengths) - lengths)
+    gathered = order[np.repeat(starts, lengths) + np.arange(lengths.sum())]
+    return previous._keys[gathered], np.repeat(kept, lengths)
+
+
+def _posting_pairs(texts, positions, tokenize, vocabulary, ids):
+    """
+    Returns the (token id, position) pairs of the distinct tokens of texts[position] for every given position,
+    adding the tokens not seen before to vocabulary/ids
+    """
+    keys, kept = [], []
+    for position in positions:
+        text = texts[position]
+        if text is None:
+            continue
+        for token in tokenize(text):
+            key = ids.get(token)
+            if key is None:
+                key = ids[token] = len(vocabulary)
+                vocabulary.append(token)
+            keys.append(key)
+            kept.append(position)
+    return np.array(keys, dtype = np.int64), np.array(kept, dtype = np.int64)
+
+
+def _postings(keys, positions, vocabulary):
+    """
+    Groups (token id, position) pairs into {token: sorted positions}
+    """
+    order = np.lexsort((positions, keys))
+    keys, positions = keys[order], positions[order]
+    bounds = np.flatnonzero(np.diff(keys)) + 1
+    firsts = keys[np.concatenate(([0], bounds))] if len(keys) else keys
+    return {vocabulary[key]: run for key, run in zip(firsts.tolist(), np.split(positions, bounds))}
+
+
+class _Postings:
+    """
+    Inverted index from tokens to the sorted positions of the texts containing them, kept as flat (token id, position)
+    pairs as well, so that an index of a new version of the texts can carry over the pairs of the texts that did not
+    change and only tokenize the others.
+    """
+
+    def _index(self, texts, tokenize, previous = None, source = None):
+        if previous is None:
+            self._vocabulary, self._ids = [], {}
+            self._keys, self._positions = _posting_pairs(texts, range(len(texts)), tokenize, self._vocabulary, self._ids)
+        else:
+            self._vocabulary, self._ids = list(previous._vocabulary), dict(previous._ids)
+            carried_keys, carried_positions = _carried_pairs(previous, source)
+            keys, positions = _posting_pairs(texts, np.flatnonzero(source < 0).tolist(), tokenize, self._vocabulary, self._ids)
+            self._keys = np.concatenate((carried_keys, keys))
+            self._positions = np.concatenate((carried_positions, positions))
+        self.postings = _postings(self._keys, self._positions, self._vocabulary)
+
+
+class NgramIndex(_Postings):
+    """
+    Inverted index from every n-gram of a list of texts to the sorted positions of the texts containing it.
+
+    A substring query intersects the posting lists of its n-grams, starting with the shortest, and only the
+    remaining candidates are checked, instead of scanning every text. Matching is case-insensitive.
+
+    Given previous (the index of an earlier version of the texts) and source (for every text, the position of
+    the same text in previous, -1 if it is new or changed), only the new texts are broken into n-grams.
+    """
+
+    def __init__(self, texts, n = NGRAM, previous = None, source = None):
+        self.n = n
+        # None marks a missing value, which never matches (like na=False)
+        if previous is None:
+            self.texts = [text.lower() if isinstance(text, str) else None for text in texts]
+        else:
+            self.texts = [previous.texts[old] if old >= 0 else text.lower() if isinstance(text, str) else None
+                          for text, old in zip(texts, source.tolist())]
+        # case-insensitive regex matching only reduces to lower() for ascii text
+        self.ascii = all(text is None or text.isascii() for text in self.texts)
+        self._index(self.texts, lambda text: {text[i:i + n] for i in range(len(text) - n + 1)}, previous, source)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def usable(self, query):
+        """
+        Whether search(query) gives the same answer as a case-insensitive regex str.contains
+        """
+        return self.ascii and query.isascii() and len(query) >= self.n and not _REGEX_SPECIAL.search(query)
+
+    def search(self, query):
+        """
+        Returns the sorted positions of the texts containing query (case-insensitive).
+        """
+        query = query.lower()
+        grams = {query[i:i + self.n] for i in range(len(query) - self.n + 1)}
+        lists = []
+        for gram in grams:
+            positions = self.postings.get(gram)
+            if positions is None:
+                return np.empty(0, dtype = np.int64)
+            lists.append(positions)
+
+        lists.sort(key = len)
+        candidates = lists[0]
+        for positions in lists[1:]:
+            candidates = np.intersect1d(candidates, positions, assume_unique = True)
+            if len(candidates) == 0:
+                return candidates
+        # the n-grams can all be present without being contiguous, so the candidates are confirmed
+        if len(grams) == 1 and len(query) == self.n:
+            return candidates
+        texts = self.texts
+        return np.array([p for p in candidates.tolist() if query in texts[p]], dtype = np.int64)
+
+
+def parse_block_range(address):
+    """
+    Returns the first block range of an address as (start, end) integers, or None if it has none
+    """
+    match = _RANGE.search(_DASH.sub('-', address))
+    if match:
+        return int(match.group(1)), int(match.group(2))
+    return None
+
+
+class BlockIndex(_Postings):
+    """
+    Block numbers of every address parsed once: an inverted index from each lower-cased word token
+    to the positions of the addresses containing it, and the first block range of every address as
+    aligned start/end arrays (has_range is False where an address has no range).
+
+    previous and source carry over the unchanged addresses of an earlier index, like NgramIndex.
+    """
+
+    def __init__(self, addresses, previous = None, source = None):
+        self.ascii = all(not isinstance(a, str) or a.isascii() for a in addresses)
+        texts = [address.lower() if isinstance(address, str) else None for address in addresses]
+        self._index(texts, lambda text: set(_WORD.findall(text)), previous, source)
+        self.size = len(addresses)
+        starts = np.zeros(len(addresses), dtype = np.int64)
+        ends = np.zeros(len(addresses), dtype = np.int64)
+        has_range = np.zeros(len(addresses), dtype = bool)
+        if previous is None:
+            parsed = range(len(addresses))
+        else:
+            kept = np.flatnonzero(source >= 0)
+            starts[kept], ends[kept], has_range[kept] = (previous.starts[source[kept]], previous.ends[source[kept]],
+                                                         previous.has_range[source[kept]])
+            parsed = np.flatnonzero(source < 0).tolist()
+        for position in parsed:
+            address = addresses[position]
+            if not isinstance(address, str):
+                continue
+            block_range = parse_block_range(address)
+            if block_range:
+                starts[position], ends[position] = block_range
+                has_range[position] = True
+        self.starts = starts
+        self.ends = ends
+        self.has_range = has_range
+
+    def __len__(self):
+        return self.size
+
+    def usable(self, block_number):
+        return self.ascii and _PLAIN_BLOCK.fullmatch(block_number) is not None
+
+    def matches(self, positions, block_number):
+        """
+        Returns a boolean array telling which of the addresses at positions match block_number: either as
+        a whole word, or through its digits falling inside the address's block range.
+        """
+        token_hit = np.isin(positions, self.postings.get(block_number.lower(), np.empty(0, dtype = np.int64)))
+        in_range = self.has_range[positions] & ~token_hit
+        if not in_range.any():
+            return token_hit
+        # same conversion as the row-by-row matcher, which fails for a block without digits
+        block_numeric = int(''.join(filter(str.isdigit, block_number)))
+        return token_hit | (in_range & (self.starts[positions] <= block_numeric) & (block_numeric <= self.ends[positions]))
+
+
+class AddressIndex:
+    """
+    Trigram indexes over the standardized addresses of the loaded carpark table: one over the
+    addresses as they are (town/road search) and one with the spaces removed (full address search),
+    which also backs the typo-tolerant search.
+
+    When the table is reloaded, the index of the new table can be built from the previous one
+    (previous), reusing everything derived from the addresses that did not change. source holds, for
+    every row of df, the position in the previous table of a row with the same address (-1 if none).
+    """
+
+    def __init__(self, df, previous = None, source = None):
+        self.df = df
+        self.addresses = addresses = df['address'].tolist()
+        if previous is not None:
+            source = np.asarray(source, dtype = np.int64)
+        self.full = NgramIndex(addresses, previous = previous and previous.full, source = source)
+        self.compact = NgramIndex([a.replace(" ", "") if isinstance(a, str) else None for a in addresses],
+                                  previous = previous and previous.compact, source = source)
+        self.blocks = BlockIndex(addresses, previous = previous and previous.blocks, source = source)
+        self.fuzzy = ApproximateMatcher(self.compact, previous = previous and previous.fuzzy, source = source)
+
+    def contains(self, df, query, compact = False):
+        """
+        Returns the rows of df whose address contains query, exactly like
+        df[df['address'].str.contains(query, case=False, na=False)] (with the spaces of the
+        addresses removed first when compact is set).
+
+        The index is used when df is the indexed table and query is a plain substring of at least
+        NGRAM characters; other queries fall back to scanning the addresses.
+        """
+        index = self.compact if compact else self.full
+        if df is self.df and index.usable(query):
+            return df.iloc[index.search(query)]
+
+        addresses = df['address'].str.replace(" ", "") if compact else df['address']
+        return df[addresses.str.contains(query, case = False, na = False)]
+
+    def approximate(self, query, max_distance = None):
+        """
+        Returns the rows of the indexed table whose space-free address contains query up to a few typos,
+        closest first, with a score column (1.0 for an exact match, lower for every edit needed)
+        """
+        query = query.replace(" ", "")
+        positions, distances = self.fuzzy.search(query, max_distance)
+        matches = self.df.iloc[positions].copy()
+        matches['score'] = (1 - distances / max(len(query), 1)).round(2)
+        return matches
+
+    def positions(self, df):
+        """
+        Returns the positions of the rows of df in the indexed table, or None if df is not a subset of it
+        """
+        if df is self.df:
+            return np.arange(len(df))
+        if not self.df.index.is_unique:
+            return None
+        positions = self.df.index.get_indexer(df.index)
+        if (positions < 0).any():
+            return None
+        # the rows must still hold the indexed addresses
+        addresses = self.addresses
+        if [addresses[p] for p in positions.tolist()] != df['address'].tolist():
+            return None
+        return positions
+
+    def filter_block(self, df, block_number, block_matches):
+        """
+        Returns the rows of df (the indexed table or a subset of it) whose address matches block_number,
+        looked up in the block index. Block inputs that are not a single word fall back to applying
+        block_matches to every address.
+        """
+        positions = self.positions(df)
+        if positions is not None and self.blocks.usable(block_number):
+            return df[self.blocks.matches(positions, block_number)]
+        return df[df['address'].apply(block_matches)]
+
+
+_index = None
+
+
+def set_address_index(index):
+    global _index
+    _index = index
+    return index
+
+
+def get_address_index(df = None):
+    """
+    Returns the address index of the loaded carpark table, building one from df if none has been loaded yet
+    """
+    if _index is None and df is not None:
+        return set_address_index(AddressIndex(df))
+    return _index
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+
+from run_data_loader import fetch_real_time_data, API_URL
+
+# seconds a snapshot is served before a refresh is triggered
+SNAPSHOT_TTL = 60
+# seconds between refreshes done by the background thread
+REFRESH_INTERVAL = 60
+
+
+class AvailabilitySnapshotStore:
+    """
+    Holds the latest parsed carpark availability snapshot in memory so queries never wait on the API.
+
+    get() returns the current snapshot straight away. Once it is older than ttl a refresh is started in
+    the background and the stale snapshot keeps being served until the new one is in (stale-while-revalidate).
+    Only the very first get() blocks, when there is no snapshot yet. start() additionally keeps the
+    snapshot fresh from a background thread every refresh_interval seconds.
+
+    Args:
+        url (str, optional): availability endpoint, e.g. a local stub for tests. Defaults to API_URL.
+        ttl (float, optional): freshness lifetime of a snapshot in seconds. Defaults to SNAPSHOT_TTL.
+        refresh_interval (float, optional): period of the background refresher. Defaults to REFRESH_INTERVAL.
+        fetch (callable, optional): returns a new snapshot, overrides url. Defaults to fetch_real_time_data(url).
+    """
+
+    def __init__(self, url = API_URL, ttl = SNAPSHOT_TTL, refresh_interval = REFRESH_INTERVAL, fetch = None):
+        self.url = url
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        # an unchanged payload is recognised from the previous snapshot and not parsed again
+        self._fetch = fetch or (lambda: fetch_real_time_data(self.url, previous = self._snapshot))
+        self._snapshot = None
+        self._fetched_at = None
+        self._attempted_at = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def age(self):
+        """
+        Seconds since the current snapshot was fetched, or None if there is none yet
+        """
+        return None if self._fetched_at is None else time.monotonic() - self._fetched_at
+
+    def _fetch_and_swap(self):
+        self._attempted_at = time.monotonic()
+        try:
+            snapshot = self._fetch()
+        except Exception as e:
+            self.last_error = e
+            print(f"Failed to refresh carpark availability: {e}")
+            return False
+        with self._lock:
+            self._snapshot = snapshot
+            self._fetched_at = time.monotonic()
+            self.last_error = None
+        return True
+
+    def _retry_due(self):
+        return self._attempted_at is None or time.monotonic() - self._attempted_at >= self.ttl
+
+    def refresh(self):
+        """
+        Fetches a new snapshot and swaps it in. A failed fetch keeps the previous snapshot, and a call
+        made while another refresh is running returns straight away.
+
+        Returns:
+            bool: True if the snapshot was replaced
+        """
+        if not self._refresh_lock.acquire(blocking = False):
+            return False
+        try:
+            return self._fetch_and_swap()
+        finally:
+            self._refresh_lock.release()
+
+    def get(self):
+        """
+        Returns the latest snapshot ({carpark_number: {lot_type: details}}), refreshing it in the
+        background when it is stale. Returns an empty snapshot if none could be fetched yet.
+        """
+        if self._snapshot is None:
+            # first use: wait for a snapshot, possibly one already being fetched by another thread. After a
+            # failed attempt callers do not wait on the API again until ttl has passed.
+            if not self._retry_due() and not self._refresh_lock.locked():
+                return {}
+            with self._refresh_lock:
+                if self._snapshot is None and self._retry_due():
+                    self._fetch_and_swap()
+            return self._snapshot if self._snapshot is not None else {}
+        if self.age >= self.ttl and not self._refresh_lock.locked():
+            threading.Thread(target = self.refresh, daemon = True).start()
+        return self._snapshot
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.refresh_interval)
+
+    def start(self):
+        """
+        Starts the background refresher thread
+        """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target = self._run, name = "availability-refresher", daemon = True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+
+_store = None
+
+
+def get_availability_store():
+    """
+    Returns the shared snapshot store, pointed at $CARPARK_AVAILABILITY_URL when it is set
+    """
+    global _store
+    if _store is None:
+        _store = AvailabilitySnapshotStore(os.environ.get("CARPARK_AVAILABILITY_URL", API_URL))
+    return _store
+
+
+def set_availability_store(store):
+    global _store
+    _store = store
+    return store
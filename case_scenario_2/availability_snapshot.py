@@ -0,0 +1,393 @@
+import codecs
+import json
+import math
+import re
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+# lot types reported by the API: C (car), H (heavy vehicle), Y (motorcycle) and the rarer ones
+LOT_TYPES = ("C", "H", "Y", "L", "S", "M")
+# upper edges in minutes of the staleness histogram buckets, the last bucket is open-ended
+STALENESS_MINUTES = (5, 15, 30, 60, 180, 24 * 60)
+# int64 value of numpy's NaT, which sorts before every valid time
+NAT = np.iinfo(np.int64).min
+# characters of a streamed payload kept once they have been parsed, before the buffer is trimmed
+STREAM_BUFFER = 64 * 1024
+
+TIMESTAMP = re.compile(r'"timestamp"\s*:\s*"([^"]*)"')
+CARPARK_DATA = re.compile(r'"carpark_data"\s*:\s*\[')
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def parse_times(values):
+    """
+    Parses API times ("2025-01-01T10:00:00", optionally with a UTC offset, which is dropped as the API
+    always reports Singapore time) into seconds as int64, NAT where a time is missing or malformed
+    """
+    values = [value[:19] if isinstance(value, str) else "NaT" for value in values]
+    try:
+        return np.array(values, dtype = "datetime64[s]").view(np.int64)
+    except ValueError:
+        parsed = np.full(len(values), NAT, dtype = np.int64)
+        for i, value in enumerate(values):
+            try:
+                parsed[i] = np.datetime64(value, "s").view(np.int64)
+            except ValueError:
+                pass
+        return parsed
+
+
+def format_time(seconds):
+    """
+    Formats seconds from parse_times back into the API's format, None for NAT
+    """
+    return None if seconds == NAT else str(np.datetime64(int(seconds), "s"))
+
+
+class AvailabilitySnapshot(Mapping):
+    """
+    One availability payload held as aligned numpy columns instead of a dict of dicts.
+
+    Carparks are numbered in payload order; carpark_numbers and update_datetime have one entry per carpark.
+    Every reported lot is one entry of the lot columns: carpark (row in carpark_numbers), lot_type (code into
+    lot_types), lots_available and total_lots, so aggregates over carparks are single numpy expressions.
+
+    For the existing callers it still reads like the old {carpark_number: {lot_type: details}} dictionary:
+    snapshot[carpark_no] builds the details of that one carpark on demand.
+
+    The update times are parsed once when the snapshot is built: the latest one of every carpark (across its
+    lot types and repeated entries), the latest one overall, carparks sorted by it and a staleness histogram
+    relative to the time the payload was published (reference_time), so update-time queries never go back
+    to the payload.
+    """
+
+    def __init__(self, carpark_numbers, update_datetime, carpark, lot_type, lots_available, total_lots, lot_types = LOT_TYPES,
+                 entry_carpark = None, entry_times = None, reference_time = None):
+        self.carpark_numbers = np.asarray(carpark_numbers, dtype = object)
+        self.update_datetime = np.asarray(update_datetime, dtype = object)
+        self.carpark = np.asarray(carpark, dtype = np.int32)
+        self.lot_type = np.asarray(lot_type, dtype = np.uint8)
+        self.lots_available = np.asarray(lots_available, dtype = np.int32)
+        self.total_lots = np.asarray(total_lots, dtype = np.int32)
+        self.lot_types = tuple(lot_types)
+        self._rows = {no: row for row, no in enumerate(self.carpark_numbers.tolist())}
+        # lots of carpark r are self._order[self._starts[r]:self._starts[r + 1]], in payload order
+        self._order = np.argsort(self.carpark, kind = "stable")
+        self._starts = np.searchsorted(self.carpark[self._order], np.arange(len(self.carpark_numbers) + 1))
+        self._aligned = {}
+
+        # latest update per carpark, over every entry of the payload (one per carpark unless it is listed twice)
+        if entry_carpark is None:
+            entry_carpark, entry_times = np.arange(len(self.carpark_numbers)), self.update_datetime
+        self.latest = np.full(len(self.carpark_numbers), NAT, dtype = np.int64)
+        np.maximum.at(self.latest, np.asarray(entry_carpark, dtype = np.int64), parse_times(entry_times))
+        self._by_latest = np.argsort(self.latest, kind = "stable")
+        self.latest_overall = self.latest[self._by_latest[-1]] if len(self.latest) else NAT
+        reference = parse_times([reference_time])[0] if reference_time is not None else NAT
+        self.reference_time = reference if reference != NAT else self.latest_overall
+        # carparks per staleness bucket; carparks without a valid time are counted in the last one
+        age_minutes = (self.reference_time - self.latest[self.latest != NAT]) / 60
+        counts = np.bincount(np.searchsorted(STALENESS_MINUTES, age_minutes, side = "right"), minlength = len(STALENESS_MINUTES) + 1)
+        counts[-1] += np.count_nonzero(self.latest == NAT)
+        self.staleness_counts = counts
+        # the payload timestamp and HTTP validators it was served with, to recognise an unchanged payload
+        self.timestamp = reference_time
+        self.etag = None
+        self.last_modified = None
+
+    @classmethod
+    def from_payload(cls, data):
+        """
+        Parses the json of the carpark-availability API ({"items": [{"timestamp": ..., "carpark_data": [...]}]})
+        """
+        builder = _SnapshotBuilder()
+        item = data['items'][0]
+        for carpark_dict in item['carpark_data']:
+            builder.add(carpark_dict)
+        return builder.build(item.get('timestamp'))
+
+    @classmethod
+    def from_stream(cls, chunks, unchanged_timestamp = None):
+        """
+        Parses the API payload while it is downloaded: chunks is an iterable of bytes (e.g. response.iter_content())
+        and every carpark of items[0].carpark_data is added as soon as its object is complete, so the payload is
+        never held as a whole nor turned into Python objects all at once.
+
+        Returns None, without parsing the carparks, if the payload's timestamp equals unchanged_timestamp
+        """
+        stream = _PayloadStream(chunks)
+        stream.read_head()
+        if unchanged_timestamp is not None and stream.timestamp == unchanged_timestamp:
+            return None
+        builder = _SnapshotBuilder()
+        for carpark_dict in stream.carparks():
+            builder.add(carpark_dict)
+        stream.read_tail()
+        if unchanged_timestamp is not None and stream.timestamp == unchanged_timestamp:
+            return None
+        return builder.build(stream.timestamp)
+
+    @classmethod
+    def from_dict(cls, snapshot):
+        """
+        Builds a snapshot from the {carpark_number: {lot_type: details}} form
+        """
+        # one entry per lot type, so lot types updated at different times all count for the latest update
+        carpark_data = []
+        for number, lots in snapshot.items():
+            if not lots:
+                carpark_data.append({'carpark_number': number, 'update_datetime': None, 'carpark_info': []})
+            for lot_type, d in lots.items():
+                carpark_data.append({'carpark_number': number, 'update_datetime': d.get('update_datetime'),
+                                     'carpark_info': [{'lot_type': lot_type, 'lots_available': d.get('lots_available', 0),
+                                                       'total_lots': d.get('total_lots', 0)}]})
+        return cls.from_payload({'items': [{'carpark_data': carpark_data}]})
+
+    # mapping interface
+
+    def __len__(self):
+        return len(self.carpark_numbers)
+
+    def __iter__(self):
+        return iter(self.carpark_numbers.tolist())
+
+    def __contains__(self, carpark_no):
+        return carpark_no in self._rows
+
+    def __getitem__(self, carpark_no):
+        row = self._rows[carpark_no]
+        details = {}
+        for i in self._order[self._starts[row]:self._starts[row + 1]].tolist():
+            available = int(self.lots_available[i])
+            details[self.lot_types[self.lot_type[i]]] = {
+                'is_available': available > 0,
+                'total_lots': int(self.total_lots[i]),
+                'lots_available': available,
+                'update_datetime': self.update_datetime[row],
+            }
+        return details
+
+    # vectorised queries
+
+    def _lots(self, lot_type):
+        if lot_type is None:
+            return np.ones(len(self.carpark), dtype = bool)
+        if lot_type not in self.lot_types:
+            return np.zeros(len(self.carpark), dtype = bool)
+        return self.lot_type == self.lot_types.index(lot_type)
+
+    def per_carpark(self, lot_type = 'C'):
+        """
+        Returns (lots_available, total_lots) per carpark row, summed over lot_type (all lot types if None);
+        carparks without such lots get 0 total lots
+        """
+        lots = self._lots(lot_type)
+        available = np.bincount(self.carpark[lots], weights = self.lots_available[lots], minlength = len(self)).astype(np.int64)
+        total = np.bincount(self.carpark[lots], weights = self.total_lots[lots], minlength = len(self)).astype(np.int64)
+        return available, total
+
+    def with_free_lots(self, n = 1, lot_type = 'C'):
+        """
+        Returns the numbers of the carparks with at least n lots of lot_type available
+        """
+        available, total = self.per_carpark(lot_type)
+        return self.carpark_numbers[(available >= n) & (total > 0)].tolist()
+
+    def occupancy(self, lot_type = 'C'):
+        """
+        Returns the share of occupied lots of lot_type per carpark as a Series indexed by carpark number
+        """
+        available, total = self.per_carpark(lot_type)
+        reported = total > 0
+        return pd.Series(1 - available[reported] / total[reported], index = self.carpark_numbers[reported], name = 'occupancy')
+
+    def any_available(self):
+        """
+        Returns a boolean array telling which carpark rows have lots available of any type
+        """
+        return np.bincount(self.carpark[self.lots_available > 0], minlength = len(self)) > 0
+
+    def align(self, carpark_nos):
+        """
+        Returns the row of each of carpark_nos in this snapshot, -1 for carparks it does not report.
+
+        The result is cached per array, so aligning the loaded table (e.g. CarparkGrid.numbers) is done once.
+        """
+        key = id(carpark_nos)
+        cached = self._aligned.get(key)
+        if cached is None or cached[0] is not carpark_nos:
+            rows = self._rows
+            cached = (carpark_nos, np.array([rows.get(no, -1) for no in carpark_nos], dtype = np.int64))
+            self._aligned[key] = cached
+        return cached[1]
+
+    def table(self, df, lot_type = 'C'):
+        """
+        Returns lots_available, total_lots and occupancy of lot_type for every row of the carpark table df,
+        aligned to its index (NaN for carparks the snapshot does not report)
+        """
+        rows = self.align(df['car_park_no'].to_numpy())
+        available, total = self.per_carpark(lot_type)
+        # row -1 (not reported) reads a trailing carpark without lots
+        available, total = np.append(available, 0), np.append(total, 0)
+        reported = (rows >= 0) & (total[rows] > 0)
+        lots_available = np.where(reported, available[rows], np.nan)
+        total_lots = np.where(reported, total[rows], np.nan)
+        return pd.DataFrame({'lots_available': lots_available, 'total_lots': total_lots,
+                             'occupancy': 1 - lots_available / total_lots}, index = df.index)
+
+
+    # update times
+
+    def last_update(self, carpark_no = None):
+        """
+        Returns the latest update time of carpark_no across its lot types, or the latest one of any carpark when
+        no carpark number is given, formatted like the API; None if the carpark is not reported or has no valid time
+        """
+        if not carpark_no:
+            return format_time(self.latest_overall)
+        row = self._rows.get(carpark_no)
+        return None if row is None else format_time(self.latest[row])
+
+    def stale(self, minutes, now = None):
+        """
+        Returns the numbers of the carparks not updated in the last `minutes` minutes before now (an API time,
+        defaults to reference_time), least recently updated first. Carparks without a valid update time are included.
+
+        Raises ValueError if minutes is not a finite, non-negative number.
+        """
+        if isinstance(minutes, bool) or not isinstance(minutes, (int, float, np.integer, np.floating)) \
+                or not math.isfinite(minutes) or minutes < 0:
+            raise ValueError(f"minutes must be a finite, non-negative number, got {minutes!r}")
+        now = self.reference_time if now is None else parse_times([now])[0]
+        if now == NAT:
+            return []
+        # a window reaching back past the earliest representable time only leaves the carparks never updated
+        cutoff = max(int(now) - round(minutes * 60), NAT + 1)
+        count = np.searchsorted(self.latest[self._by_latest], cutoff, side = "left")
+        return self.carpark_numbers[self._by_latest[:count]].tolist()
+
+    def staleness(self):
+        """
+        Returns the number of carparks per age bucket of their latest update, relative to reference_time
+        """
+        edges = (0,) + STALENESS_MINUTES
+        labels = [f"{low}-{high} min" for low, high in zip(edges, edges[1:])] + [f"over {edges[-1]} min"]
+        return dict(zip(labels, self.staleness_counts.tolist()))
+
+
+class _SnapshotBuilder:
+    """
+    Collects the carparks of a payload one at a time into the columns of an AvailabilitySnapshot
+    """
+
+    def __init__(self):
+        self.lot_types = list(LOT_TYPES)
+        self.codes = {lot_type: code for code, lot_type in enumerate(self.lot_types)}
+        self.numbers, self.updated = [], []
+        self.carpark, self.lot_type, self.available, self.total = [], [], [], []
+        self.entry_carpark, self.entry_times = [], []
+        self.rows = {}
+
+    def add(self, carpark_dict):
+        number = carpark_dict['carpark_number']
+        row = self.rows.get(number)
+        if row is None:
+            row = self.rows[number] = len(self.numbers)
+            self.numbers.append(number)
+            self.updated.append(carpark_dict['update_datetime'])
+        else:
+            # a carpark listed twice keeps its last update time, like the dictionary did
+            self.updated[row] = carpark_dict['update_datetime']
+        self.entry_carpark.append(row)
+        self.entry_times.append(carpark_dict['update_datetime'])
+        for d in carpark_dict['carpark_info']:
+            code = self.codes.get(d['lot_type'])
+            if code is None:
+                code = self.codes[d['lot_type']] = len(self.lot_types)
+                self.lot_types.append(d['lot_type'])
+            self.carpark.append(row)
+            self.lot_type.append(code)
+            self.available.append(int(d['lots_available']))
+            self.total.append(int(d['total_lots']))
+
+    def build(self, timestamp = None):
+        return AvailabilitySnapshot(self.numbers, self.updated, self.carpark, self.lot_type, self.available, self.total,
+                                    self.lot_types, self.entry_carpark, self.entry_times, timestamp)
+
+
+class _PayloadStream:
+    """
+    Reads an API payload arriving as byte chunks: the part before items[0].carpark_data (with the timestamp), then
+    the carpark objects one at a time, then whatever follows the list
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.timestamp = None
+        self._finished = False
+
+    def _read(self):
+        # appends the next chunk to the buffer; False once the payload has been read entirely
+        if self._finished:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self.buffer += self._decoder.decode(b"", final = True)
+            self._finished = True
+            return False
+        self.buffer += self._decoder.decode(chunk)
+        return True
+
+    def read_head(self):
+        while True:
+            match = CARPARK_DATA.search(self.buffer)
+            if match is not None:
+                timestamp = TIMESTAMP.search(self.buffer, 0, match.start())
+                self.timestamp = timestamp.group(1) if timestamp else None
+                self.pos = match.end()
+                return
+            if not self._read():
+                raise ValueError("No carpark_data in the availability payload")
+
+    def carparks(self):
+        while True:
+            self.pos = SEPARATORS.match(self.buffer, self.pos).end()
+            if self.pos == len(self.buffer):
+                if not self._read():
+                    raise ValueError("Availability payload ended inside carpark_data")
+                continue
+            if self.buffer[self.pos] == "]":
+                self.pos += 1
+                return
+            try:
+                carpark_dict, end = self._json.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # the object is not complete yet
+                if not self._read():
+                    raise
+                continue
+            self.pos = end
+            if self.pos > STREAM_BUFFER:
+                self.buffer, self.pos = self.buffer[self.pos:], 0
+            yield carpark_dict
+
+    def read_tail(self):
+        if self.timestamp is None:
+            while self._read():
+                pass
+            timestamp = TIMESTAMP.search(self.buffer, self.pos)
+            self.timestamp = timestamp.group(1) if timestamp else None
+
+
+def as_snapshot(snapshot):
+    """
+    Returns snapshot as an AvailabilitySnapshot, converting the {carpark_number: {lot_type: details}} form
+    """
+    return snapshot if isinstance(snapshot, AvailabilitySnapshot) else AvailabilitySnapshot.from_dict(snapshot)
@@ -0,0 +1,147 @@
+import contextlib
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from run_commands import resolve_carpark, resolve_address, resolve_town_block, resolve_nearby, resolve_last_update, resolve_stale_carparks
+from spatial_index import NEAREST
+
+# queries resolved ahead of the next result written, per worker
+QUEUE_DEPTH = 16
+
+QUERY_TYPES = ("carpark", "address", "town", "nearby", "last_update", "stale")
+
+
+def resolve_query(df, snapshot, query):
+    """
+    Resolves one batch query against the loaded table and an availability snapshot.
+
+    Parameters:
+    query (dict): one of
+        {"type": "carpark", "carpark_no": "ACB"}
+        {"type": "address", "address": "BLK 28 JALAN BAHAGIA"}
+        {"type": "town", "town": "SENJA ROAD", "block": "616A"} (block is optional)
+        {"type": "nearby", "carpark_no": "ACB"} or {"type": "nearby", "x": 30314.79, "y": 31490.49},
+            with optional "n", "radius" and "available_only"
+        {"type": "last_update", "carpark_no": "ACB"} (carpark_no is optional)
+        {"type": "stale", "minutes": 60}
+
+    Returns:
+    dict: the result of the matching resolver in run_commands
+    """
+    query_type = query.get("type")
+    if query_type == "carpark":
+        return resolve_carpark(df, query["carpark_no"], snapshot)
+    if query_type == "address":
+        return resolve_address(df, query["address"])
+    if query_type == "town":
+        return resolve_town_block(df, query["town"], query.get("block"))
+    if query_type == "nearby":
+        return resolve_nearby(df, snapshot, query.get("carpark_no"), query.get("x"), query.get("y"),
+                              query.get("n", NEAREST), query.get("radius"), query.get("available_only", False))
+    if query_type == "last_update":
+        return {"update_datetime": resolve_last_update(snapshot, query.get("carpark_no"))}
+    if query_type == "stale":
+        return resolve_stale_carparks(snapshot, query["minutes"])
+    raise ValueError(f"Unknown query type {query_type!r}, expected one of {QUERY_TYPES}")
+
+
+def json_ready(obj):
+    """
+    Returns obj with numpy scalars turned into Python values and NaN into None, which json has no value for
+    """
+    if isinstance(obj, dict):
+        return {key: json_ready(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [json_ready(value) for value in obj]
+    if hasattr(obj, "item"):
+        obj = obj.item()
+    if isinstance(obj, float) and math.isnan(obj):
+        return None
+    return obj
+
+
+def _run_line(df, snapshot, line_no, line):
+    started = time.perf_counter()
+    record = {"line": line_no}
+    try:
+        query = json.loads(line)
+        record["query"] = query
+        record["result"] = json_ready(resolve_query(df, snapshot, query))
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = round(time.perf_counter() - started, 6)
+    return record
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(math.ceil(percent / 100 * len(sorted_values))) - 1)]
+
+
+def run_batch(df, snapshot, lines, out, workers = 1, quiet = False):
+    """
+    Resolves a stream of JSON Lines queries (see resolve_query) and writes one JSON Lines result per query,
+    in input order, as soon as it is ready. The messages printed by the searches are suppressed so they do not
+    mix with the results.
+
+    Parameters:
+    df (pandas.DataFrame): The loaded carpark table.
+    snapshot (dict): The availability snapshot every query is answered from.
+    lines (iterable): The queries, one JSON object per line; blank lines are skipped.
+    out (file): Where the results are written.
+    workers (int, optional): Number of worker threads resolving queries. Defaults to 1 (no pool).
+    quiet (bool, optional): Do not print the throughput and latency summary to stderr. Defaults to False.
+
+    Returns:
+    dict: the summary {"queries", "errors", "seconds", "per_second", "latency_ms": {"p50", "p95", "p99", "max"}}
+    """
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+
+    def write(record):
+        nonlocal errors
+        latencies.append(record["seconds"])
+        errors += "error" in record
+        out.write(json.dumps(record) + "\n")
+
+    queries = ((line_no, line) for line_no, line in enumerate(lines, 1) if line.strip())
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        if workers <= 1:
+            for line_no, line in queries:
+                write(_run_line(df, snapshot, line_no, line))
+        else:
+            with ThreadPoolExecutor(max_workers = workers) as pool:
+                pending = deque()
+                for line_no, line in queries:
+                    pending.append(pool.submit(_run_line, df, snapshot, line_no, line))
+                    # bounded read-ahead, results still come out in input order
+                    if len(pending) >= workers * QUEUE_DEPTH:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+    out.flush()
+
+    seconds = time.perf_counter() - started
+    latencies.sort()
+    summary = {
+        "queries": len(latencies),
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "per_second": round(len(latencies) / seconds, 1) if seconds > 0 else 0.0,
+        "latency_ms": {name: round(_percentile(latencies, percent) * 1000, 3)
+                       for name, percent in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))},
+    }
+    if not quiet:
+        latency = summary["latency_ms"]
+        print(f"Resolved {summary['queries']} queries ({errors} errors) in {summary['seconds']}s, "
+              f"{summary['per_second']} queries/s", file = sys.stderr)
+        print(f"Latency per query: p50 {latency['p50']} ms, p95 {latency['p95']} ms, "
+              f"p99 {latency['p99']} ms, max {latency['max']} ms", file = sys.stderr)
+    return summary
@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from availability import get_availability_store
+from batch import json_ready
+from run_data_loader import load_carpark_data, get_client
+from run_commands import resolve_carpark, resolve_address, resolve_town_block, resolve_nearby, resolve_last_update, resolve_stale_carparks
+from spatial_index import NEAREST
+from table_reload import TableReloader
+
+HOST = "127.0.0.1"
+PORT = 8080
+# requests resolved at the same time
+MAX_CONCURRENCY = 8
+# requests allowed to wait for a free slot before new ones are answered with 503
+MAX_PENDING = 64
+# seconds a client gets to send its request line and headers
+READ_TIMEOUT = 10
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error",
+           503: "Service Unavailable"}
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class CarparkService:
+    """
+    Local HTTP service answering the run_commands lookups as JSON.
+
+    The loaded table, its indexes and the availability store are shared by every request. Requests are read on
+    the asyncio loop and resolved on a thread pool, at most max_concurrency at a time; once max_pending requests
+    are waiting for a slot, new ones get 503. Availability is refreshed by the store's background thread, so a
+    request never waits on the data.gov.sg API once the first snapshot is in.
+
+    Endpoints (GET):
+        /carparks/<carpark_no>
+        /search/address?q=<address>
+        /search/town?town=<town or road>&block=<block>
+        /nearby?carpark_no=<carpark_no> or ?x=<x>&y=<y>, with optional n, radius and available_only=yes
+        /last-update?carpark_no=<carpark_no>
+        /stale?minutes=<minutes>
+        /health (including the latency, bytes and errors of the availability API requests)
+    """
+
+    def __init__(self, df, availability = None, max_concurrency = MAX_CONCURRENCY, max_pending = MAX_PENDING):
+        self.df = df
+        self.availability = availability or get_availability_store()
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers = max_concurrency, thread_name_prefix = "carpark-service")
+        self.pending = 0
+        self.served = 0
+        self._slots = None
+        self.server = None
+
+    def route(self, path, params):
+        """
+        Resolves a request path and its query parameters into a JSON-ready dictionary, on a worker thread
+        """
+        def param(name, convert = str, default = None):
+            if name not in params:
+                return default
+            try:
+                return convert(params[name][-1])
+            except ValueError:
+                raise RequestError(400, f"Invalid value for {name}: {params[name][-1]!r}")
+
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        if len(parts) == 2 and parts[0] == "carparks":
+            return resolve_carpark(self.df, parts[1], self.availability.get())
+        if parts == ["search", "address"]:
+            if not param("q"):
+                raise RequestError(400, "Missing parameter q")
+            return resolve_address(self.df, param("q"))
+        if parts == ["search", "town"]:
+            if not param("town"):
+                raise RequestError(400, "Missing parameter town")
+            return resolve_town_block(self.df, param("town").upper(), param("block"))
+        if parts == ["nearby"]:
+            if param("carpark_no") is None and (param("x") is None or param("y") is None):
+                raise RequestError(400, "Give either carpark_no or both x and y")
+            return resolve_nearby(self.df, self.availability.get(), param("carpark_no"), param("x", float), param("y", float),
+                                  param("n", int, NEAREST), param("radius", float),
+                                  param("available_only", str, "no").lower() in ("1", "true", "yes"))
+        if parts == ["last-update"]:
+            return {"update_datetime": resolve_last_update(self.availability.get(), param("carpark_no"))}
+        if parts == ["stale"]:
+            if param("minutes") is None:
+                raise RequestError(400, "Missing parameter minutes")
+            return resolve_stale_carparks(self.availability.get(), param("minutes", float))
+        if parts == ["health"]:
+            return {"status": "ok", "carparks": len(self.df), "snapshot_age": self.availability.age,
+                    "pending": self.pending, "served": self.served, "upstream": get_client().summary()}
+        raise RequestError(404, f"No endpoint {path}")
+
+    async def _respond(self, writer, status, body):
+        payload = json.dumps(json_ready(body)).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1")
+            + payload
+        )
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), READ_TIMEOUT)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+                return
+            request_line = head.split(b"\r\n", 1)[0].decode("latin-1").split(" ")
+            if len(request_line) != 3:
+                await self._respond(writer, 400, {"error": "Malformed request line"})
+                return
+            method, target = request_line[:2]
+            if method != "GET":
+                await self._respond(writer, 405, {"error": f"Method {method} not allowed"})
+                return
+            if self.pending >= self.max_concurrency + self.max_pending:
+                await self._respond(writer, 503, {"error": "Too many requests, try again later"})
+                return
+
+            url = urlsplit(target)
+            self.pending += 1
+            try:
+                async with self._slots:
+                    status, body = 200, await asyncio.get_running_loop().run_in_executor(
+                        self.executor, self.route, url.path, parse_qs(url.query))
+            except RequestError as e:
+                status, body = e.status, {"error": str(e)}
+            except (ValueError, KeyError) as e:
+                status, body = 400, {"error": f"{type(e).__name__}: {e}"}
+            except Exception as e:
+                # a failing lookup still gets an answer, and the service keeps serving the other requests
+                print(f"Failed to serve {target}: {type(e).__name__}: {e}")
+                status, body = 500, {"error": f"Internal error: {type(e).__name__}"}
+            finally:
+                self.pending -= 1
+            self.served += 1
+            await self._respond(writer, status, body)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host = HOST, port = PORT):
+        """
+        Fetches the first availability snapshot and starts listening; returns the asyncio server
+        """
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.availability.get)
+        self.availability.start()
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.availability.stop()
+        self.executor.shutdown(wait = False)
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+
+async def serve(host = HOST, port = PORT, max_concurrency = MAX_CONCURRENCY, reload = False):
+    service = CarparkService(load_carpark_data(), max_concurrency = max_concurrency)
+    reloader = None
+    if reload:
+        # requests in flight finish on the table they started with, new ones get the reloaded table
+        reloader = TableReloader(service.df, on_reload = lambda df: setattr(service, "df", df)).start()
+    server = await service.start(host, port)
+    print(f"Carpark service listening on http://{host}:{service.port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if reloader is not None:
+            reloader.stop()
+        await service.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Local HTTP service for carpark lookups")
+    parser.add_argument("--host", default = HOST)
+    parser.add_argument("--port", type = int, default = PORT)
+    parser.add_argument("--max-concurrency", type = int, default = MAX_CONCURRENCY, help = "requests resolved at the same time")
+    parser.add_argument("--reload", action = "store_true", help = "pick up changes to HDBCarparkInformation.csv while serving")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_concurrency, args.reload))
+    except KeyboardInterrupt:
+        print("Carpark service stopped")
@@ -0,0 +1,108 @@
+import numpy as np
+
+# columns of HDBCarparkInformation.csv, car_park_no first
+CARPARK_COLUMNS = (
+    "car_park_no", "address", "x_coord", "y_coord", "car_park_type", "type_of_parking_system",
+    "short_term_parking", "free_parking", "night_parking", "car_park_decks", "gantry_height", "car_park_basement",
+)
+
+
+class CarparkRecord:
+    """
+    One row of the carpark table, together with its row label in the loaded DataFrame
+    """
+    __slots__ = ("row",) + CARPARK_COLUMNS
+
+    def __init__(self, row, values):
+        self.row = row
+        for column, value in zip(CARPARK_COLUMNS, values):
+            setattr(self, column, value)
+
+    def as_dict(self):
+        """
+        Returns the carpark details keyed by column name, without car_park_no
+        """
+        return {column: getattr(self, column) for column in CARPARK_COLUMNS[1:]}
+
+
+class CarparkStore:
+    """
+    Keyed record store built once when the carpark table is loaded: a hash index from
+    car_park_no to a compact CarparkRecord, so lookups do not depend on the table size.
+    """
+
+    def __init__(self, df):
+        missing = [column for column in CARPARK_COLUMNS if column not in df.columns]
+        if missing:
+            raise ValueError(f"Carpark table is missing columns: {missing}")
+        self.df = df
+        self.records = {}
+        columns = [df[column].tolist() for column in CARPARK_COLUMNS]
+        for row, values in zip(df.index.tolist(), zip(*columns)):
+            # keep the first row of a duplicated carpark number, like a boolean filter + iloc[0]
+            self.records.setdefault(values[0], CarparkRecord(row, values))
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, carpark_no):
+        return carpark_no in self.records
+
+    def get(self, carpark_no):
+        return self.records.get(carpark_no)
+
+    def lookup(self, carpark_no, df = None):
+        """
+        Returns the record of carpark_no, or None if it does not exist or, when df is given, if it is not
+        part of df (e.g. a table already filtered by address). A df that is not taken from the indexed
+        table, like the previous table still held by a query while a reload is swapped in, is read itself.
+        """
+        record = self.records.get(carpark_no)
+        if df is None or df is self.df:
+            return record
+        if record is not None and self._holds(df, record):
+            return record
+        rows = np.flatnonzero(df['car_park_no'].to_numpy() == carpark_no)
+        return _record(df, rows[0]) if len(rows) else None
+
+    def records_of(self, df):
+        """
+        Returns the records of the carparks of df, in its order, reading the rows of df that are not
+        taken from the indexed table from df itself
+        """
+        if df is self.df:
+            return [self.records[no] for no in df['car_park_no']]
+        records = []
+        for position, (row, carpark_no) in enumerate(zip(df.index.tolist(), df['car_park_no'].tolist())):
+            record = self.records.get(carpark_no)
+            records.append(record if record is not None and record.row == row else _record(df, position))
+        return records
+
+    def _holds(self, df, record):
+        # df has the row of record under the same label, as a slice of the indexed table does
+        try:
+            return df.at[record.row, 'car_park_no'] == record.car_park_no
+        except (KeyError, ValueError):
+            return False
+
+
+def _record(df, position):
+    return CarparkRecord(df.index[position], df[list(CARPARK_COLUMNS)].iloc[position].tolist())
+
+
+_store = None
+
+
+def set_store(store):
+    global _store
+    _store = store
+    return store
+
+
+def get_store(df = None):
+    """
+    Returns the store of the loaded carpark table, building one from df if none has been loaded yet
+    """
+    if _store is None and df is not None:
+        return set_store(CarparkStore(df))
+    return _store
@@ -0,0 +1,644 @@
+import asyncio
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+import requests
+import carpark_store
+from carpark_store import CarparkStore
+import availability
+from availability import AvailabilitySnapshotStore
+from address_index import AddressIndex, get_address_index, set_address_index
+from fuzzy_match import semi_global_distance
+from helper_functions import suggest_carparks, nearby_carparks, filter_address_by_input
+from spatial_index import CarparkGrid, set_spatial_index
+from batch import run_batch
+from carpark_service import CarparkService
+from history_store import HistoryStore, HistoryPoller, backfill
+from availability_snapshot import AvailabilitySnapshot
+from run_commands import resolve_last_update, resolve_stale_carparks
+from run_data_loader import load_carpark_data, fetch_carpark_data, fetch_real_time_data, get_client
+from table_reload import TableReloader
+
+
+def availability_payload(lots_available, update_datetime = "2025-01-01T10:00:00"):
+    return {"items": [{"timestamp": update_datetime, "carpark_data": [
+        {"carpark_number": "ACB", "update_datetime": update_datetime,
+         "carpark_info": [{"total_lots": "100", "lot_type": "C", "lots_available": str(lots_available)}]},
+    ]}]}
+
+
+class StubAvailabilityAPI:
+    """
+    Local stand-in for the data.gov.sg availability endpoint serving whatever payload/status is set
+    """
+
+    def __init__(self):
+        self.payload = availability_payload(10)
+        self.status = 200
+        self.etag = None
+        self.requests = 0
+        self.paths = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                stub.paths.append(self.path)
+                if stub.etag is not None and self.headers.get("If-None-Match") == stub.etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = json.dumps(stub.payload).encode("utf-8")
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if stub.etag is not None:
+                    self.send_header("ETag", stub.etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/transport/carpark-availability"
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestFunctions(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = load_carpark_data()
+
+    def setUp(self):
+        carpark_store.set_store(CarparkStore(self.df))
+
+    # Test for the car_park_no record store
+    def test_carpark_store_lookup(self):
+        store = carpark_store.get_store()
+        record = store.get("ACB")
+        self.assertEqual(record.address, "BLK 270/271 ALBERT CENTRE BASEMENT CAR PARK")
+        self.assertEqual(record.as_dict()["gantry_height"], 1.8)
+        self.assertIsNone(store.get("NOPE"))
+
+        # lookups restricted to an already filtered table
+        subset = self.df[self.df["address"].str.contains("ALBERT")]
+        self.assertIsNotNone(store.lookup("ACB", subset))
+        self.assertIsNone(store.lookup("ACM", subset))
+
+    def test_fetch_carpark_data(self):
+        subset = self.df.head(3)
+        expected = {row["car_park_no"]: {k: v for k, v in row.items() if k != "car_park_no"}
+                    for row in subset.to_dict("records")}
+        self.assertEqual(fetch_carpark_data(subset), expected)
+        self.assertEqual(fetch_carpark_data(subset, "ACB"), {"ACB": expected["ACB"]})
+        self.assertEqual(fetch_carpark_data(subset, "AK19"), {})
+
+    # Test that the address index returns exactly what scanning the addresses returns
+    def test_address_index_matches_scan(self):
+        index = AddressIndex(self.df)
+        queries = ["SENJA", "senja road", "BLK616A", "ang mo kio", "AMK", "zzzz", "ROAD", "11", "JALAN.MINYAK", "^BLK 2"]
+        for query in queries:
+            for compact in (False, True):
+                addresses = self.df['address'].str.replace(" ", "") if compact else self.df['address']
+                expected = self.df[addresses.str.contains(query, case = False, na = False)]
+                pd.testing.assert_frame_equal(index.contains(self.df, query, compact), expected)
+
+        # a filtered table is scanned instead of using the index of the full table
+        subset = self.df.head(50)
+        pd.testing.assert_frame_equal(index.contains(subset, "ROAD"), subset[subset['address'].str.contains("ROAD", case = False)])
+
+    # Test the pre-parsed block tokens and ranges against the row-by-row block matcher
+    def test_block_index(self):
+        from helper_functions import extract_block_range
+        index = AddressIndex(self.df)
+        self.assertEqual(extract_block_range("BLK 514 - 519 JELAPANG ROAD"), (514, 519))
+        self.assertIsNone(extract_block_range("BLK 98A JALAN DUSUN"))
+
+        towns = index.contains(self.df, "JURONG WEST")
+        for block in ["480", "616A", "7", "12", "999"]:
+            def block_matches(address):
+                if re.search(rf'\b{block}\b', address, re.IGNORECASE):
+                    return True
+                block_range = extract_block_range(address)
+                return bool(block_range) and block_range[0] <= int(''.join(filter(str.isdigit, block))) <= block_range[1]
+
+            expected = towns[towns['address'].apply(block_matches)]
+            pd.testing.assert_frame_equal(index.filter_block(towns, block, block_matches), expected)
+
+    # Tests for the typo-tolerant fallback search
+    def test_semi_global_distance(self):
+        texts = ["angmokioavenue", "senjaroad", ""]
+        codes = np.zeros((3, 14), dtype = np.uint8)
+        for i, text in enumerate(texts):
+            codes[i, :len(text)] = np.frombuffer(text.encode("ascii"), dtype = np.uint8)
+        lengths = np.array([len(text) for text in texts])
+        self.assertEqual(semi_global_distance(b"mokio", codes, lengths).tolist(), [0, 4, 5])
+        self.assertEqual(semi_global_distance(b"senjarod", codes, lengths).tolist()[1], 1)
+        self.assertEqual(semi_global_distance(b"angmokeo", codes, lengths).tolist()[0], 1)
+
+    def test_suggest_carparks(self):
+        set_address_index(AddressIndex(self.df))
+        suggestions = suggest_carparks(self.df, "SENJA ROD")
+        self.assertEqual(len(suggestions), 5)
+        self.assertTrue(suggestions['address'].str.contains("SENJA ROAD").all())
+        self.assertTrue((suggestions['score'] < 1).all())
+
+        # the block is also looked up inside block ranges of the closest town
+        suggestions = suggest_carparks(self.df, "JALAN BAHAGA", "28")
+        self.assertEqual(suggestions['car_park_no'].tolist(), ["BR11"])
+        self.assertTrue(suggest_carparks(self.df, "QWERTYUIOP").empty)
+
+    # Tests for the nearby carpark queries on the spatial grid
+    def test_nearby_carparks(self):
+        grid = set_spatial_index(CarparkGrid(self.df, cell_size = 300))
+        x, y = 30000.0, 35000.0
+        distances = np.hypot(self.df['x_coord'] - x, self.df['y_coord'] - y)
+        closest = distances.sort_values(kind = "stable")
+
+        nearest = nearby_carparks(self.df, x = x, y = y, n = 10)
+        self.assertEqual(nearest.index.tolist(), closest.index[:10].tolist())
+        within = nearby_carparks(self.df, x = x, y = y, radius = 800)
+        self.assertEqual(within.index.tolist(), closest[closest <= 800].index.tolist())
+
+        # around a carpark, which is itself left out
+        around = nearby_carparks(self.df, carpark_no = "ACB", n = 3)
+        self.assertEqual(len(around), 3)
+        self.assertNotIn("ACB", around['car_park_no'].tolist())
+        self.assertTrue(around['distance'].is_monotonic_increasing)
+        self.assertIsNone(nearby_carparks(self.df, carpark_no = "NOPE"))
+
+        # only carparks with lots available in the snapshot
+        full = set(around['car_park_no'][:2])
+        snapshot = {no: {"C": {"lots_available": 0 if no in full else 1, "total_lots": 10}} for no in self.df['car_park_no']}
+        availability.set_availability_store(AvailabilitySnapshotStore(fetch = lambda: snapshot))
+        self.addCleanup(availability.set_availability_store, None)
+        available = nearby_carparks(self.df, carpark_no = "ACB", n = 3, available_only = True)
+        self.assertTrue(full.isdisjoint(available['car_park_no']))
+        self.assertEqual(available['car_park_no'].iloc[0], around['car_park_no'].iloc[2])
+
+    # Test the non-interactive batch mode
+    def test_run_batch(self):
+        set_address_index(AddressIndex(self.df))
+        set_spatial_index(CarparkGrid(self.df))
+        snapshot = {"ACB": {"C": {"is_available": True, "total_lots": "100", "lots_available": "5",
+                                  "update_datetime": "2025-01-01T10:00:00"}}}
+        queries = [
+            {"type": "carpark", "carpark_no": "ACB"},
+            {"type": "address", "address": "BLK 28 JALAN BAHAGA"},
+            {"type": "town", "town": "SENJA ROAD", "block": "616A"},
+            {"type": "nearby", "carpark_no": "CY", "n": 2, "available_only": True},
+            {"type": "last_update", "carpark_no": "ACB"},
+            {"type": "unknown"},
+        ]
+        lines = [json.dumps(query) for query in queries] + ["", "not json"]
+
+        outputs = []
+        for workers in (1, 3):
+            out = io.StringIO()
+            summary = run_batch(self.df, snapshot, lines, out, workers = workers, quiet = True)
+            self.assertEqual(summary["queries"], 7)
+            self.assertEqual(summary["errors"], 2)
+            records = [json.loads(line) for line in out.getvalue().splitlines()]
+            for record in records:
+                record.pop("seconds")
+            outputs.append(records)
+        self.assertEqual(outputs[0], outputs[1])
+
+        results = [record.get("result") for record in outputs[0]]
+        self.assertEqual(results[0]["availability"]["C"]["lots_available"], "5")
+        self.assertEqual(results[1]["match"], "closest")
+        self.assertEqual(results[1]["carparks"][0]["car_park_no"], "BR11")
+        self.assertIn("BJ49", [carpark["car_park_no"] for carpark in results[2]["carparks"]])
+        self.assertEqual([carpark["car_park_no"] for carpark in results[3]["carparks"]], ["ACB"])
+        self.assertEqual(results[4], {"update_datetime": "2025-01-01T10:00:00"})
+        self.assertEqual([record["line"] for record in outputs[0]], [1, 2, 3, 4, 5, 6, 8])
+
+    # Test the cache of the standardized table and its indexes
+    def test_load_carpark_data_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        csv_path = shutil.copy("../datasets/HDBCarparkInformation.csv", directory)
+        cache_path = f"{directory}/cache.pkl"
+        self.addCleanup(load_carpark_data, verbose = False)
+
+        built = load_carpark_data(csv_path, cache_path, verbose = False)
+        suggested = suggest_carparks(built, "ANG MOKIO")['car_park_no'].tolist()
+        nearby = nearby_carparks(built, carpark_no = "ACB")['car_park_no'].tolist()
+        cached = load_carpark_data(csv_path, cache_path, verbose = False)
+        pd.testing.assert_frame_equal(cached, built)
+        self.assertIsNot(cached, built)
+        # the indexes come from the cache too
+        self.assertEqual(suggest_carparks(cached, "ANG MOKIO")['car_park_no'].tolist(), suggested)
+        self.assertEqual(nearby_carparks(cached, carpark_no = "ACB")['car_park_no'].tolist(), nearby)
+
+        # a changed csv is loaded again
+        with open(csv_path, "a", encoding = "utf-8") as f:
+            f.write("ZZ1,BLK 1 TEST ROAD,30000.0,30000.0,SURFACE CAR PARK,ELECTRONIC PARKING,NO,NO,NO,0,0.0,N\n")
+        self.assertIn("ZZ1", load_carpark_data(csv_path, cache_path, verbose = False)['car_park_no'].tolist())
+        self.assertIn("ZZ1", load_carpark_data(csv_path, cache_path, verbose = False)['car_park_no'].tolist())
+
+    # Test reloading a changed csv into the loaded table and its indexes
+    def test_table_reload(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        csv_path = shutil.copy("../datasets/HDBCarparkInformation.csv", directory)
+        self.addCleanup(load_carpark_data, verbose = False)
+        df = load_carpark_data(csv_path, cache_path = None, verbose = False)
+        reloaded = []
+        # the csv version is taken from the loaded table, without reading the csv again
+        with patch("table_reload.read_carpark_csv", side_effect = AssertionError("csv read again")):
+            reloader = TableReloader(df, csv_path, on_reload = reloaded.append, cache_path = None)
+        self.assertIsNone(reloader.check())
+
+        # a csv that was only touched is hashed once, then recognised by its new mtime
+        stat = os.stat(csv_path)
+        os.utime(csv_path, ns = (stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNone(reloader.check())
+        self.assertEqual(reloader._source['stat'], (stat.st_mtime_ns + 10 ** 9, stat.st_size))
+        with patch("run_data_loader.hashlib.sha256", side_effect = AssertionError("csv hashed again")):
+            self.assertIsNone(reloader.check())
+
+        raw = pd.read_csv(csv_path)
+        raw = raw[raw['car_park_no'] != "BJ1"]
+        raw.loc[raw['car_park_no'] == "ACB", 'address'] = "BLK 1 TO 3 NEW ACB ROAD"
+        added = raw[raw['car_park_no'] == "CY"].assign(car_park_no = "ZZ1", address = "BLK 9 ZEBRA LANE")
+        pd.concat([added, raw]).to_csv(csv_path, index = False)
+
+        diff = reloader.check()
+        self.assertEqual((diff.added, diff.removed, diff.changed), (["ZZ1"], ["BJ1"], ["ACB"]))
+        new_df = reloaded[-1]
+        self.assertIs(reloader.df, new_df)
+        self.assertIsNone(reloader.check())
+
+        # the carried over index is the same as one built from scratch
+        index, fresh = get_address_index(), AddressIndex(new_df)
+        self.assertIs(index.df, new_df)
+        for name in ("full", "compact", "blocks"):
+            postings, expected = getattr(index, name).postings, getattr(fresh, name).postings
+            self.assertEqual(postings.keys(), expected.keys())
+            self.assertTrue(all(np.array_equal(postings[key], expected[key]) for key in expected))
+        self.assertTrue(np.array_equal(index.fuzzy.codes, fresh.fuzzy.codes))
+
+        self.assertEqual(filter_address_by_input(new_df, "BLK 1-3 NEW ACB ROAD")['car_park_no'].tolist(), ["ACB"])
+        self.assertEqual(filter_address_by_input(new_df, "ZEBRA LANE")['car_park_no'].tolist(), ["ZZ1"])
+        self.assertTrue(filter_address_by_input(new_df, "BLK 270/271 ALBERT").empty)
+        self.assertEqual(nearby_carparks(new_df, carpark_no = "ZZ1", n = 1)['car_park_no'].tolist(), ["CY"])
+        self.assertEqual(fetch_carpark_data(new_df, "BJ1"), {})
+
+        # a query still holding (a part of) the previous table is answered from it, by car_park_no
+        old_acb = df[df['car_park_no'] == "ACB"]
+        self.assertEqual(fetch_carpark_data(old_acb, "ACB")["ACB"]['address'], old_acb['address'].iloc[0])
+        self.assertEqual(fetch_carpark_data(old_acb, "CY"), {})
+        self.assertEqual(fetch_carpark_data(df, "BJ1")["BJ1"]['address'], df.loc[df['car_park_no'] == "BJ1", 'address'].iloc[0])
+        self.assertEqual(fetch_carpark_data(df).keys(), dict.fromkeys(df['car_park_no']).keys())
+        self.assertEqual(fetch_carpark_data(new_df.iloc[1:3]).keys(), set(new_df['car_park_no'].iloc[1:3]))
+
+    # Test the array-backed availability snapshot
+    def test_availability_snapshot(self):
+        payload = {"items": [{"carpark_data": [
+            {"carpark_number": "ACB", "update_datetime": "2025-01-01T10:00:00",
+             "carpark_info": [{"total_lots": "100", "lot_type": "C", "lots_available": "5"},
+                              {"total_lots": "10", "lot_type": "Y", "lots_available": "0"}]},
+            {"carpark_number": "CY", "update_datetime": "2025-01-01T09:00:00",
+             "carpark_info": [{"total_lots": "50", "lot_type": "C", "lots_available": "0"}]},
+            {"carpark_number": "NOPE", "update_datetime": "2025-01-01T08:00:00",
+             "carpark_info": [{"total_lots": "4", "lot_type": "Z", "lots_available": "4"}]},
+        ]}]}
+        snapshot = AvailabilitySnapshot.from_payload(payload)
+
+        # still reads like the dictionary of carparks
+        self.assertEqual(len(snapshot), 3)
+        self.assertIn("CY", snapshot)
+        self.assertNotIn("BR11", snapshot)
+        self.assertEqual(snapshot["ACB"]["C"], {"is_available": True, "total_lots": 100, "lots_available": 5,
+                                                "update_datetime": "2025-01-01T10:00:00"})
+        self.assertFalse(snapshot["ACB"]["Y"]["is_available"])
+        self.assertEqual(list(snapshot["NOPE"]), ["Z"])
+        self.assertEqual(AvailabilitySnapshot.from_dict(snapshot), snapshot)
+
+        self.assertEqual(snapshot.with_free_lots(), ["ACB"])
+        self.assertEqual(snapshot.with_free_lots(6), [])
+        self.assertEqual(snapshot.with_free_lots(lot_type = "Z"), ["NOPE"])
+        self.assertEqual(snapshot.occupancy().to_dict(), {"ACB": 0.95, "CY": 1.0})
+        self.assertEqual(snapshot.any_available().tolist(), [True, False, True])
+
+        # aligned to the rows of the carpark table, NaN where nothing is reported
+        table = snapshot.table(self.df)
+        acb = self.df.index[self.df['car_park_no'] == "ACB"][0]
+        self.assertEqual(table.loc[acb, 'lots_available'], 5)
+        self.assertEqual(table['total_lots'].notna().sum(), 2)
+        self.assertTrue(table.index.equals(self.df.index))
+
+    # Test the update times precomputed from a snapshot
+    def test_last_update(self):
+        payload = {"items": [{"timestamp": "2025-01-01T11:00:00+08:00", "carpark_data": [
+            {"carpark_number": "ACB", "update_datetime": "2025-01-01T10:00:00",
+             "carpark_info": [{"total_lots": "100", "lot_type": "C", "lots_available": "5"}]},
+            # only heavy vehicle lots, and listed twice with different times
+            {"carpark_number": "HV1", "update_datetime": "2025-01-01T10:58:00",
+             "carpark_info": [{"total_lots": "10", "lot_type": "H", "lots_available": "1"}]},
+            {"carpark_number": "HV1", "update_datetime": "2025-01-01T10:30:00",
+             "carpark_info": [{"total_lots": "4", "lot_type": "Y", "lots_available": "0"}]},
+            {"carpark_number": "BAD", "update_datetime": "not a time", "carpark_info": []},
+        ]}]}
+        snapshot = AvailabilitySnapshot.from_payload(payload)
+        self.assertEqual(resolve_last_update(snapshot, "HV1"), "2025-01-01T10:58:00")
+        self.assertEqual(resolve_last_update(snapshot), "2025-01-01T10:58:00")
+        self.assertEqual(resolve_last_update(snapshot, "NOPE"), "Carpark number NOPE not found.")
+        self.assertIsNone(resolve_last_update(snapshot, "BAD"))
+        self.assertIsNone(resolve_last_update({}))
+
+        # stale carparks relative to the payload timestamp, least recently updated first
+        self.assertEqual(snapshot.stale(30), ["BAD", "ACB"])
+        self.assertEqual(snapshot.stale(90), ["BAD"])
+        self.assertEqual(snapshot.stale(30, now = "2025-01-01T11:30:00"), ["BAD", "ACB", "HV1"])
+        stale = resolve_stale_carparks(snapshot, 30)
+        self.assertEqual(stale["reference_time"], "2025-01-01T11:00:00")
+        self.assertEqual(stale["staleness"]["0-5 min"], 1)
+        self.assertEqual(stale["staleness"]["60-180 min"], 1)
+        self.assertEqual(sum(stale["staleness"].values()), 3)
+
+        # windows that cannot be computed are refused, huge ones only leave the carparks never updated
+        for minutes in (float("inf"), float("nan"), -1):
+            with self.assertRaises(ValueError):
+                resolve_stale_carparks(snapshot, minutes)
+        self.assertEqual(snapshot.stale(1e30), ["BAD"])
+
+    # Tests for the availability history store
+    def test_history_store(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        store = HistoryStore(directory, chunk_snapshots = 3)
+        # Thursday 2025-10-16 08:00 in Singapore
+        start = 1760572800
+        for minute in range(7):
+            snapshot = {"ACB": {"C": {"lots_available": str(10 + minute), "total_lots": "100"}}}
+            if minute >= 2:
+                # a carpark and lot type that only appear later
+                snapshot["CY"] = {"C": {"lots_available": "50", "total_lots": "50"}, "H": {"lots_available": "1", "total_lots": "2"}}
+            # dictionaries and parsed snapshots are stored the same way
+            store.append(snapshot if minute % 2 else AvailabilitySnapshot.from_dict(snapshot), start + 60 * minute)
+
+        self.assertEqual(len(store.chunk_paths()), 2)
+        self.assertEqual(len(store.chunk_paths(start + 200, start + 250)), 1)
+        series = store.series("ACB")
+        self.assertEqual(series['lots_available'].tolist(), list(range(10, 17)))
+        self.assertEqual(series.index[0].hour, 8)
+        self.assertEqual(store.series("CY", start = start + 60).shape, (5, 2))
+        self.assertEqual(store.series("CY", 'H')['total_lots'].tolist(), [2] * 5)
+        self.assertTrue(store.series("NOPE").empty)
+
+        # occupancy of both carparks together, before and after CY reports
+        occupancy = store.occupancy(["ACB", "CY"])
+        self.assertAlmostEqual(occupancy.iloc[0], 0.9)
+        self.assertAlmostEqual(occupancy.iloc[2], 1 - 62 / 150)
+        self.assertEqual(store.profile(["ACB"], weekdays_only = True).index.tolist(), [8])
+
+        # everything still reads back after the buffer is written out
+        store.flush()
+        self.assertEqual(HistoryStore(directory).series("ACB")['lots_available'].tolist(), list(range(10, 17)))
+
+    def test_history_part_files(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        store = HistoryStore(directory, flush_interval = 120)
+        start = 1760572800
+        for minute in range(4):
+            store.append({"ACB": {"C": {"lots_available": str(minute), "total_lots": "100"}}}, start + 60 * minute)
+        # the first three minutes are on disk although no chunk is full yet
+        self.assertEqual(len(os.listdir(directory)), 1)
+        self.assertEqual(store.series("ACB")['lots_available'].tolist(), [0, 1, 2, 3])
+
+        # a process stopped without flushing: the part file is read back and absorbed by the next chunk
+        recovered = HistoryStore(directory)
+        self.assertEqual(recovered.series("ACB")['lots_available'].tolist(), [0, 1, 2])
+        recovered.append({"ACB": {"C": {"lots_available": "9", "total_lots": "100"}}}, start + 300)
+        recovered.flush()
+        self.assertEqual([name.split("-")[0] for name in os.listdir(directory)], ["chunk"])
+        self.assertEqual(HistoryStore(directory).series("ACB")['lots_available'].tolist(), [0, 1, 2, 9])
+
+    def test_history_poller(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        store = HistoryStore(directory)
+        poller = HistoryPoller(store, interval = 0.01, fetch = lambda: {"ACB": {"C": {"lots_available": "1", "total_lots": "2"}}})
+        poller.start()
+        for _ in range(100):
+            if poller.polls >= 3:
+                break
+            time.sleep(0.01)
+        poller.stop()
+        self.assertGreaterEqual(len(HistoryStore(directory).series("ACB")), 3)
+
+    # Tests for the availability snapshot store against a local stub of the API
+    def test_availability_stale_while_revalidate(self):
+        api = StubAvailabilityAPI()
+        self.addCleanup(api.close)
+        store = AvailabilitySnapshotStore(api.url, ttl = 0.05)
+
+        self.assertEqual(store.get()["ACB"]["C"]["lots_available"], 10)
+        self.assertEqual(api.requests, 1)
+        # a fresh snapshot is served without asking the API again
+        store.get()
+        self.assertEqual(api.requests, 1)
+
+        api.payload = availability_payload(3, "2025-01-01T10:01:00")
+        time.sleep(0.1)
+        # the stale snapshot is returned immediately while the refresh runs in the background
+        self.assertEqual(store.get()["ACB"]["C"]["lots_available"], 10)
+        for _ in range(100):
+            if store.get()["ACB"]["C"]["lots_available"] == 3:
+                break
+            time.sleep(0.02)
+        self.assertEqual(store.get()["ACB"]["C"]["update_datetime"], "2025-01-01T10:01:00")
+
+    def test_fetch_real_time_data(self):
+        api = StubAvailabilityAPI()
+        self.addCleanup(api.close)
+        snapshot = fetch_real_time_data(api.url)
+        self.assertEqual(snapshot["ACB"]["C"]["lots_available"], 10)
+        self.assertEqual(snapshot.timestamp, "2025-01-01T10:00:00")
+
+        # parsed while streaming, in chunks of any size
+        body = json.dumps(availability_payload(10)).encode("utf-8")
+        streamed = AvailabilitySnapshot.from_stream(body[i:i + 7] for i in range(0, len(body), 7))
+        self.assertEqual(streamed, AvailabilitySnapshot.from_payload(availability_payload(10)))
+
+        # the same timestamp or a matching validator gives back the previous snapshot unparsed
+        self.assertIs(fetch_real_time_data(api.url, previous = snapshot), snapshot)
+        api.payload = availability_payload(3, "2025-01-01T10:01:00")
+        changed = fetch_real_time_data(api.url, previous = snapshot)
+        self.assertEqual(changed["ACB"]["C"]["lots_available"], 3)
+        api.payload, api.etag = availability_payload(4, "2025-01-01T10:02:00"), '"v2"'
+        tagged = fetch_real_time_data(api.url, previous = changed)
+        self.assertEqual(tagged.etag, '"v2"')
+        self.assertIs(fetch_real_time_data(api.url, previous = tagged), tagged)
+        self.assertEqual(api.requests, 5)
+
+        # past availability, e.g. to backfill the history
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        api.etag = None
+        appended = backfill(HistoryStore(directory), "2025-01-01T08:00:00", "2025-01-01T08:02:00", step = 60, url = api.url)
+        self.assertEqual(appended, 1)
+        self.assertEqual(api.paths[-3:], [f"/v1/transport/carpark-availability?date_time=2025-01-01T08%3A0{minute}%3A00"
+                                          for minute in range(3)])
+        self.assertEqual(len(HistoryStore(directory).series("ACB")), 1)
+
+    def test_fetch_goes_through_shared_client(self):
+        api = StubAvailabilityAPI()
+        self.addCleanup(api.close)
+        host = api.url.split("/")[2]
+        client = get_client()
+
+        # a server that stays unavailable is retried, then reported
+        api.status = 503
+        with patch.object(client, "backoff", 0.001):
+            with self.assertRaises(requests.HTTPError):
+                fetch_real_time_data(api.url)
+        self.assertEqual(api.requests, client.retries + 1)
+
+        api.status = 200
+        fetch_real_time_data(api.url)
+        summary = client.summary()[host]
+        self.assertEqual(summary["requests"], 2)
+        self.assertEqual(summary["retries"], client.retries)
+        # bytes read from the bodies, the error responses were dropped unread
+        self.assertEqual(summary["bytes"], len(json.dumps(api.payload)))
+        self.assertEqual(summary["circuit"], "closed")
+
+    def test_availability_failed_refresh_keeps_snapshot(self):
+        api = StubAvailabilityAPI()
+        self.addCleanup(api.close)
+        store = AvailabilitySnapshotStore(api.url)
+        self.assertTrue(store.refresh())
+
+        api.status = 500
+        self.assertFalse(store.refresh())
+        self.assertIsNotNone(store.last_error)
+        self.assertEqual(store.get()["ACB"]["C"]["lots_available"], 10)
+
+        # without any snapshot, queries get an empty one instead of an error
+        self.assertEqual(AvailabilitySnapshotStore(api.url).get(), {})
+
+    def test_availability_background_refresher(self):
+        api = StubAvailabilityAPI()
+        self.addCleanup(api.close)
+        store = AvailabilitySnapshotStore(api.url, refresh_interval = 0.02).start()
+        self.addCleanup(store.stop)
+        for _ in range(100):
+            if api.requests >= 3:
+                break
+            time.sleep(0.02)
+        self.assertGreaterEqual(api.requests, 3)
+        store.stop()
+        self.assertIsNone(store._thread)
+
+
+class TestCarparkService(unittest.TestCase):
+    """
+    Runs the HTTP service on a local port, with its availability fetched from a stub of the data.gov.sg API
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = load_carpark_data()
+        cls.api = StubAvailabilityAPI()
+        cls.loop = asyncio.new_event_loop()
+        threading.Thread(target = cls.loop.run_forever, daemon = True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.api.close()
+
+    def start_service(self, **kwargs):
+        service = CarparkService(self.df, AvailabilitySnapshotStore(self.api.url), **kwargs)
+        asyncio.run_coroutine_threadsafe(service.start("127.0.0.1", 0), self.loop).result(10)
+        self.addCleanup(lambda: asyncio.run_coroutine_threadsafe(service.stop(), self.loop).result(10))
+        return service
+
+    def get(self, service, path, method = "GET"):
+        request = urllib.request.Request(f"http://127.0.0.1:{service.port}{path}", method = method)
+        try:
+            with urllib.request.urlopen(request, timeout = 10) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_endpoints(self):
+        service = self.start_service()
+        status, body = self.get(service, "/carparks/ACB")
+        self.assertEqual(status, 200)
+        self.assertEqual(body["details"]["address"], "BLK 270/271 ALBERT CENTRE BASEMENT CAR PARK")
+        self.assertEqual(body["availability"]["C"]["lots_available"], 10)
+        self.assertFalse(self.get(service, "/carparks/NOPE")[1]["found"])
+
+        status, body = self.get(service, "/search/address?q=BLK%2028%20JALAN%20BAHAGIA")
+        self.assertEqual(body["carparks"][0]["car_park_no"], "BR11")
+        status, body = self.get(service, "/search/town?town=senja%20road&block=616A")
+        self.assertIn("BJ49", [carpark["car_park_no"] for carpark in body["carparks"]])
+        status, body = self.get(service, "/nearby?carpark_no=ACB&n=3")
+        self.assertEqual(len(body["carparks"]), 3)
+        status, body = self.get(service, "/last-update?carpark_no=ACB")
+        self.assertEqual(body, {"update_datetime": "2025-01-01T10:00:00"})
+
+        self.assertEqual(self.get(service, "/nope")[0], 404)
+        self.assertEqual(self.get(service, "/search/town")[0], 400)
+        self.assertEqual(self.get(service, "/nearby?x=abc&y=1")[0], 400)
+        self.assertEqual(self.get(service, "/stale?minutes=inf")[0], 400)
+        self.assertEqual(self.get(service, "/health", method = "POST")[0], 405)
+        self.assertEqual(self.get(service, "/health")[1]["status"], "ok")
+
+        # unexpected errors are answered with 500 and counted, the service keeps running
+        served = service.served
+        self.assertEqual(self.get(service, "/search/town?town=A&block=(")[0], 500)
+        with patch.object(service, "route", side_effect = RuntimeError("boom")):
+            status, body = self.get(service, "/health")
+        self.assertEqual((status, body), (500, {"error": "Internal error: RuntimeError"}))
+        self.assertEqual(service.served, served + 2)
+        self.assertEqual(self.get(service, "/health")[0], 200)
+
+    def test_concurrency_limit(self):
+        service = self.start_service(max_concurrency = 1, max_pending = 0)
+        release = threading.Event()
+        route = service.route
+        def slow_route(path, params):
+            release.wait(10)
+            return route(path, params)
+        service.route = slow_route
+
+        first = threading.Thread(target = self.get, args = (service, "/health"))
+        first.start()
+        for _ in range(100):
+            if service.pending:
+                break
+            time.sleep(0.01)
+        # the only slot is taken and nothing may wait for it
+        status, body = self.get(service, "/health")
+        self.assertEqual(status, 503)
+        release.set()
+        first.join(10)
+        self.assertEqual(self.get(service, "/health")[0], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
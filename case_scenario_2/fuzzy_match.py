@@ -0,0 +1,105 @@
+import numpy as np
+
+# share of the query characters that may be wrong, missing or extra in an approximate match
+MAX_ERROR_RATE = 0.2
+# most texts scored per query, the ones sharing the most n-grams with it, to bound the latency
+MAX_CANDIDATES = 500
+
+
+def semi_global_distance(query, codes, lengths):
+    """
+    Edit distance between query and its best matching substring of each text, computed for all texts at once.
+
+    Args:
+        query (bytes): the query, in the same encoding as codes
+        codes (numpy.ndarray): (texts, width) uint8 matrix of the texts, padded with zeros
+        lengths (numpy.ndarray): length of every text
+
+    Returns:
+        numpy.ndarray: the smallest number of edits turning query into a substring of each text
+    """
+    columns = np.arange(codes.shape[1] + 1, dtype = np.int16)
+    # the match may start anywhere in a text for free
+    previous = np.zeros((codes.shape[0], codes.shape[1] + 1), dtype = np.int16)
+    for i, char in enumerate(np.frombuffer(query, dtype = np.uint8), 1):
+        current = np.empty_like(previous)
+        current[:, 0] = i
+        # substitution/match and a query character missing from the text
+        np.minimum(previous[:, :-1] + (codes != char), previous[:, 1:] + 1, out = current[:, 1:])
+        # an extra text character inside the match: current[j] = min over k <= j of current[k] + (j - k)
+        current = np.minimum.accumulate(current - columns, axis = 1) + columns
+        previous = current
+    # the match may end anywhere inside the text, but not in the padding
+    previous[columns > lengths[:, None]] = np.iinfo(np.int16).max
+    return previous.min(axis = 1)
+
+
+class ApproximateMatcher:
+    """
+    Typo-tolerant substring search over the texts of an NgramIndex.
+
+    Candidates are the texts sharing enough n-grams with the query to possibly hold it within the allowed
+    number of edits (q-gram count filter). Only those are scored, with a vectorised semi-global edit distance.
+    """
+
+    def __init__(self, ngram_index, previous = None, source = None):
+        self.ngrams = ngram_index
+        texts = [text if text is not None else "" for text in ngram_index.texts]
+        self.lengths = np.array([len(text) for text in texts], dtype = np.int64)
+        width = int(self.lengths.max()) if len(texts) else 0
+        self.codes = np.zeros((len(texts), width), dtype = np.uint8)
+        if ngram_index.ascii:
+            encoded = range(len(texts))
+            if previous is not None and previous.ngrams.ascii:
+                # rows of unchanged texts are copied from the matcher of the previous version of the texts
+                kept = np.flatnonzero(source >= 0)
+                copied = min(width, previous.codes.shape[1])
+                self.codes[kept, :copied] = previous.codes[source[kept], :copied]
+                encoded = np.flatnonzero(source < 0).tolist()
+            for position in encoded:
+                text = texts[position]
+                self.codes[position, :len(text)] = np.frombuffer(text.encode("ascii"), dtype = np.uint8)
+
+    def candidates(self, query, max_distance):
+        """
+        Returns the positions of the texts that may contain query within max_distance edits, at most MAX_CANDIDATES
+        """
+        n = self.ngrams.n
+        grams = {query[i:i + n] for i in range(len(query) - n + 1)}
+        # every edit destroys at most n of the query's n-grams
+        needed = len(grams) - max_distance * n
+        postings = [self.ngrams.postings[gram] for gram in grams if gram in self.ngrams.postings]
+        counts = np.bincount(np.concatenate(postings), minlength = len(self.ngrams)) if postings else np.zeros(len(self.ngrams), dtype = np.int64)
+        positions = np.flatnonzero((counts >= needed) & (self.lengths > 0))
+        if len(positions) > MAX_CANDIDATES:
+            best = np.argpartition(-counts[positions], MAX_CANDIDATES - 1)[:MAX_CANDIDATES]
+            positions = np.sort(positions[best])
+        return positions
+
+    def search(self, query, max_distance = None):
+        """
+        Finds the texts containing query up to a few typos (case-insensitive).
+
+        Args:
+            query (str): text to look for
+            max_distance (int, optional): most edits allowed. Defaults to MAX_ERROR_RATE of the query length, at least 1.
+
+        Returns:
+            tuple: (positions, distances) numpy arrays of the matching texts, closest first
+        """
+        query = query.lower()
+        if not query or not query.isascii() or not self.ngrams.ascii:
+            return np.empty(0, dtype = np.int64), np.empty(0, dtype = np.int64)
+        if max_distance is None:
+            max_distance = max(1, int(len(query) * MAX_ERROR_RATE))
+
+        positions = self.candidates(query, max_distance)
+        if len(positions) == 0:
+            return positions, np.empty(0, dtype = np.int64)
+        width = int(self.lengths[positions].max())
+        distances = semi_global_distance(query.encode("ascii"), self.codes[positions, :width], self.lengths[positions])
+
+        keep = distances <= max_distance
+        positions, distances = positions[keep], distances[keep].astype(np.int64)
+        order = np.argsort(distances, kind = "stable")
+        return positions[order], distances[order]
@@ -1,12 +1,21 @@
+import numpy as np
 import pandas as pd
 import re
-from fuzzywuzzy import process
 import requests
-from run_data_loader import fetch_real_time_data, fetch_carpark_data
+from run_data_loader import fetch_carpark_data
+from availability import get_availability_store
+from address_index import get_address_index, parse_block_range
+from spatial_index import get_spatial_index, NEAREST
+from availability_snapshot import as_snapshot
+
+#number of closest carparks suggested when an address or town is not found
+SUGGESTIONS = 5
 
 def merge_data(df, carpark_no):
-    info_details_dict = fetch_real_time_data().get(carpark_no)
-    carpark_details_dict = fetch_carpark_data(df)
+    #availability is read from the in-memory snapshot, refreshed in the background
+    info_details_dict = get_availability_store().get().get(carpark_no)
+    #only the requested carpark is looked up in the record store
+    carpark_details_dict = fetch_carpark_data(df, carpark_no)
    
     merged_dict = {
         'carpark_no': carpark_no,
@@ -67,11 +76,81 @@ def filter_address_by_input(df, user_input):
     # Standardize user input for comparison
     standardized_input = standardize_address_for_search(user_input)
 
-    # Filter the DataFrame based on the standardized user input
-    filtered_df = df[df['address'].str.replace(" ", "").str.contains(standardized_input, case=False, na=False)]
+    # Filter the DataFrame based on the standardized user input, through the trigram index of the space-free addresses
+    filtered_df = get_address_index(df).contains(df, standardized_input, compact=True)
     return filtered_df 
         
     
+def suggest_carparks(df, query, block = None, k = SUGGESTIONS):
+    """
+    Typo-tolerant fallback for an address or town/road name without any match (e.g. ANG MOKIO).
+
+    Parameters:
+    df (DataFrame): The loaded carpark table.
+    query (str): The address or town/road name as typed, case and spacing are ignored.
+    block (str, optional): The block number, suggestions are then limited to carparks holding it.
+    k (int, optional): The number of suggestions returned. Defaults to SUGGESTIONS.
+
+    Returns:
+    DataFrame: Up to k closest carparks with a score column (1.0 = exact), empty if nothing is close.
+    """
+    index = get_address_index(df)
+    if index is None or index.df is not df:
+        return pd.DataFrame()
+
+    matches = index.approximate(query)
+    block_number = block.strip() if block and block.strip() else None
+    if block_number is not None and not matches.empty:
+        try:
+            matches = index.filter_block(matches, block_number, make_block_matcher(block_number))
+        except ValueError:
+            # a block without any digit cannot be compared with block ranges
+            return pd.DataFrame()
+    return matches.head(k)
+
+
+def nearby_carparks(df, carpark_no = None, x = None, y = None, n = NEAREST, radius = None, available_only = False, snapshot = None):
+    """
+    Finds the carparks closest to a carpark or to a point, ranked by distance.
+
+    Parameters:
+    df (DataFrame): The loaded carpark table.
+    carpark_no (str, optional): The carpark to search around, which is left out of the results.
+    x, y (float, optional): SVY21 coordinates to search around when no carpark number is given.
+    n (int, optional): The number of carparks returned when no radius is given. Defaults to NEAREST.
+    radius (float, optional): Return every carpark within this many metres instead of the n nearest.
+    available_only (bool, optional): Keep only carparks with lots available in the current availability snapshot.
+    snapshot (dict, optional): The availability snapshot to use instead of the current one.
+
+    Returns:
+    DataFrame: The matching carparks with a distance column in metres, or None if carpark_no has no known location.
+    """
+    grid = get_spatial_index(df)
+    exclude = None
+    if carpark_no is not None:
+        location = grid.location(carpark_no)
+        if location is None:
+            return None
+        x, y, exclude = location
+
+    keep = None
+    if available_only:
+        snapshot = as_snapshot(snapshot if snapshot is not None else get_availability_store().get())
+        # any lot type available, per carpark of the grid, as one vectorised lookup
+        rows = snapshot.align(grid.numbers)
+        available = np.append(snapshot.any_available(), False)[rows]
+        def keep(positions):
+            return available[positions]
+
+    if radius is not None:
+        positions, distances = grid.within(x, y, radius, keep)
+        others = positions != exclude
+        positions, distances = positions[others], distances[others]
+    else:
+        positions, distances = grid.nearest(x, y, n, keep, exclude)
+    return grid.frame(positions, distances)
+
+
 def display_carpark_info(merged_dict, carpark_no):
     # Check if the carpark number exists in the merged dictionary
     if carpark_no not in merged_dict:
@@ -120,6 +199,27 @@ def display_carpark_info(merged_dict, carpark_no):
 
 
 
+def make_block_matcher(block_number):
+    """
+    Returns a function telling whether an address holds block_number, either explicitly or inside a block range
+    """
+    def block_matches(address):
+        # Check if block is explicitly in the address
+        if re.search(rf'\b{block_number}\b', address, re.IGNORECASE):
+            return True
+
+        # Check if block falls within a detected block range
+        block_range = extract_block_range(address)
+        if block_range:
+            start_block, end_block = block_range
+            block_numeric = int(''.join(filter(str.isdigit, block_number)))
+            return start_block <= block_numeric <= end_block
+
+        return False
+
+    return block_matches
+
+
 def filter_address_by_block_and_town(df, town, block):
     """
     Filters the DataFrame based on both the block number and the town name together.
@@ -141,30 +241,16 @@ def filter_address_by_block_and_town(df, town, block):
     block_number = None
     block_number = block.strip() if block and block.strip() else None
 
-    # Filter by town (case-insensitive)
-    filtered_df = df[df['address'].str.contains(town, case=False, na=False)]
+    # Filter by town (case-insensitive) through the trigram index of the addresses
+    filtered_df = get_address_index(df).contains(df, town)
     
     if filtered_df.empty:
         print("Town or road name does not exist or checking spelling")
 
     # If block is provided and valid, filter by block or block range
     if block_number is not None:
-        def block_matches(address):
-            # Check if block is explicitly in the address
-            if re.search(rf'\b{block_number}\b', address, re.IGNORECASE):
-                return True
-
-            # Check if block falls within a detected block range
-            block_range = extract_block_range(address)
-            if block_range:
-                start_block, end_block = block_range
-                block_numeric = int(''.join(filter(str.isdigit, block_number)))
-                return start_block <= block_numeric <= end_block
-
-            return False
-
-        # Apply the block matching function
-        filtered_df = filtered_df[filtered_df['address'].apply(block_matches)]
+        # Look the block up in the pre-parsed block tokens and ranges, block_matches is only applied to unusual inputs
+        filtered_df = get_address_index(df).filter_block(filtered_df, block_number, make_block_matcher(block_number))
         
     if filtered_df.empty:
         print("Invalid block number, RESTART search")
@@ -185,17 +271,7 @@ def extract_block_range(address):
     Returns:
     tuple: A tuple with the start and end block numbers (as integers), or None if no range is found.
     """
-    # Standardize the format using fuzzy matching
-    standardized_address = process.extractOne(address, [re.sub(r'\s*-\s*', '-', address)])[0]
-    
-    # Regular expression to match block number ranges
-    match = re.search(r'(\d+)-(\d+)', standardized_address)
-    
-    if match:
-        start_block = int(match.group(1))
-        end_block = int(match.group(2))
-        return start_block, end_block
-    return None
+    return parse_block_range(address)
     
 
 
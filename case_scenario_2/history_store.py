@@ -0,0 +1,442 @@
+import argparse
+import glob
+import os
+import signal
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from address_index import get_address_index
+from availability_snapshot import AvailabilitySnapshot
+from run_data_loader import fetch_real_time_data, load_carpark_data, API_URL
+
+# directory the history chunks are written to
+HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".availability_history")
+# snapshots per chunk file, one day of minute-level polling
+CHUNK_SNAPSHOTS = 24 * 60
+# seconds of snapshots kept only in memory, older ones are written to a part file that the next chunk absorbs
+FLUSH_INTERVAL = 60 * 60
+# seconds between two polls
+POLL_INTERVAL = 60
+# local time the hour-of-day and weekday aggregates are computed in
+TIMEZONE = "Asia/Singapore"
+# stored in place of a lot type a carpark did not report
+MISSING = np.iinfo(np.uint16).max
+# decoded chunks kept in memory for repeated queries
+CACHED_CHUNKS = 8
+
+AVAILABLE, TOTAL = 0, 1
+
+
+def _lots(value):
+    return min(max(int(value), 0), MISSING - 1)
+
+
+def _time_range(path):
+    # (first, last) timestamps of a chunk or part file, from its name
+    first, last = os.path.basename(path)[:-len(".npz")].split("-")[1:]
+    return int(first), int(last)
+
+
+def _decode(data, lot_type):
+    # (snapshots x carparks x [lots_available, total_lots]) values of one lot type of a loaded chunk file
+    values = np.concatenate([data[f"first_{lot_type}"][None].astype(np.int32), data[f"deltas_{lot_type}"]])
+    return values.cumsum(axis = 0).astype(np.uint16)
+
+
+class HistoryStore:
+    """
+    Append-only history of availability snapshots, stored as columnar integer arrays.
+
+    Every snapshot becomes a (carparks x lot types x [lots_available, total_lots]) uint16 array. Snapshots are
+    buffered in memory and written CHUNK_SNAPSHOTS at a time to one compressed .npz file per chunk, holding the
+    poll timestamps, the carparks of the chunk and, per lot type, the first snapshot and the differences
+    between consecutive snapshots. Most lots do not change from one minute to the next, so the differences are
+    mostly zeros and compress to a small fraction of the raw arrays. Chunk file names carry their time range so
+    range queries only open the chunks they need.
+
+    So that a poller stopping without flush() loses at most flush_interval seconds of history, the snapshots
+    buffered for longer are written to part files in the same format. The buffer keeps them until its full chunk
+    is written, which replaces the part files; part files left by a stopped process are read back into the buffer.
+    """
+
+    def __init__(self, directory = HISTORY_DIR, chunk_snapshots = CHUNK_SNAPSHOTS, flush_interval = FLUSH_INTERVAL):
+        self.directory = directory
+        self.chunk_snapshots = chunk_snapshots
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok = True)
+        self.carparks = {}
+        self.lot_types = {}
+        self._timestamps = []
+        self._buffer = []
+        # part files holding the first _parted snapshots of the buffer
+        self._parts = []
+        self._parted = 0
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._recover()
+
+    def _column(self, vocabulary, key):
+        column = vocabulary.get(key)
+        if column is None:
+            column = vocabulary[key] = len(vocabulary)
+        return column
+
+    def append(self, snapshot, timestamp = None):
+        """
+        Adds a parsed snapshot ({carpark_number: {lot_type: details}}, see fetch_real_time_data) taken at
+        timestamp (seconds since the epoch, default now)
+        """
+        timestamp = int(time.time() if timestamp is None else timestamp)
+        with self._lock:
+            if isinstance(snapshot, AvailabilitySnapshot):
+                # the lot columns are already arrays, only the carpark and lot type codes need remapping
+                carpark_rows = np.array([self._column(self.carparks, no) for no in snapshot.carpark_numbers.tolist()], dtype = np.int64)
+                lot_columns = np.array([self._column(self.lot_types, lot_type) for lot_type in snapshot.lot_types], dtype = np.int64)
+                rows, lots = carpark_rows[snapshot.carpark], lot_columns[snapshot.lot_type]
+                available = np.clip(snapshot.lots_available, 0, MISSING - 1)
+                total = np.clip(snapshot.total_lots, 0, MISSING - 1)
+            else:
+                entries = []
+                for carpark_no, lots in snapshot.items():
+                    row = self._column(self.carparks, carpark_no)
+                    for lot_type, details in lots.items():
+                        entries.append((row, self._column(self.lot_types, lot_type),
+                                        _lots(details['lots_available']), _lots(details['total_lots'])))
+                rows, lots, available, total = (np.array(column, dtype = np.int64) for column in zip(*entries)) if entries else [np.empty(0, dtype = np.int64)] * 4
+            values = np.full((len(self.carparks), len(self.lot_types), 2), MISSING, dtype = np.uint16)
+            values[rows, lots, AVAILABLE] = available
+            values[rows, lots, TOTAL] = total
+            self._timestamps.append(timestamp)
+            self._buffer.append(values)
+            if len(self._buffer) >= self.chunk_snapshots:
+                self._flush()
+            elif timestamp - self._timestamps[self._parted] >= self.flush_interval:
+                self._flush_part()
+
+    def _stacked_buffer(self, first = 0):
+        # earlier snapshots may have been taken before some carparks or lot types first appeared
+        shape = (len(self._buffer) - first, len(self.carparks), len(self.lot_types), 2)
+        values = np.full(shape, MISSING, dtype = np.uint16)
+        for t, snapshot in enumerate(self._buffer[first:]):
+            values[t, :snapshot.shape[0], :snapshot.shape[1]] = snapshot
+        return values
+
+    def _flush(self):
+        if not self._buffer:
+            return None
+        path = self._write("chunk", self._timestamps, self._stacked_buffer())
+        # the chunk holds everything the part files did
+        for part in self._parts:
+            try:
+                os.remove(part)
+            except FileNotFoundError:
+                pass
+        self._timestamps, self._buffer = [], []
+        self._parts, self._parted = [], 0
+        return path
+
+    def _flush_part(self):
+        self._parts.append(self._write("part", self._timestamps[self._parted:], self._stacked_buffer(self._parted)))
+        self._parted = len(self._buffer)
+
+    def _write(self, prefix, timestamps, values):
+        timestamps = np.array(timestamps, dtype = np.int64)
+        name = f"{prefix}-{timestamps[0]}-{timestamps[-1]}.npz"
+        path = os.path.join(self.directory, name)
+        tmp_path = os.path.join(self.directory, ".tmp-" + name)
+        # one array pair per lot type, so a query only decompresses the lot type it asks for
+        lot_arrays = {}
+        for lot_type, lot in self.lot_types.items():
+            lot_values = values[:, :, lot].astype(np.int32)
+            lot_arrays[f"first_{lot_type}"] = values[0, :, lot]
+            lot_arrays[f"deltas_{lot_type}"] = np.diff(lot_values, axis = 0)
+        np.savez_compressed(
+            tmp_path,
+            timestamps = timestamps,
+            carparks = np.array(list(self.carparks), dtype = str),
+            **lot_arrays,
+        )
+        os.replace(tmp_path, path)
+        return path
+
+    def _recover(self):
+        # part files whose chunk was written before they could be removed are dropped, the others are read back
+        chunks = [_time_range(path) for path in glob.glob(os.path.join(self.directory, "chunk-*-*.npz"))]
+        for first, last, path in sorted(_time_range(path) + (path,) for path in glob.glob(os.path.join(self.directory, "part-*-*.npz"))):
+            if any(chunk_first <= first and last <= chunk_last for chunk_first, chunk_last in chunks):
+                os.remove(path)
+                continue
+            with np.load(path) as data:
+                rows = np.array([self._column(self.carparks, carpark_no) for carpark_no in data['carparks']], dtype = np.int64)
+                lots = [(self._column(self.lot_types, name[len("first_"):]), _decode(data, name[len("first_"):]))
+                        for name in data.files if name.startswith("first_")]
+                for t, timestamp in enumerate(data['timestamps'].tolist()):
+                    values = np.full((len(self.carparks), len(self.lot_types), 2), MISSING, dtype = np.uint16)
+                    for lot, decoded in lots:
+                        values[rows, lot] = decoded[t]
+                    self._timestamps.append(timestamp)
+                    self._buffer.append(values)
+            self._parts.append(path)
+        self._parted = len(self._buffer)
+
+    def flush(self):
+        """
+        Writes the buffered snapshots to a chunk file; returns its path, or None if nothing was buffered
+        """
+        with self._lock:
+            return self._flush()
+
+    def chunk_paths(self, start = None, end = None):
+        """
+        Returns the chunk files overlapping [start, end] (seconds since the epoch), oldest first, leaving out
+        the part files of snapshots that are still buffered
+        """
+        chunks = []
+        # listed under the lock so that no part file is written or removed meanwhile
+        with self._lock:
+            paths = glob.glob(os.path.join(self.directory, "chunk-*-*.npz")) + glob.glob(os.path.join(self.directory, "part-*-*.npz"))
+            paths = [path for path in paths if path not in self._parts]
+        for path in paths:
+            first, last = _time_range(path)
+            if (start is None or last >= start) and (end is None or first <= end):
+                chunks.append((first, path))
+        return [path for _, path in sorted(chunks)]
+
+    def _load_chunk(self, path, lot_type):
+        """
+        Returns (timestamps, carparks, values) of one lot type of a chunk, values being None if the lot type
+        was never reported in it
+        """
+        key = (path, lot_type)
+        chunk = self._cache.get(key)
+        if chunk is None:
+            with np.load(path) as data:
+                values = _decode(data, lot_type) if f"first_{lot_type}" in data.files else None
+                chunk = (data['timestamps'], list(data['carparks']), values)
+            if len(self._cache) >= CACHED_CHUNKS:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = chunk
+        return chunk
+
+    def _buffered(self, carpark_nos, lot_type, start, end):
+        """
+        Returns (timestamps, carparks, values) of the buffered snapshots, values holding only the requested
+        carparks (those in carparks) and lot type at the snapshots within [start, end]
+        """
+        with self._lock:
+            timestamps = np.array(self._timestamps, dtype = np.int64)
+            lot = self.lot_types.get(lot_type)
+            carparks = [carpark_no for carpark_no in dict.fromkeys(carpark_nos) if carpark_no in self.carparks]
+            rows = np.array([self.carparks[carpark_no] for carpark_no in carparks], dtype = np.int64)
+            if lot is None or not len(rows):
+                return timestamps, carparks, None
+            keep = np.ones(len(timestamps), dtype = bool)
+            if start is not None:
+                keep &= timestamps >= start
+            if end is not None:
+                keep &= timestamps <= end
+            values = np.full((len(timestamps), len(rows), 2), MISSING, dtype = np.uint16)
+            # only the requested cells are copied, the snapshots themselves are left as they are
+            for t in np.flatnonzero(keep):
+                snapshot = self._buffer[t]
+                if lot < snapshot.shape[1]:
+                    present = rows < snapshot.shape[0]
+                    values[t, present] = snapshot[rows[present], lot]
+        return timestamps, carparks, values
+
+    def _chunks(self, carpark_nos, lot_type, start, end):
+        for path in self.chunk_paths(start, end):
+            yield self._load_chunk(path, lot_type)
+        if self._buffer:
+            yield self._buffered(carpark_nos, lot_type, start, end)
+
+    def values(self, carpark_nos, lot_type = 'C', start = None, end = None):
+        """
+        Returns the history of some carparks as (timestamps, values) where values is a
+        (snapshots x carparks x [lots_available, total_lots]) uint16 array, MISSING where nothing was reported.
+
+        Args:
+            carpark_nos (list): carpark numbers, in the column order of the result
+            lot_type (str, optional): lot type. Defaults to 'C' (cars).
+            start (int, optional): first timestamp included, seconds since the epoch
+            end (int, optional): last timestamp included, seconds since the epoch
+        """
+        all_timestamps, all_values = [], []
+        for timestamps, carparks, values in self._chunks(carpark_nos, lot_type, start, end):
+            keep = np.ones(len(timestamps), dtype = bool)
+            if start is not None:
+                keep &= timestamps >= start
+            if end is not None:
+                keep &= timestamps <= end
+            selected = np.full((int(keep.sum()), len(carpark_nos), 2), MISSING, dtype = np.uint16)
+            if values is not None:
+                columns = {carpark_no: column for column, carpark_no in enumerate(carparks)}
+                wanted = np.array([columns.get(carpark_no, -1) for carpark_no in carpark_nos], dtype = np.int64)
+                present = wanted >= 0
+                selected[:, present] = values[keep][:, wanted[present]]
+            all_timestamps.append(timestamps[keep])
+            all_values.append(selected)
+        if not all_timestamps:
+            return np.empty(0, dtype = np.int64), np.empty((0, len(carpark_nos), 2), dtype = np.uint16)
+        return np.concatenate(all_timestamps), np.concatenate(all_values)
+
+    def series(self, carpark_no, lot_type = 'C', start = None, end = None):
+        """
+        Returns the lots_available and total_lots of one carpark over time as a DataFrame indexed by local time
+        """
+        timestamps, values = self.values([carpark_no], lot_type, start, end)
+        reported = values[:, 0, TOTAL] != MISSING
+        index = pd.to_datetime(timestamps[reported], unit = 's', utc = True).tz_convert(TIMEZONE)
+        return pd.DataFrame({'lots_available': values[reported, 0, AVAILABLE].astype(np.int64),
+                             'total_lots': values[reported, 0, TOTAL].astype(np.int64)}, index = index)
+
+    def occupancy(self, carpark_nos, lot_type = 'C', start = None, end = None):
+        """
+        Returns the share of occupied lots over a group of carparks (e.g. a town) at every snapshot, as a
+        Series indexed by local time. Carparks that did not report at a snapshot are left out of it.
+        """
+        timestamps, values = self.values(list(carpark_nos), lot_type, start, end)
+        reported = (values[..., TOTAL] != MISSING) & (values[..., AVAILABLE] != MISSING)
+        available = np.where(reported, values[..., AVAILABLE], 0).sum(axis = 1, dtype = np.int64)
+        total = np.where(reported, values[..., TOTAL], 0).sum(axis = 1, dtype = np.int64)
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            occupied = np.where(total > 0, 1 - available / np.maximum(total, 1), np.nan)
+        index = pd.to_datetime(timestamps, unit = 's', utc = True).tz_convert(TIMEZONE)
+        return pd.Series(occupied, index = index, name = 'occupancy').dropna()
+
+    def profile(self, carpark_nos, lot_type = 'C', start = None, end = None, weekdays_only = False):
+        """
+        Returns the mean occupancy of a group of carparks by local hour of day, e.g. how full they are at 8am
+        on weekdays, as a Series indexed by hour
+        """
+        occupancy = self.occupancy(carpark_nos, lot_type, start, end)
+        if weekdays_only:
+            occupancy = occupancy[occupancy.index.dayofweek < 5]
+        return occupancy.groupby(occupancy.index.hour).mean().rename_axis('hour')
+
+
+def town_carparks(df, town):
+    """
+    Returns the carpark numbers whose address contains town (e.g. ANG MO KIO), for the per-town aggregates
+    """
+    return get_address_index(df).contains(df, town)['car_park_no'].tolist()
+
+
+class HistoryPoller:
+    """
+    Background thread appending a new availability snapshot to a HistoryStore every interval seconds
+    """
+
+    def __init__(self, store, url = API_URL, interval = POLL_INTERVAL, fetch = None):
+        self.store = store
+        self.interval = interval
+        self._last = None
+        self._fetch = fetch or (lambda: fetch_real_time_data(url, previous = self._last))
+        self._stop = threading.Event()
+        self._thread = None
+        self.polls = 0
+
+    def poll(self):
+        try:
+            snapshot = self._fetch()
+        except Exception as e:
+            print(f"Failed to poll carpark availability: {e}")
+            return False
+        # the API has not published anything new since the last poll
+        if snapshot is not self._last:
+            self.store.append(snapshot)
+            self._last = snapshot
+        self.polls += 1
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            self.poll()
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target = self._run, name = "availability-history", daemon = True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops polling and writes the buffered snapshots to disk
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.store.flush()
+
+
+def backfill(store, start, end, step = POLL_INTERVAL, url = API_URL):
+    """
+    Fills the history with the availability the API reports for past times (its date_time parameter), every step
+    seconds from start to end (Singapore times, e.g. "2025-01-01T08:00:00"), and writes it to disk.
+    Times at which nothing new was published are skipped.
+
+    Returns:
+    int: the number of snapshots appended
+    """
+    moment, end = pd.Timestamp(start), pd.Timestamp(end)
+    previous = None
+    appended = 0
+    while moment <= end:
+        try:
+            snapshot = fetch_real_time_data(url, date_time = moment, previous = previous)
+        except Exception as e:
+            print(f"Failed to fetch carpark availability at {moment}: {e}")
+        else:
+            if snapshot is not previous:
+                store.append(snapshot, moment.tz_localize(TIMEZONE).timestamp())
+                previous = snapshot
+                appended += 1
+        moment += pd.Timedelta(seconds = step)
+    store.flush()
+    return appended
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Records carpark availability over time and queries the history")
+    parser.add_argument("--dir", default = HISTORY_DIR, help = "directory of the history chunks")
+    parser.add_argument("--poll", action = "store_true", help = "poll the availability API until interrupted")
+    parser.add_argument("--interval", type = float, default = POLL_INTERVAL, help = "seconds between polls")
+    parser.add_argument("--backfill", nargs = 2, metavar = ("START", "END"),
+                        help = "record the availability between two past times (e.g. 2025-01-01T08:00:00) every --interval seconds")
+    parser.add_argument("--carpark", help = "print the hourly occupancy profile of a carpark")
+    parser.add_argument("--town", help = "print the hourly occupancy profile of a town or road")
+    parser.add_argument("--lot-type", default = 'C', help = "lot type of the profile")
+    parser.add_argument("--weekdays", action = "store_true", help = "only include Monday to Friday in the profile")
+    args = parser.parse_args()
+
+    store = HistoryStore(args.dir)
+    if args.poll:
+        poller = HistoryPoller(store, interval = args.interval).start()
+        print(f"Polling carpark availability every {args.interval}s into {args.dir}, press Ctrl+C to stop")
+        # a service manager stopping the poller gets the buffered snapshots written out as well
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            while True:
+                time.sleep(3600)
+        except (KeyboardInterrupt, SystemExit):
+            poller.stop()
+            print(f"Stopped after {poller.polls} polls")
+    elif args.backfill:
+        appended = backfill(store, *args.backfill, step = args.interval)
+        print(f"Recorded {appended} snapshots between {args.backfill[0]} and {args.backfill[1]} into {args.dir}")
+    elif args.carpark or args.town:
+        if args.town:
+            carpark_nos = town_carparks(load_carpark_data(), args.town)
+        else:
+            carpark_nos = [args.carpark]
+        print(store.profile(carpark_nos, args.lot_type, weekdays_only = args.weekdays))
+    else:
+        parser.print_help()
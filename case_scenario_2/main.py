@@ -1,44 +1,136 @@
-from run_commands import query_carpark_data_by_address, query_last_update_time, query_carpark_info_by_number
-from run_data_loader import load_carpark_data
+import argparse
+import contextlib
+import sys
+import threading
 
-api_url = "https://api.data.gov.sg/v1/transport/carpark-availability"
+# pandas, numpy and requests are only imported once they are needed (see DataLoader and batch_main), so the
+# menu shows up without waiting for them
 
 
+class DataLoader:
+    """
+    Imports the query modules, loads the carpark table (from its cache when possible) and starts the availability
+    refresher on a background thread, while the user reads the menu
+    """
 
-def main():
+    def __init__(self, reload = False):
+        self._df = None
+        self._error = None
+        self._reload = reload
+        self.reloader = None
+        self._thread = threading.Thread(target = self._load, name = "carpark-loader", daemon = True)
+        self._thread.start()
+
+    def _load(self):
+        try:
+            from run_data_loader import load_carpark_data
+            from availability import get_availability_store
+            # imported here so that the first query does not wait for it
+            import run_commands
+            self._df = load_carpark_data(verbose = False)
+            #keep the availability snapshot fresh in the background so queries never wait on the API
+            get_availability_store().start()
+            if self._reload:
+                from table_reload import TableReloader
+                self.reloader = TableReloader(self._df, on_reload = self._reloaded).start()
+        except BaseException as e:
+            self._error = e
+
+    def _reloaded(self, df):
+        self._df = df
+
+    def wait(self):
+        """
+        Returns the loaded table (the latest version of it with reload), waiting for it if it is still loading
+        """
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._df
+
+
+def main(reload = False):
     print("Welcome to the Carpark Query System!")
     print("This tool allows you to search for carpark details and retrieve real-time updates.")
     
-    df = load_carpark_data()
+    data = DataLoader(reload)
 
     while True:
         print("\nPlease select an option:")
         print("1. Query by carpark number")
         print("2. Search for carpark details based on address")
         print("3. View the latest update time")
-        print("4. EXIT")
+        print("4. Find nearby carparks")
+        print("5. EXIT")
         
         choice = input("Enter the number of your choice: ").strip()
+
+        if choice in ("1", "2", "3", "4"):
+            df = data.wait()
+            import run_commands
         
         if choice == "1":
-            query_carpark_info_by_number(df)
+            run_commands.query_carpark_info_by_number(df)
             
         elif choice == "2":
-            query_carpark_data_by_address(df)
+            run_commands.query_carpark_data_by_address(df)
         
         elif choice == "3":
-            latest_update = query_last_update_time()
+            latest_update = run_commands.query_last_update_time()
             print(f"\nLatest update time: {latest_update}")
 
         
         elif choice == "4":
+            run_commands.query_nearby_carparks(df)
+
+        elif choice == "5":
             print("Exiting the system. Have a great day!")
+            data.wait()
+            from availability import get_availability_store
+            get_availability_store().stop()
+            if data.reloader is not None:
+                data.reloader.stop()
             break
         
         else:
             print("Invalid choice. Please enter a valid option.")
 
+def batch_main(queries, output = "-", workers = 1):
+    """
+    Resolves a file of JSON Lines queries ("-" for stdin) against one loaded table and one availability snapshot
+    """
+    from run_data_loader import load_carpark_data
+    from availability import get_availability_store
+    from batch import run_batch
+
+    # the loading messages go to stderr so that stdout only carries results
+    with contextlib.redirect_stdout(sys.stderr):
+        df = load_carpark_data()
+        snapshot = get_availability_store().get()
+
+    lines = sys.stdin if queries == "-" else open(queries, "r", encoding = "utf-8")
+    out = sys.stdout if output == "-" else open(output, "w", encoding = "utf-8")
+    try:
+        return run_batch(df, snapshot, lines, out, workers)
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+        if out is not sys.stdout:
+            out.close()
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description = "Carpark Query System")
+    parser.add_argument("--batch", metavar = "QUERIES", nargs = "?", const = "-", default = None,
+                        help = "resolve a JSON Lines file of queries (stdin if no file is given) instead of prompting")
+    parser.add_argument("--output", default = "-", help = "file the JSON Lines results of --batch are written to (default stdout)")
+    parser.add_argument("--workers", type = int, default = 1, help = "worker threads resolving --batch queries")
+    parser.add_argument("--reload", action = "store_true", help = "pick up changes to HDBCarparkInformation.csv while running")
+    args = parser.parse_args()
+
+    if args.batch is not None:
+        batch_main(args.batch, args.output, args.workers)
+    else:
+        main(args.reload)
 
 
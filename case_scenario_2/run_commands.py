@@ -1,7 +1,10 @@
 import pandas as pd
 import re
-from helper_functions import merge_data, display_carpark_info, filter_address_by_block_and_town, filter_address_by_input, extract_town_block
-from run_data_loader import fetch_real_time_data
+from helper_functions import merge_data, display_carpark_info, filter_address_by_block_and_town, filter_address_by_input, extract_town_block, suggest_carparks, standardize_address_for_search, nearby_carparks
+from spatial_index import NEAREST
+from availability import get_availability_store
+from carpark_store import get_store
+from availability_snapshot import as_snapshot, format_time
 import datetime
 
 def query_carpark_info_by_number(df):
@@ -18,12 +21,11 @@ def query_carpark_info_by_number(df):
     """
     carpark_no = input("Please enter the carpark number (e.g. A20 under car_park_no in the table printed above: ").strip()
 
-    filtered_df = df[df['car_park_no'] == carpark_no]
-
-    if filtered_df.empty:
+    #hash lookup in the record store instead of scanning the table
+    if get_store(df).lookup(carpark_no, df) is None:
         print("No information found for the given car park number.")
         
-    merged_data = merge_data(filtered_df, carpark_no)
+    merged_data = merge_data(df, carpark_no)
     display_carpark_info(merged_data, carpark_no)
     print("Successfully generated carpark information")
     return None
@@ -48,10 +50,21 @@ def query_carpark_data_by_address(df):
             # Filter dataframe based on address
             filtered_df = filter_address_by_input(df, address)
 
+            town, block = None, None
             if filtered_df.empty:
                 town, block = extract_town_block(address)
                 if town and block:
                     filtered_df = filter_address_by_block_and_town(df, town, block)
+
+            # Fall back to the closest addresses when nothing matches, e.g. because of a typo
+            if filtered_df.empty:
+                # closest town/road holding the block first, so blocks inside ranges are still found
+                if town and block:
+                    filtered_df = suggest_carparks(df, town, block)
+                if filtered_df.empty:
+                    filtered_df = suggest_carparks(df, standardize_address_for_search(address))
+                if not filtered_df.empty:
+                    print("No exact match found, showing the closest addresses instead (score 1.0 = exact match)")
             
             if not filtered_df.empty:
                 print(f"The carpark found at this address is \n{filtered_df}")
@@ -74,9 +87,15 @@ def query_carpark_data_by_address(df):
 
             # Filter by town and block
             filtered_df = filter_address_by_block_and_town(df, town, block)
+
+            # Fall back to the closest town or road names when nothing matches, e.g. ANG MOKIO
+            if filtered_df.empty:
+                filtered_df = suggest_carparks(df, town, block)
+                if not filtered_df.empty:
+                    print("Showing the closest matches instead (score 1.0 = exact match)")
             
             if not filtered_df.empty:
-                carpark = filtered_df[['car_park_no', 'address']]
+                carpark = filtered_df[[column for column in ('car_park_no', 'address', 'score') if column in filtered_df]]
                 carpark_no = filtered_df['car_park_no'].iloc[0]
                 print(f"Found the following carparks based on your input:\n{carpark}")
                 user_input = input(
@@ -103,40 +122,153 @@ def query_carpark_data_by_address(df):
         else:
             print("Invalid input. Please input 'YES', 'NO', 'RESTART', or 'EXIT'.")
 
-def query_last_update_time():
+def query_nearby_carparks(df):
     """
-    Returns the latest update time from the entire dataframe if no carpark number is provided.
-    If a carpark number is given, it returns the latest update time for that specific carpark.
-    
+    Lists the carparks closest to a carpark or to SVY21 coordinates, e.g. when the first choice is full.
+
     Parameters:
-    df: the main dataframe containing the merged carpark & real-time data.
+    df (pandas.DataFrame): The DataFrame containing carpark data.
+
+    Returns:
+    pandas.DataFrame or None: The carparks found, ranked by distance, or None if the location is not valid.
+    """
+    location = input("Please enter a carpark number or SVY21 coordinates as X,Y (e.g. ACB or 30314.79,31490.49): ").strip().upper()
+    radius = input("Search radius in metres (press Enter for the 5 nearest carparks): ").strip()
+    available_only = input("Only show carparks with lots available now? (YES/NO): ").strip().upper() == "YES"
+
+    try:
+        radius = float(radius) if radius else None
+        if re.fullmatch(r'[-+\d.]+\s*,\s*[-+\d.]+', location):
+            x, y = (float(value) for value in location.split(","))
+            nearby_df = nearby_carparks(df, x = x, y = y, radius = radius, available_only = available_only)
+        else:
+            nearby_df = nearby_carparks(df, carpark_no = location, radius = radius, available_only = available_only)
+    except ValueError:
+        print("Invalid coordinates or radius entered.")
+        return None
+
+    if nearby_df is None:
+        print(f"No location found for carpark number: {location}")
+    elif nearby_df.empty:
+        print("No carparks found nearby.")
+    else:
+        print(f"Nearest carparks to {location}:\n{nearby_df[['car_park_no', 'address', 'distance']]}")
+    return nearby_df
+
+def query_last_update_time():
+    """
+    Returns the latest update time of all carparks if no carpark number is provided.
+    If a carpark number is given, it returns the latest update time for that specific carpark, across its lot types.
+    Both are precomputed when the availability snapshot is parsed.
     
     Returns:
     str: The last update time.
     """
     # Prompt user for carpark number
     carpark_number = input("Please enter the carpark number (or press Enter to get the latest update overall): ").strip()
-    real_time_data = fetch_real_time_data()  # Assuming this function fetches the data as expected
-    
-    # If a carpark number is provided
-    if carpark_number:
-        # Check if the carpark number exists in the data
-        if carpark_number in real_time_data:
-            update_datetime = real_time_data[carpark_number]['C']['update_datetime']
-            return update_datetime
-        else:
-            return f"Carpark number {carpark_number} not found."
-    
-    
-    
-       
-    
+    return resolve_last_update(get_availability_store().get(), carpark_number)
+
+
+# Non-interactive resolvers: the searches of the prompts above as pure functions of their inputs, returning
+# plain dictionaries (used by the batch mode)
+
+def _carpark_rows(filtered_df):
+    columns = [column for column in ('car_park_no', 'address', 'score', 'distance') if column in filtered_df]
+    return filtered_df[columns].to_dict('records') if not filtered_df.empty else []
+
 
+def resolve_carpark(df, carpark_no, snapshot):
+    """
+    Returns the details and availability of a carpark, like option 1.
+
+    Parameters:
+    df (pandas.DataFrame): The DataFrame containing carpark data.
+    carpark_no (str): The carpark number.
+    snapshot (dict): The availability snapshot to read from.
+
+    Returns:
+    dict: {"found", "details", "availability"}
+    """
+    record = get_store(df).lookup(carpark_no, df)
+    if record is None:
+        return {"found": False, "details": None, "availability": snapshot.get(carpark_no)}
+    return {"found": True, "details": record.as_dict(), "availability": snapshot.get(carpark_no)}
+
+
+def resolve_address(df, address):
+    """
+    Returns the carparks at an address, like option 2 answered with YES: the address itself, then its
+    town and block, then the closest addresses.
+
+    Returns:
+    dict: {"match": "address", "town_block", "closest" or None, "carparks": list of matching carparks}
+    """
+    address = address.strip().upper()
+    filtered_df = filter_address_by_input(df, address)
+    if not filtered_df.empty:
+        return {"match": "address", "carparks": _carpark_rows(filtered_df)}
+
+    town, block = extract_town_block(address)
+    if town and block:
+        filtered_df = filter_address_by_block_and_town(df, town, block)
+        if not filtered_df.empty:
+            return {"match": "town_block", "carparks": _carpark_rows(filtered_df)}
+        filtered_df = suggest_carparks(df, town, block)
+    if filtered_df.empty:
+        filtered_df = suggest_carparks(df, standardize_address_for_search(address))
+    return {"match": "closest" if not filtered_df.empty else None, "carparks": _carpark_rows(filtered_df)}
+
+
+def resolve_town_block(df, town, block = None):
+    """
+    Returns the carparks of a town or road name and optional block number, like option 2 answered with NO.
 
+    Returns:
+    dict: {"match": "town_block", "closest" or None, "carparks": list of matching carparks}
+    """
+    filtered_df = filter_address_by_block_and_town(df, town.strip(), block)
+    if not filtered_df.empty:
+        return {"match": "town_block", "carparks": _carpark_rows(filtered_df)}
+    filtered_df = suggest_carparks(df, town.strip(), block)
+    return {"match": "closest" if not filtered_df.empty else None, "carparks": _carpark_rows(filtered_df)}
 
 
+def resolve_nearby(df, snapshot, carpark_no = None, x = None, y = None, n = NEAREST, radius = None, available_only = False):
+    """
+    Returns the carparks closest to a carpark or SVY21 point, like option 4.
 
+    Returns:
+    dict: {"found", "carparks": list of carparks with their distance in metres}
+    """
+    nearby_df = nearby_carparks(df, carpark_no, x, y, n, radius, available_only, snapshot)
+    if nearby_df is None:
+        return {"found": False, "carparks": []}
+    return {"found": True, "carparks": _carpark_rows(nearby_df)}
 
 
+def resolve_last_update(snapshot, carpark_number = None):
+    """
+    Returns the last update time of a carpark from an availability snapshot, like option 3.
+    The latest time across all of its lot types is returned, or the latest of all carparks if no carpark number is given.
+    """
+    snapshot = as_snapshot(snapshot)
+    # If a carpark number is provided
+    if carpark_number:
+        # Check if the carpark number exists in the data
+        if carpark_number in snapshot:
+            return snapshot.last_update(carpark_number)
+        else:
+            return f"Carpark number {carpark_number} not found."
+    return snapshot.last_update()
 
 
+def resolve_stale_carparks(snapshot, minutes):
+    """
+    Returns the carparks not updated in the last `minutes` minutes before the snapshot was published.
+
+    Returns:
+    dict: {"reference_time", "minutes", "carparks": carpark numbers, least recently updated first, "staleness": carparks per age bucket}
+    """
+    snapshot = as_snapshot(snapshot)
+    return {"reference_time": format_time(snapshot.reference_time), "minutes": minutes,
+            "carparks": snapshot.stale(minutes), "staleness": snapshot.staleness()}
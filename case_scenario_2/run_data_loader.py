@@ -1,47 +1,215 @@
+import hashlib
+import io
+import os
+import pickle
+import sys
 import pandas as pd
-import requests
 import re
+from carpark_store import CarparkStore, get_store, set_store
+from address_index import AddressIndex, set_address_index
+from spatial_index import CarparkGrid, set_spatial_index
+from availability_snapshot import AvailabilitySnapshot
 
+#the http client shared by both scenarios lives in common/ at the root of the repository
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _REPO_ROOT not in sys.path:
+    sys.path.insert(0, _REPO_ROOT)
+from common.http_client import HttpClient
 
-#format real time carpark details data into a dataframe 
-def fetch_real_time_data():
-    url = "https://api.data.gov.sg/v1/transport/carpark-availability"
-    response = requests.get(url)
-    data = response.json()
-    carpark_data = data['items'][0]['carpark_data']
-    #[carpark_dict['carpark_number']:  for carpark_dict in carpark_data]
-    d1 = {carpark_dict['carpark_number']: 
-
-        {
-            d['lot_type'] : 
-            {
-                'is_available': int(d['lots_available']) > 0, 
-                'total_lots': d['total_lots'], 
-                'lots_available' : d['lots_available'],
-                'update_datetime': carpark_dict['update_datetime']
-            }
-                
-        for d in carpark_dict['carpark_info']
-        }
-        for carpark_dict in carpark_data}
-
-    return d1
-
-
-def fetch_carpark_data(df):
-    res2 = dict(zip(df.values[:,0], df.values[:, 1:].tolist()))
-    res2
-
-    filtered_carpark_data_dict = {k: dict(zip(df.columns[1:], v)) for k, v in res2.items()}
-    return filtered_carpark_data_dict
+
+API_URL = "https://api.data.gov.sg/v1/transport/carpark-availability"
+#seconds to wait for the availability API
+REQUEST_TIMEOUT = 30
+#bytes read from the availability response at a time while it is parsed
+CHUNK_SIZE = 64 * 1024
+#connections kept open per host
+POOL_SIZE = 4
+
+CSV_PATH = "../datasets/HDBCarparkInformation.csv"
+#standardized table and its indexes as built from CSV_PATH, reused by later starts while the csv is unchanged
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".carpark_cache.pkl")
+#modules whose code decides what the cache holds; editing any of them rebuilds it
+CACHED_MODULES = ("run_data_loader.py", "carpark_store.py", "address_index.py", "fuzzy_match.py", "spatial_index.py")
+
+_client = None
+
+
+def get_client():
+    """
+    Returns the HttpClient shared by the availability fetches, which keeps connections to the API open between
+    refreshes, asks for gzip compressed responses, retries transient failures and records the latency and size of
+    every request (see get_client().summary())
+    """
+    global _client
+    if _client is None:
+        _client = HttpClient(pool_size = POOL_SIZE, max_per_host = POOL_SIZE, timeout = REQUEST_TIMEOUT)
+    return _client
+
+
+#parse the real time carpark availability into numpy columns aligned by carpark
+def fetch_real_time_data(url = API_URL, date_time = None, previous = None):
+    """
+    Fetches the carpark availability and returns it as an AvailabilitySnapshot, which also reads like
+    {carpark_number: {lot_type: {'is_available', 'total_lots', 'lots_available', 'update_datetime'}}}
+
+    The response is parsed while it streams in. When previous (the snapshot of the last fetch) is given, the
+    request carries its HTTP validators and previous itself is returned, without parsing anything, if the API
+    answers 304 Not Modified or the payload has the same timestamp.
+
+    Parameters:
+    url (str, optional): The availability endpoint. Defaults to API_URL.
+    date_time (str or datetime, optional): Fetch the availability at this past time (Singapore time,
+        e.g. "2025-01-01T08:00:00") instead of the latest one, e.g. to backfill the history.
+    previous (AvailabilitySnapshot, optional): The last snapshot fetched from the same url.
+    """
+    params = None
+    if date_time is not None:
+        params = {'date_time': date_time.strftime("%Y-%m-%dT%H:%M:%S") if hasattr(date_time, 'strftime') else date_time}
+    headers = {}
+    if getattr(previous, 'etag', None):
+        headers['If-None-Match'] = previous.etag
+    if getattr(previous, 'last_modified', None):
+        headers['If-Modified-Since'] = previous.last_modified
+
+    with get_client().get(url, params = params, headers = headers, timeout = REQUEST_TIMEOUT, stream = True) as response:
+        if response.status_code == 304 and previous is not None:
+            return previous
+        response.raise_for_status()
+        snapshot = AvailabilitySnapshot.from_stream(response.iter_content(CHUNK_SIZE), getattr(previous, 'timestamp', None))
+        if snapshot is None:
+            return previous
+        snapshot.etag = response.headers.get('ETag')
+        snapshot.last_modified = response.headers.get('Last-Modified')
+    return snapshot
+
+
+def fetch_carpark_data(df, carpark_no = None):
+    """
+    Returns {car_park_no: carpark details} from the record store, for carpark_no only if it is given
+    (and part of df), otherwise for every carpark in df
+    """
+    store = get_store(df)
+    if carpark_no is not None:
+        record = store.lookup(carpark_no, df)
+        return {carpark_no: record.as_dict()} if record is not None else {}
+    data = {}
+    for record in store.records_of(df):
+        # the first row of a duplicated carpark number, like the record store keeps
+        data.setdefault(record.car_park_no, record.as_dict())
+    return data
     
 
-def load_carpark_data():
-    df_carpark_details = pd.read_csv("../datasets/HDBCarparkInformation.csv")
-    return standardize_address(df_carpark_details)
+def load_carpark_data(csv_path = CSV_PATH, cache_path = CACHE_PATH, verbose = True):
+    """
+    Loads and standardizes the carpark table and builds its car_park_no record store, address index and spatial grid.
 
+    All of them are taken from the cache at cache_path when it was built from the same csv (same mtime and size,
+    or same content hash) by the same code, and written to it otherwise. Pass cache_path = None to always rebuild.
+    The key of the csv version the table stands for (see csv_changed) is kept in its attrs['source'].
+    """
+    built = _read_cache(cache_path, csv_path) if cache_path else None
+    if built is not None:
+        df_carpark_details, store, address_index, grid = built
+        if verbose:
+            print(f"Number of entries with address naming conventions changed: {df_carpark_details.attrs['addresses_changed']}")
+    else:
+        df_carpark_details, source = read_carpark_csv(csv_path, verbose)
+        store, address_index, grid = CarparkStore(df_carpark_details), AddressIndex(df_carpark_details), CarparkGrid(df_carpark_details)
+        if cache_path:
+            write_carpark_cache(cache_path, source, (df_carpark_details, store, address_index, grid))
+    set_store(store)
+    set_address_index(address_index)
+    set_spatial_index(grid)
+    return df_carpark_details
+
+
+def read_carpark_csv(csv_path = CSV_PATH, verbose = True):
+    """
+    Reads and standardizes the carpark csv.
 
-def standardize_address(df):
+    Returns:
+    tuple: the standardized DataFrame and the key of the csv version it was read from (see csv_changed)
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    source = {
+        'csv': os.path.abspath(csv_path),
+        'stat': _stat_key(csv_path),
+        'code': [_stat_key(os.path.join(here, name)) for name in CACHED_MODULES],
+    }
+    with open(csv_path, 'rb') as f:
+        content = f.read()
+    # hashed from the bytes actually parsed, so a csv replaced while it is read is never mistaken for this version
+    source['sha256'] = hashlib.sha256(content).hexdigest()
+    df = standardize_address(pd.read_csv(io.BytesIO(content)), verbose)
+    df.attrs['source'] = source
+    return df, source
+
+
+def csv_changed(source):
+    """
+    Whether the csv read as source (see read_carpark_csv) has changed since: a different mtime or size is only
+    a change if the content differs too, in which case source takes the new mtime and size so that the csv is not
+    hashed again at every check
+    """
+    try:
+        stat = _stat_key(source['csv'])
+        if stat == source['stat']:
+            return False
+        with open(source['csv'], 'rb') as f:
+            if hashlib.sha256(f.read()).hexdigest() != source['sha256']:
+                return True
+        source['stat'] = stat
+        return False
+    except OSError:
+        # the csv is being replaced, or gone: keep the current version
+        return False
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_cache(cache_path, csv_path):
+    """
+    Returns what was cached for the csv at csv_path, with its table carrying the csv version it was built from
+    in attrs['source'], or None if there is no usable cache
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        with open(cache_path, 'rb') as f:
+            # the header is a separate, small pickle so an outdated cache is rejected without loading the rest
+            header = pickle.load(f)
+            if header['csv'] != os.path.abspath(csv_path) or header['code'] != [_stat_key(os.path.join(here, name)) for name in CACHED_MODULES]:
+                return None
+            # a csv that was only touched (e.g. checked out again) still matches by content
+            if csv_changed(header):
+                return None
+            built = pickle.load(f)
+            built[0].attrs['source'] = header
+            return built
+    except Exception:
+        # missing, truncated or written by another version of the libraries: rebuilt from the csv
+        return None
+
+
+def write_carpark_cache(cache_path, source, built):
+    """
+    Writes the table, record store, address index and spatial grid built from the csv version source to the cache
+    """
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(source, f, protocol = pickle.HIGHEST_PROTOCOL)
+            pickle.dump(built, f, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Could not write the carpark cache {cache_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def standardize_address(df, verbose = True):
     """
     Standardizes the address column in a DataFrame.
 
@@ -53,6 +221,7 @@ def standardize_address(df):
 
     Parameters:
     df (DataFrame): The input DataFrame with an 'address' column.
+    verbose (bool, optional): Print how many addresses were changed. Defaults to True.
 
     Returns:
     DataFrame: A DataFrame with standardized address formatting.
@@ -71,7 +240,9 @@ def standardize_address(df):
 
     # Count number of changed entries
     changed_entries = (original_addresses != df['address']).sum()
-    print(f"Number of entries with address naming conventions changed: {changed_entries}")
+    df.attrs['addresses_changed'] = int(changed_entries)
+    if verbose:
+        print(f"Number of entries with address naming conventions changed: {changed_entries}")
 
     return df
 
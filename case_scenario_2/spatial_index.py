@@ -0,0 +1,133 @@
+import numpy as np
+
+# side of a grid cell in metres (SVY21 coordinates are in metres)
+CELL_SIZE = 500
+# carparks returned by a nearest query when no count is given
+NEAREST = 5
+
+
+class CarparkGrid:
+    """
+    Uniform grid over the SVY21 x_coord/y_coord of the carparks, built once when the table is loaded.
+
+    The positions of the carparks are sorted by grid cell, with the start of every cell kept in an offsets
+    array, so a query only gathers the cells around the point and measures the distances of those carparks
+    at once. Carparks without coordinates are left out.
+    """
+
+    def __init__(self, df, cell_size = CELL_SIZE):
+        self.df = df
+        self.cell_size = cell_size
+        self.numbers = df['car_park_no'].to_numpy()
+        self.x = df['x_coord'].to_numpy(dtype = float)
+        self.y = df['y_coord'].to_numpy(dtype = float)
+        located = np.flatnonzero(~(np.isnan(self.x) | np.isnan(self.y)))
+        self.positions = {no: position for position, no in reversed(list(enumerate(self.numbers.tolist())))}
+
+        self.x0 = self.x[located].min() if len(located) else 0.0
+        self.y0 = self.y[located].min() if len(located) else 0.0
+        self.nx = int((self.x[located].max() - self.x0) // cell_size) + 1 if len(located) else 1
+        self.ny = int((self.y[located].max() - self.y0) // cell_size) + 1 if len(located) else 1
+
+        cells = self._cell(self.x[located], self.y[located])
+        order = np.argsort(cells, kind = "stable")
+        self.order = located[order]
+        # carparks of cell c are self.order[self.offsets[c]:self.offsets[c + 1]]
+        self.offsets = np.searchsorted(cells[order], np.arange(self.nx * self.ny + 1))
+
+    def __len__(self):
+        return len(self.order)
+
+    def _cell(self, x, y):
+        ix = ((x - self.x0) // self.cell_size).astype(np.int64)
+        iy = ((y - self.y0) // self.cell_size).astype(np.int64)
+        return iy * self.nx + ix
+
+    def _gather(self, x, y, radius):
+        """
+        Returns the positions of the carparks in the grid cells overlapping the square around (x, y)
+        """
+        ix0 = max(int((x - radius - self.x0) // self.cell_size), 0)
+        ix1 = min(int((x + radius - self.x0) // self.cell_size), self.nx - 1)
+        iy0 = max(int((y - radius - self.y0) // self.cell_size), 0)
+        iy1 = min(int((y + radius - self.y0) // self.cell_size), self.ny - 1)
+        if ix0 > ix1 or iy0 > iy1:
+            return np.empty(0, dtype = np.int64)
+        rows = np.arange(iy0, iy1 + 1) * self.nx
+        # each row of cells is one contiguous run of self.order
+        runs = [self.order[self.offsets[row + ix0]:self.offsets[row + ix1 + 1]] for row in rows]
+        return np.concatenate(runs)
+
+    def within(self, x, y, radius, keep = None):
+        """
+        Returns (positions, distances) of the carparks within radius metres of (x, y), closest first.
+
+        Args:
+            keep (callable, optional): takes an array of positions and returns a boolean array of the ones to keep
+        """
+        positions = self._gather(x, y, radius)
+        distances = np.hypot(self.x[positions] - x, self.y[positions] - y)
+        inside = distances <= radius
+        positions, distances = positions[inside], distances[inside]
+        if keep is not None and len(positions):
+            kept = np.asarray(keep(positions), dtype = bool)
+            positions, distances = positions[kept], distances[kept]
+        order = np.lexsort((positions, distances))
+        return positions[order], distances[order]
+
+    def nearest(self, x, y, n = NEAREST, keep = None, exclude = None):
+        """
+        Returns (positions, distances) of the n carparks closest to (x, y), closest first.
+
+        The search radius starts at one cell and doubles until n carparks are inside it: all of them
+        are then closer than any carpark outside, so the answer is exact.
+        """
+        if n <= 0 or len(self) == 0:
+            return np.empty(0, dtype = np.int64), np.empty(0)
+        # distance from the point to the far corner of the grid, beyond which nothing is left to find
+        max_radius = np.hypot(max(abs(x - self.x0), abs(self.x0 + self.nx * self.cell_size - x)),
+                              max(abs(y - self.y0), abs(self.y0 + self.ny * self.cell_size - y)))
+        radius = self.cell_size
+        while True:
+            positions, distances = self.within(x, y, radius, keep)
+            if exclude is not None:
+                others = positions != exclude
+                positions, distances = positions[others], distances[others]
+            if len(positions) >= n or radius >= max_radius:
+                return positions[:n], distances[:n]
+            radius *= 2
+
+    def location(self, carpark_no):
+        """
+        Returns the (x, y) coordinates and position of carpark_no, or None if it is unknown or has no coordinates
+        """
+        position = self.positions.get(carpark_no)
+        if position is None or np.isnan(self.x[position]) or np.isnan(self.y[position]):
+            return None
+        return self.x[position], self.y[position], position
+
+    def frame(self, positions, distances):
+        """
+        Returns the rows of the table at positions with a distance column in metres
+        """
+        rows = self.df.iloc[positions].copy()
+        rows['distance'] = np.round(distances, 1)
+        return rows
+
+
+_grid = None
+
+
+def set_spatial_index(grid):
+    global _grid
+    _grid = grid
+    return grid
+
+
+def get_spatial_index(df = None):
+    """
+    Returns the grid of the loaded carpark table, building one from df if none has been loaded yet
+    """
+    if _grid is None and df is not None:
+        return set_spatial_index(CarparkGrid(df))
+    return _grid
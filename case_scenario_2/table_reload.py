@@ -0,0 +1,141 @@
+import os
+import threading
+
+import numpy as np
+
+from address_index import AddressIndex, get_address_index, set_address_index
+from carpark_store import CARPARK_COLUMNS, CarparkStore, set_store
+from run_data_loader import CSV_PATH, CACHE_PATH, read_carpark_csv, csv_changed, write_carpark_cache
+from spatial_index import CarparkGrid, set_spatial_index
+
+# seconds between two checks of the csv
+RELOAD_INTERVAL = 30
+
+
+class TableDiff:
+    """
+    Differences between two versions of the carpark table, matched by car_park_no.
+
+    source holds, for every row of the new table, the position in the old table of the same carpark when its
+    address is unchanged (-1 otherwise), which is what the address index is carried over with.
+    """
+
+    def __init__(self, old, new):
+        old_rows = _keyed_rows(old)
+        new_rows = _keyed_rows(new)
+        self.added = [key[0] for key in new_rows if key not in old_rows]
+        self.removed = [key[0] for key in old_rows if key not in new_rows]
+        self.changed = [key[0] for key, (_, values) in new_rows.items() if key in old_rows and old_rows[key][1] != values]
+
+        address = CARPARK_COLUMNS.index('address')
+        self.source = np.full(len(new), -1, dtype = np.int64)
+        for key, (position, values) in new_rows.items():
+            previous = old_rows.get(key)
+            if previous is not None and previous[1][address] == values[address]:
+                self.source[position] = previous[0]
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed) or not np.array_equal(self.source, np.arange(len(self.source)))
+
+    def __str__(self):
+        return f"{len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed"
+
+
+def _keyed_rows(df):
+    # {(car_park_no, occurrence): (position, row values)}, NaN turned into None so that equal rows compare equal
+    values = df[list(CARPARK_COLUMNS)].astype(object).where(df[list(CARPARK_COLUMNS)].notna(), None)
+    rows, seen = {}, {}
+    for position, row in enumerate(values.itertuples(index = False, name = None)):
+        occurrence = seen[row[0]] = seen.get(row[0], -1) + 1
+        rows[(row[0], occurrence)] = (position, row)
+    return rows
+
+
+class TableReloader:
+    """
+    Keeps the loaded carpark table in step with HDBCarparkInformation.csv while queries are being served.
+
+    The csv is checked every interval seconds (mtime and size, then content hash). A new version is read and
+    diffed against the current table by car_park_no; the address index of the new table is built from the current
+    one, tokenizing only the added and changed addresses, and the record store and spatial grid (vectorised builds)
+    are rebuilt. Everything is built next to the structures in use and swapped in at once, so queries keep being
+    answered from the previous version until then. on_reload(df) is called with every new table.
+
+    source is the key of the csv version df was loaded from (see csv_changed), by default the one
+    load_carpark_data keeps in df.attrs['source']; the csv is only read again to get it when neither is known.
+    """
+
+    def __init__(self, df, csv_path = CSV_PATH, interval = RELOAD_INTERVAL, on_reload = None, cache_path = CACHE_PATH, source = None):
+        self.df = df
+        self.csv_path = csv_path
+        self.interval = interval
+        self.on_reload = on_reload
+        self.cache_path = cache_path
+        source = source or df.attrs.get('source')
+        if source is None or source['csv'] != os.path.abspath(csv_path):
+            _, source = read_carpark_csv(csv_path, verbose = False)
+        self._source = dict(source)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reloads = 0
+
+    def check(self):
+        """
+        Reloads the csv if it changed since the last check; returns the TableDiff applied, or None
+        """
+        with self._lock:
+            if not csv_changed(self._source):
+                return None
+            df, source = read_carpark_csv(self.csv_path, verbose = False)
+            if csv_changed(source):
+                # still being written, picked up at the next check
+                return None
+            self._source = source
+            diff = TableDiff(self.df, df)
+            if not diff:
+                return None
+            self.apply(df, diff)
+            if self.cache_path:
+                write_carpark_cache(self.cache_path, source, (df, self._store, self._address_index, self._grid))
+            return diff
+
+    def apply(self, df, diff):
+        previous = get_address_index()
+        if previous is not None and previous.df is self.df:
+            address_index = AddressIndex(df, previous = previous, source = diff.source)
+        else:
+            address_index = AddressIndex(df)
+        self._store, self._address_index, self._grid = CarparkStore(df), address_index, CarparkGrid(df)
+        # the address index and record store check which table they are given, so a query still holding the
+        # previous table reads that table while the swap is under way; nearby carparks come from the newest grid
+        set_address_index(self._address_index)
+        set_store(self._store)
+        set_spatial_index(self._grid)
+        self.df = df
+        self.reloads += 1
+        if self.on_reload is not None:
+            self.on_reload(df)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                diff = self.check()
+            except Exception as e:
+                print(f"Failed to reload {self.csv_path}: {e}")
+                continue
+            if diff:
+                print(f"Reloaded {self.csv_path}: {diff}")
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target = self._run, name = "carpark-reloader", daemon = True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,280 @@
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# connections kept open per host
+POOL_SIZE = 8
+# requests sent to the same host at the same time, the others wait for a slot
+MAX_PER_HOST = 8
+# seconds to wait for a server before a request is abandoned
+TIMEOUT = 30
+# attempts after the first one for connection errors, timeouts and RETRY_STATUSES
+RETRIES = 2
+# seconds of the first backoff, doubled at every retry up to MAX_BACKOFF, of which a random share is waited
+BACKOFF = 0.5
+MAX_BACKOFF = 10
+# statuses that are worth retrying: rate limited or a gateway/server that should be back shortly
+RETRY_STATUSES = (429, 502, 503, 504)
+# consecutive failures of a host that open its circuit, and seconds before a trial request is let through
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30
+# requests whose latency and size are kept for summary()
+MAX_RECORDS = 1000
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised without contacting a host whose circuit is open after too many consecutive failures
+    """
+
+
+class HostBusyError(requests.exceptions.Timeout):
+    """
+    Raised when no slot of a host frees up within the request timeout, e.g. because streamed responses to it
+    were never closed
+    """
+
+
+class CircuitBreaker:
+    """
+    Consecutive failure counter of one host: closed until failure_threshold failures in a row, then open (requests
+    fail fast) for reset_timeout seconds, then half-open, letting a single trial request through whose outcome
+    closes or reopens the circuit.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def abandon(self):
+        """
+        Hands back a trial request that ended without an answer from the host (e.g. it never got a slot), so that
+        another one is let through after reset_timeout instead of the circuit staying half-open
+        """
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(len(sorted_values) * percent / 100 + 0.5) - 1))]
+
+
+def _transferred(response, default):
+    # body bytes read from the connection, before gzip/deflate decoding
+    try:
+        return int(response.raw.tell())
+    except (AttributeError, TypeError, ValueError):
+        return default
+
+
+class HttpClient:
+    """
+    HTTP client shared by the fetches of a process: one keep-alive connection pool asking for gzip, a limit on the
+    requests in flight per host, retries with exponential backoff and full jitter, and a circuit breaker per host.
+
+    Every request is recorded ({"method", "url", "host", "status", "error", "attempts", "seconds", "bytes",
+    "decoded_bytes"}) in records, the latest MAX_RECORDS of them; summary() aggregates them per host. bytes counts
+    the body bytes received over all attempts as transferred (compressed), decoded_bytes the body handed to the
+    caller. For a streamed response the slot of its host is held, and seconds and bytes keep growing, until the
+    response is closed; a request waiting longer than its timeout for a slot raises HostBusyError.
+
+    Args:
+        pool_size (int, optional): connections kept open per host. Defaults to POOL_SIZE.
+        max_per_host (int, optional): requests in flight per host. Defaults to MAX_PER_HOST.
+        timeout (float, optional): default timeout in seconds. Defaults to TIMEOUT.
+        retries (int, optional): retries after the first attempt. Defaults to RETRIES.
+        backoff (float, optional): first backoff in seconds. Defaults to BACKOFF.
+        max_backoff (float, optional): longest backoff in seconds. Defaults to MAX_BACKOFF.
+        failure_threshold (int, optional): consecutive failures opening a circuit. Defaults to FAILURE_THRESHOLD.
+        reset_timeout (float, optional): seconds a circuit stays open. Defaults to RESET_TIMEOUT.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, max_per_host=MAX_PER_HOST, timeout=TIMEOUT, retries=RETRIES,
+                 backoff=BACKOFF, max_backoff=MAX_BACKOFF, failure_threshold=FAILURE_THRESHOLD,
+                 reset_timeout=RESET_TIMEOUT):
+        self.session = requests.Session()
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.records = deque(maxlen=MAX_RECORDS)
+        self._slots = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host):
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.max_per_host)
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._slots[host], self._breakers[host]
+
+    def breaker(self, url):
+        """
+        Returns the circuit breaker of the host of url
+        """
+        return self._host(urlsplit(url).netloc)[1]
+
+    def _delay(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after is not None and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.max_backoff))
+        return delay
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def request(self, method, url, timeout=None, stream=False, **kwargs):
+        """
+        Sends a request like requests.Session.request, retrying it when it is worth it.
+
+        Returns the last response (which may still be an error status for the caller to handle), or raises the
+        requests exception of the last attempt. Raises CircuitOpenError while the circuit of the host is open, and
+        HostBusyError if all the slots of the host stay taken for longer than the timeout.
+        """
+        host = urlsplit(url).netloc
+        slot, breaker = self._host(host)
+        record = {"method": method, "url": url, "host": host, "status": None, "error": None,
+                  "attempts": 0, "seconds": 0.0, "bytes": 0, "decoded_bytes": 0}
+        self.records.append(record)
+        started = time.perf_counter()
+        timeout = timeout or self.timeout
+        # (connect, read) timeouts: waiting for a slot comes before connecting
+        wait = timeout[0] if isinstance(timeout, tuple) else timeout
+        while True:
+            if not breaker.allow():
+                record["error"] = "CircuitOpenError"
+                raise CircuitOpenError(f"Circuit open for {host} after {breaker.failures} consecutive failures")
+            record["attempts"] += 1
+            if not slot.acquire(timeout=wait):
+                breaker.abandon()
+                record["error"] = "HostBusyError"
+                record["seconds"] = time.perf_counter() - started
+                raise HostBusyError(f"No free slot for {host} within {wait}s, {self.max_per_host} requests in flight")
+            try:
+                response = self.session.request(method, url, timeout=timeout, stream=stream, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                slot.release()
+                breaker.failure()
+                record["error"] = f"{type(e).__name__}: {e}"
+                record["seconds"] = time.perf_counter() - started
+                if record["attempts"] > self.retries:
+                    raise
+                time.sleep(self._delay(record["attempts"] - 1))
+                continue
+            except BaseException as e:
+                slot.release()
+                breaker.abandon()
+                record["error"] = f"{type(e).__name__}: {e}"
+                raise
+
+            if response.status_code >= 500 or response.status_code == 429:
+                breaker.failure()
+            else:
+                breaker.success()
+            record["status"] = response.status_code
+            record["error"] = None
+            if stream:
+                self._track_stream(response, slot, record, started)
+            else:
+                slot.release()
+                record["decoded_bytes"] = len(response.content)
+                record["bytes"] += _transferred(response, record["decoded_bytes"])
+                record["seconds"] = time.perf_counter() - started
+
+            if response.status_code in RETRY_STATUSES and record["attempts"] <= self.retries:
+                response.close()
+                time.sleep(self._delay(record["attempts"] - 1, response.headers.get("Retry-After")))
+                continue
+            return response
+
+    def _track_stream(self, response, slot, record, started):
+        # counts the bytes read from the response and frees its slot once it is closed
+        iter_content, close = response.iter_content, response.close
+        released = []
+        previous_attempts = record["bytes"]
+
+        def counted_iter_content(chunk_size=1, decode_unicode=False):
+            for chunk in iter_content(chunk_size, decode_unicode):
+                record["decoded_bytes"] += len(chunk)
+                record["bytes"] = previous_attempts + _transferred(response, record["decoded_bytes"])
+                yield chunk
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if not released:
+                    released.append(True)
+                    record["seconds"] = time.perf_counter() - started
+                    slot.release()
+
+        response.iter_content = counted_iter_content
+        response.close = close_and_release
+
+    def summary(self):
+        """
+        Returns {host: {"requests", "errors", "retries", "bytes", "decoded_bytes", "latency_ms": {"p50", "p95", "max"},
+        "circuit"}} over the recorded requests
+        """
+        hosts = {}
+        for record in list(self.records):
+            hosts.setdefault(record["host"], []).append(record)
+        summary = {}
+        for host, records in hosts.items():
+            latencies = sorted(record["seconds"] for record in records)
+            summary[host] = {
+                "requests": len(records),
+                "errors": sum(record["error"] is not None or (record["status"] or 0) >= 400 for record in records),
+                "retries": sum(max(record["attempts"] - 1, 0) for record in records),
+                "bytes": sum(record["bytes"] for record in records),
+                "decoded_bytes": sum(record["decoded_bytes"] for record in records),
+                "latency_ms": {name: round(_percentile(latencies, percent) * 1000, 3)
+                               for name, percent in (("p50", 50), ("p95", 95), ("max", 100))},
+                "circuit": self._host(host)[1].state,
+            }
+        return summary
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,193 @@
+import gzip
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from common.http_client import HttpClient, CircuitOpenError, HostBusyError
+
+
+class StubServer:
+    """
+    Local HTTP server answering with the statuses queued in responses (200 once the queue is empty), gzip
+    compressing the body for clients that accept it
+    """
+
+    def __init__(self, body=b'{"key": "value"}', delay=0):
+        self.body = body
+        self.delay = delay
+        self.responses = []
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.headers = []
+        self.sent = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    stub.headers.append(dict(self.headers))
+                    status = stub.responses.pop(0) if stub.responses else 200
+                time.sleep(stub.delay)
+                body = stub.body
+                self.send_response(status)
+                if "gzip" in self.headers.get("Accept-Encoding", ""):
+                    body = gzip.compress(body)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                stub.sent.append(len(body))
+                with stub._lock:
+                    stub.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.host = f"127.0.0.1:{self.server.server_port}"
+        self.url = f"http://{self.host}/feed"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestHttpClient(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubServer(body=b'{"key": "' + b"value" * 100 + b'"}')
+        self.addCleanup(self.stub.close)
+        self.client = HttpClient(backoff=0.001, max_backoff=0.01)
+        self.addCleanup(self.client.close)
+
+    def test_gzip_and_metrics(self):
+        response = self.client.get(self.stub.url)
+        self.assertEqual(response.json(), {"key": "value" * 100})
+        self.assertLess(self.stub.sent[0], len(self.stub.body))
+        self.assertIn("gzip", self.stub.headers[0]["Accept-Encoding"])
+
+        summary = self.client.summary()[self.stub.host]
+        self.assertEqual(summary["requests"], 1)
+        self.assertEqual(summary["errors"], 0)
+        # transferred (compressed) and decoded sizes
+        self.assertEqual(summary["bytes"], self.stub.sent[0])
+        self.assertEqual(summary["decoded_bytes"], len(self.stub.body))
+        self.assertGreater(summary["latency_ms"]["max"], 0)
+        self.assertEqual(self.client.records[-1]["status"], 200)
+
+    def test_retries_transient_statuses(self):
+        self.stub.responses = [503, 502]
+        response = self.client.get(self.stub.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stub.requests, 3)
+        self.assertEqual(self.client.records[-1]["attempts"], 3)
+        self.assertEqual(self.client.summary()[self.stub.host]["retries"], 2)
+
+        # the last response is handed back once the retries are used up, other errors are not retried
+        self.stub.responses = [503, 503, 503]
+        self.assertEqual(self.client.get(self.stub.url).status_code, 503)
+        self.stub.responses = [404]
+        self.assertEqual(self.client.get(self.stub.url).status_code, 404)
+        self.assertEqual(self.stub.requests, 7)
+
+    def test_retries_connection_errors(self):
+        url = self.stub.url
+        self.stub.close()
+        with self.assertRaises(requests.ConnectionError):
+            self.client.get(url)
+        self.assertEqual(self.client.records[-1]["attempts"], 3)
+        self.assertIsNotNone(self.client.records[-1]["error"])
+
+    def test_circuit_breaker(self):
+        client = HttpClient(retries=0, failure_threshold=2, reset_timeout=0.05)
+        self.addCleanup(client.close)
+        self.stub.responses = [500, 500]
+        for _ in range(2):
+            self.assertEqual(client.get(self.stub.url).status_code, 500)
+
+        # the host is not contacted while the circuit is open
+        with self.assertRaises(CircuitOpenError):
+            client.get(self.stub.url)
+        self.assertEqual(self.stub.requests, 2)
+        self.assertEqual(client.summary()[self.stub.host]["circuit"], "open")
+
+        # a successful trial request closes it again
+        time.sleep(0.06)
+        self.assertEqual(client.get(self.stub.url).status_code, 200)
+        self.assertEqual(client.breaker(self.stub.url).state, "closed")
+
+    def test_abandoned_trial_request(self):
+        client = HttpClient(max_per_host=1, timeout=0.05, retries=0, failure_threshold=1, reset_timeout=0.05)
+        self.addCleanup(client.close)
+        self.stub.responses = [500]
+        self.assertEqual(client.get(self.stub.url).status_code, 500)
+        time.sleep(0.06)
+
+        # the trial request never gets a slot: the circuit opens again instead of staying half-open
+        with client._host(self.stub.host)[0]:
+            with self.assertRaises(HostBusyError):
+                client.get(self.stub.url)
+        self.assertEqual(client.breaker(self.stub.url).state, "open")
+        with self.assertRaises(CircuitOpenError):
+            client.get(self.stub.url)
+
+        # nor when it fails before reaching the host
+        time.sleep(0.06)
+        with self.assertRaises(requests.exceptions.InvalidHeader):
+            client.get(self.stub.url, headers={"X-Bad": "a\nb"})
+        self.assertEqual(client.breaker(self.stub.url).state, "open")
+
+        time.sleep(0.06)
+        self.assertEqual(client.get(self.stub.url).status_code, 200)
+        self.assertEqual(client.breaker(self.stub.url).state, "closed")
+
+    def test_per_host_limit(self):
+        self.stub.delay = 0.05
+        client = HttpClient(max_per_host=2)
+        self.addCleanup(client.close)
+        threads = [threading.Thread(target=client.get, args=(self.stub.url,)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.stub.requests, 6)
+        self.assertEqual(self.stub.max_in_flight, 2)
+
+    def test_streamed_response(self):
+        client = HttpClient(max_per_host=1)
+        self.addCleanup(client.close)
+        with client.get(self.stub.url, stream=True) as response:
+            self.assertEqual(b"".join(response.iter_content(4)), self.stub.body)
+            # the slot of the host is held until the response is closed
+            self.assertFalse(client._host(self.stub.host)[0].acquire(blocking=False))
+        self.assertEqual(client.records[-1]["bytes"], self.stub.sent[0])
+        self.assertEqual(client.records[-1]["decoded_bytes"], len(self.stub.body))
+        self.assertTrue(client._host(self.stub.host)[0].acquire(blocking=False))
+
+    def test_leaked_slot_times_out(self):
+        client = HttpClient(max_per_host=1, timeout=0.1)
+        self.addCleanup(client.close)
+        leaked = client.get(self.stub.url, stream=True)
+        # a response that is never closed keeps its slot, later requests give up instead of waiting forever
+        with self.assertRaises(HostBusyError):
+            client.get(self.stub.url)
+        self.assertEqual(self.stub.requests, 1)
+        self.assertEqual(client.records[-1]["error"], "HostBusyError")
+        leaked.close()
+        self.assertEqual(client.get(self.stub.url).status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()